@@ -5,11 +5,15 @@ import asyncio
 import subprocess
 import json
 import os
+import io
+import glob
+import shutil
 from dotenv import load_dotenv
 load_dotenv()
 
 import random
 import logging
+from collections import deque
 from datetime import datetime, timedelta
 
 # ---------------- CONFIG ----------------
@@ -36,6 +40,22 @@ POINTS_RENEW_15 = 10
 POINTS_RENEW_30 = 20
 VPS_LIFETIME_DAYS = 15
 RENEW_MODE_FILE = os.path.join(DATA_DIR, "renew_mode.json")
+STORE_FLUSH_INTERVAL_MS = int(os.getenv("STORE_FLUSH_INTERVAL_MS", "250"))  # Store changes are written at most this often
+ACTIVITY_LOG_DIR = os.path.join(DATA_DIR, "activity_log")
+ACTIVITY_SEGMENT_BYTES = int(os.getenv("ACTIVITY_SEGMENT_BYTES", str(256 * 1024)))  # Start a new log segment past this size
+ACTIVITY_LOG_MAX_BYTES = int(os.getenv("ACTIVITY_LOG_MAX_BYTES", str(32 * 1024 * 1024)))  # Oldest segments are dropped past this total
+ACTIVITY_LOG_MAX_DAYS = int(os.getenv("ACTIVITY_LOG_MAX_DAYS", "90"))  # ...or once their newest entry is this old
+ACTIVITY_RING_SIZE = int(os.getenv("ACTIVITY_RING_SIZE", "5000"))  # Recent entries kept in memory for /logs
+LOG_BATCH_WINDOW = float(os.getenv("LOG_BATCH_WINDOW", "2"))  # Seconds log events are gathered before a message goes out
+LOG_FILE_THRESHOLD = int(os.getenv("LOG_FILE_THRESHOLD", "50"))  # Backlogs larger than this are shipped as one file attachment
+LOG_SEND_INTERVAL = float(os.getenv("LOG_SEND_INTERVAL", "1.5"))  # Minimum seconds between log channel messages
+LOG_SEND_RETRIES = 5
+STORE_COMPACT_RATIO = 4  # Rewrite a store's snapshot once its journal holds this many records per key
+WARM_POOL_FILE = os.path.join(DATA_DIR, "warm_pool.json")
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "0"))  # Pre-booted default-plan containers kept ready for /deploy
+READY_TIMEOUT = int(os.getenv("READY_TIMEOUT", "90"))  # Seconds a new container gets to boot systemd
+PROVISION_WORKERS = int(os.getenv("PROVISION_WORKERS", "3"))  # Giveaway VPS created concurrently
+HOST_OVERCOMMIT = float(os.getenv("HOST_OVERCOMMIT", "4"))  # Allocated RAM/CPU/disk may exceed the host's by this factor
 LOG_CHANNEL_ID = None
 OWNER_ID = 1212951893651759225
 
@@ -81,11 +101,265 @@ def save_json(path, data):
         json.dump(data, f, indent=2)
     os.replace(tmp, path)
 
-users = load_json(USERS_FILE, {})
-vps_db = load_json(VPS_FILE, {})
-invite_snapshot = load_json(INV_CACHE_FILE, {})
-giveaways = load_json(GIVEAWAY_FILE, {})
+def write_durably(path, text):
+    """Atomically replace path with text, on disk before this returns.
+
+    The file is fsynced before the rename and the directory after it, so a
+    power loss leaves either the old or the new file, never a partial one.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def replay_journal(path, target):
+    """Apply the records of a store journal to `target`; returns how many were applied."""
+    applied = 0
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append; everything before it is intact.
+                    logger.warning(f"Ignoring truncated record in {path}")
+                    break
+                if record.get('d'):
+                    dict.pop(target, record['k'], None)
+                else:
+                    dict.__setitem__(target, record['k'], record['v'])
+                applied += 1
+    except FileNotFoundError:
+        pass
+    return applied
+
+class JournaledStore(dict):
+    """dict persisted as a JSON snapshot plus an append-only journal.
+
+    persist(*keys) only marks keys dirty; persist_scheduler later appends one
+    `{"k": key, "v": value}` line per changed key (or `{"k": key, "d": 1}` once
+    the key is gone) to `path.journal`. The snapshot (`path`) is only rewritten
+    on compaction. Nothing is read from disk until the store is first accessed.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.loaded = False
+        self.dirty = set()
+        self.rewrite_pending = False
+        self.journal_records = 0
+
+    def load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        dict.update(self, load_json(self.path, {}))
+        self.journal_records = replay_journal(self.journal_path, self)
+        if self.journal_records:
+            logger.info(f"Replayed {self.journal_records} journal record(s) for {self.path}")
+
+    def persist(self, *keys):
+        """Mark keys as changed; with no keys the whole store is rewritten."""
+        self.load()
+        if keys:
+            self.dirty.update(keys)
+        else:
+            self.rewrite_pending = True
+        persist_scheduler.wake()
+
+    def take_batch(self):
+        """Serialise pending changes into a batch for write_batch(), or None.
+
+        Runs on the event loop so values are read while no handler is mid-mutation.
+        """
+        if not self.loaded:
+            return None
+        if self.rewrite_pending:
+            self.rewrite_pending = False
+            self.dirty.clear()
+            self.journal_records = 0
+            return ('rewrite', json.dumps(dict(self), indent=2))
+        if not self.dirty:
+            return None
+        lines = []
+        for key in self.dirty:
+            if dict.__contains__(self, key):
+                lines.append(json.dumps({"k": key, "v": dict.__getitem__(self, key)}))
+            else:
+                lines.append(json.dumps({"k": key, "d": 1}))
+        self.dirty.clear()
+        self.journal_records += len(lines)
+        if self.journal_records > STORE_COMPACT_RATIO * max(dict.__len__(self), 64):
+            self.journal_records = 0
+            return ('compact', lines)
+        return ('append', lines)
+
+    def write_batch(self, batch):
+        """Put a batch from take_batch() on disk. Blocking; never touches the live dict."""
+        kind, payload = batch
+        # The journal is only emptied once the snapshot replacing it is safely on disk.
+        if kind == 'rewrite':
+            write_durably(self.path, payload)
+            open(self.journal_path, 'w').close()
+            return
+        with open(self.journal_path, 'a') as f:
+            f.write("\n".join(payload) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if kind == 'compact':
+            # Rebuilt from disk rather than the live dict, so the loop never waits on it.
+            # Replaying the journal again after a crash before truncation is harmless.
+            snapshot = load_json(self.path, {})
+            replay_journal(self.journal_path, snapshot)
+            write_durably(self.path, json.dumps(snapshot, indent=2))
+            open(self.journal_path, 'w').close()
+
+    # dict API: every entry point loads the store first.
+    def __getitem__(self, key):
+        self.load()
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self.load()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.load()
+        dict.__delitem__(self, key)
+
+    def __contains__(self, key):
+        self.load()
+        return dict.__contains__(self, key)
+
+    def __iter__(self):
+        self.load()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.load()
+        return dict.__len__(self)
+
+    def __eq__(self, other):
+        self.load()
+        return dict.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        self.load()
+        return dict.__repr__(self)
+
+    def get(self, key, default=None):
+        self.load()
+        return dict.get(self, key, default)
+
+    def keys(self):
+        self.load()
+        return dict.keys(self)
+
+    def values(self):
+        self.load()
+        return dict.values(self)
+
+    def items(self):
+        self.load()
+        return dict.items(self)
+
+    def pop(self, key, *default):
+        self.load()
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default=None):
+        self.load()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self.load()
+        dict.update(self, *args, **kwargs)
+
+    def copy(self):
+        self.load()
+        return dict.copy(self)
+
+class PersistScheduler:
+    """Writes dirty JournaledStores from a background task.
+
+    Changes are collected for STORE_FLUSH_INTERVAL_MS after the first one and
+    written in a worker thread, so a store hits the disk at most once per
+    interval. `await flush()` writes immediately, for shutdown and for point
+    deductions that must not be lost. Before start() (and after stop()) every
+    persist is written synchronously.
+    """
+
+    def __init__(self, stores):
+        self.stores = stores
+        self.pending = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.writes = 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def wake(self):
+        if self.task is None:
+            self.flush_sync()
+        else:
+            self.pending.set()
+
+    async def run(self):
+        while True:
+            await self.pending.wait()
+            await asyncio.sleep(STORE_FLUSH_INTERVAL_MS / 1000)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to persist stores: {e}")
+
+    def take_batches(self):
+        self.pending.clear()
+        return [(store, batch) for store in self.stores if (batch := store.take_batch())]
+
+    def write_batches(self, batches):
+        for store, batch in batches:
+            store.write_batch(batch)
+            self.writes += 1
+
+    async def flush(self):
+        # The lock keeps batches reaching the disk in the order they were taken.
+        async with self.lock:
+            batches = self.take_batches()
+            if batches:
+                await asyncio.to_thread(self.write_batches, batches)
+
+    def flush_sync(self):
+        self.write_batches(self.take_batches())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+users = JournaledStore(USERS_FILE)
+vps_db = JournaledStore(VPS_FILE)
+invite_snapshot = JournaledStore(INV_CACHE_FILE)
+giveaways = JournaledStore(GIVEAWAY_FILE)
+persist_scheduler = PersistScheduler((users, vps_db, invite_snapshot, giveaways))
 renew_mode = load_json(RENEW_MODE_FILE, {"mode": "15"})
+warm_pool = load_json(WARM_POOL_FILE, [])
+warm_pool_stats = {"hits": 0, "misses": 0}
+warm_pool_lock = asyncio.Lock()
 
 # ---------------- EMBED HELPERS ----------------
 def create_embed(title, description="", color=COLORS['info'], thumbnail=None, footer=None, author=None):
@@ -208,7 +482,7 @@ def add_unique_join(user_id, inviter_id):
         users[uid]['unique_joins'].append(user_id_str)
         users[uid]['inv_unclaimed'] += 1
         users[uid]['inv_total'] += 1
-        persist_users()
+        persist_users(uid)
         return True
     return False
 
@@ -223,7 +497,16 @@ class Bot(commands.Bot):
     def __init__(self):
         super().__init__(command_prefix="!", intents=intents)
 
+    async def close(self):
+        await log_shipper.stop()
+        await persist_scheduler.stop()
+        await super().close()
+
     async def setup_hook(self):
+        persist_scheduler.start()
+        log_shipper.start()
+        giveaway_provisioner.start()
+        giveaway_provisioner.resume()
         try:
             synced = await self.tree.sync()
             logger.info(f"Synced {len(synced)} command(s)")
@@ -265,10 +548,42 @@ async def docker_run_container(ram_gb, cpu, disk_gb):
     except Exception as e:
         return None, None, f"Container run exception: {str(e)}"
 
+async def docker_container_running(container_id):
+    proc = await asyncio.create_subprocess_exec(
+        "docker", "inspect", "-f", "{{.State.Running}}", container_id,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    stdout, _ = await proc.communicate()
+    return proc.returncode == 0 and stdout.decode().strip() == "true"
+
+async def docker_systemd_ready(container_id):
+    check = 'state=$(systemctl is-system-running 2>/dev/null); [ "$state" = running ] || [ "$state" = degraded ]'
+    proc = await asyncio.create_subprocess_exec(
+        "docker", "exec", container_id, "sh", "-c", check,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+    )
+    return await proc.wait() == 0
+
+async def wait_until(probe, description, timeout=READY_TIMEOUT, initial_delay=0.2, max_delay=3.0):
+    """Await probe() with exponential backoff until it is truthy, raising TimeoutError at the deadline"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    delay = initial_delay
+    while not await probe():
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            raise TimeoutError(f"Timed out after {timeout}s waiting for {description}")
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+async def wait_for_container_ready(container_id, timeout=READY_TIMEOUT):
+    """Wait until the container is running and its systemd has finished booting"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    await wait_until(lambda: docker_container_running(container_id), f"{container_id} to start", timeout)
+    remaining = max(0, deadline - asyncio.get_running_loop().time())
+    await wait_until(lambda: docker_systemd_ready(container_id), f"systemd in {container_id} to boot", remaining)
+
 async def setup_vps_environment(container_id):
     try:
-        await asyncio.sleep(15)
-        
         commands = [
             "apt-get update -y",
             "apt-get install -y tmate curl wget neofetch sudo nano htop",
@@ -385,109 +700,471 @@ async def check_systemctl_status(container_id):
         return False
 
 # ---------------- VPS Helpers ----------------
-def persist_vps(): 
-    save_json(VPS_FILE, vps_db)
+def persist_vps(*cids):
+    vps_db.persist(*cids)
 
-def persist_users(): 
-    save_json(USERS_FILE, users)
+def persist_users(*uids):
+    users.persist(*uids)
 
 def persist_renew_mode(): 
     save_json(RENEW_MODE_FILE, renew_mode)
 
-def persist_giveaways(): 
-    save_json(GIVEAWAY_FILE, giveaways)
+def persist_giveaways(*giveaway_ids):
+    giveaways.persist(*giveaway_ids)
 
-async def send_log(action: str, user, details: str = "", vps_id: str = ""):
-    """Send professional log embed to log channel"""
-    if not LOG_CHANNEL_ID:
-        return
+def persist_invite_snapshot(*guild_ids):
+    invite_snapshot.persist(*guild_ids)
+
+async def flush_stores():
+    """Write pending store changes now instead of at the next scheduled flush."""
+    await persist_scheduler.flush()
+
+def persist_warm_pool():
+    save_json(WARM_POOL_FILE, warm_pool)
+
+# ---------------- Warm Pool ----------------
+async def boot_vps_container(ram, cpu, disk, on_boot=None):
+    cid, http_port, err = await docker_run_container(ram, cpu, disk)
+    if err:
+        return None, None, err
+    if on_boot:
+        on_boot(cid)
+    
+    try:
+        await wait_for_container_ready(cid)
+    except TimeoutError as e:
+        await docker_remove_container(cid)
+        return None, None, str(e)
     
+    success, setup_err = await setup_vps_environment(cid)
+    if not success:
+        logger.warning(f"Setup had issues for {cid}: {setup_err}")
+    
+    return cid, http_port, None
+
+def claim_warm_container(ram, cpu, disk):
+    """Take a pre-booted container for the default plan, or None on a miss"""
+    if WARM_POOL_SIZE <= 0 or (ram, cpu, disk) != (DEFAULT_RAM_GB, DEFAULT_CPU, DEFAULT_DISK_GB):
+        return None
+    if not warm_pool:
+        warm_pool_stats['misses'] += 1
+        return None
+    entry = warm_pool.pop(0)
+    persist_warm_pool()
+    warm_pool_stats['hits'] += 1
+    bot.loop.create_task(refill_warm_pool())
+    return entry
+
+async def prune_warm_pool():
+    """Drop pool entries whose container is no longer running"""
     try:
-        channel = bot.get_channel(LOG_CHANNEL_ID)
-        if not channel:
-            print(f"Log channel {LOG_CHANNEL_ID} not found")
+        proc = await asyncio.create_subprocess_exec(
+            "docker", "ps", "--format", "{{.ID}}",
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, _ = await proc.communicate()
+        if proc.returncode != 0:
             return
-        
-        color_map = {
-            "deploy": COLORS['success'],
-            "remove": COLORS['warning'],
-            "renew": COLORS['info'],
-            "suspend": COLORS['error'],
-            "unsuspend": COLORS['success'],
-            "start": COLORS['success'],
-            "stop": COLORS['warning'],
-            "restart": COLORS['info'],
-            "share": COLORS['admin'],
-            "admin": COLORS['premium'],
-            "points": COLORS['vps'],
-            "invite": COLORS['giveaway'],
-            "error": COLORS['error']
-        }
-        
-        action_lower = action.lower()
-        color = COLORS['info']
-        for key, value in color_map.items():
-            if key in action_lower:
-                color = value
+        running = set(stdout.decode().split())
+    except Exception as e:
+        logger.warning(f"Could not check warm pool containers: {e}")
+        return
+    
+    alive = [entry for entry in warm_pool if entry['container_id'] in running]
+    if len(alive) != len(warm_pool):
+        warm_pool[:] = alive
+        persist_warm_pool()
+
+async def refill_warm_pool():
+    if WARM_POOL_SIZE <= 0:
+        return
+    async with warm_pool_lock:
+        while len(warm_pool) < WARM_POOL_SIZE:
+            cid, http_port, err = await boot_vps_container(DEFAULT_RAM_GB, DEFAULT_CPU, DEFAULT_DISK_GB)
+            if err:
+                logger.error(f"Warm pool refill failed: {err}")
                 break
-        
-        embed = create_embed(
-            f"📊 {action}",
-            color=color,
-            footer="VPS Activity Log"
-        )
-        
-        if hasattr(user, 'mention'):
-            embed.add_field(name="👤 User", value=f"{user.mention}\n`{user.name}`", inline=True)
-        else:
-            embed.add_field(name="👤 User", value=f"`{user}`", inline=True)
-        
-        if vps_id:
-            embed.add_field(name="🆔 VPS ID", value=f"`{vps_id}`", inline=True)
-        
-        if details:
-            embed.add_field(name="📝 Details", value=details[:1024], inline=False)
-        
-        embed.add_field(
-            name="⏰ Time", 
-            value=f"<t:{int(datetime.utcnow().timestamp())}:R>", 
-            inline=True
-        )
-        
-        await channel.send(embed=embed)
-        
-        logs_file = os.path.join(DATA_DIR, "vps_logs.json")
-        logs_data = load_json(logs_file, [])
-        
-        log_entry = {
+            warm_pool.append({
+                "container_id": cid,
+                "http_port": http_port,
+                "ram": DEFAULT_RAM_GB,
+                "cpu": DEFAULT_CPU,
+                "disk": DEFAULT_DISK_GB
+            })
+            persist_warm_pool()
+            logger.info(f"Warm pool booted {cid} ({len(warm_pool)}/{WARM_POOL_SIZE})")
+
+# ---------------- Activity Log ----------------
+class ActivityLog:
+    """Append-only activity log stored as rotated NDJSON segments.
+
+    The newest ACTIVITY_RING_SIZE entries are kept in a ring buffer, indexed by
+    vps_id, user_id and action, so /logs filters without reading the segments.
+    Segments are retired by total size and age instead of a fixed entry count.
+    """
+
+    INDEXED = ('vps_id', 'user_id', 'action')
+    LEGACY_FILE = os.path.join(DATA_DIR, "vps_logs.json")
+
+    def __init__(self, directory, ring_size):
+        self.directory = directory
+        self.ring = deque(maxlen=ring_size)
+        self.first_seq = 0  # Sequence number of ring[0]
+        self.indexes = {field: {} for field in self.INDEXED}
+        self.segment = None
+        self.segment_path = None
+        self.segment_size = 0
+        self.loaded = False
+
+    @staticmethod
+    def index_key(field, entry):
+        value = entry.get(field)
+        if not value:
+            return None
+        return str(value).lower() if field == 'action' else str(value)
+
+    def segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.ndjson")))
+
+    @staticmethod
+    def read_segment(path):
+        entries = []
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    def load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+        if not self.segment_paths() and os.path.exists(self.LEGACY_FILE):
+            self.import_legacy()
+
+        # Newest segments first, until the ring buffer is full.
+        chunks = []
+        wanted = self.ring.maxlen
+        for path in reversed(self.segment_paths()):
+            entries = self.read_segment(path)
+            chunks.append(entries)
+            wanted -= len(entries)
+            if wanted <= 0:
+                break
+        for entries in reversed(chunks):
+            for entry in entries:
+                self.remember(entry)
+
+        paths = self.segment_paths()
+        if paths and os.path.getsize(paths[-1]) < ACTIVITY_SEGMENT_BYTES:
+            self.open_segment(paths[-1])
+
+    def import_legacy(self):
+        """Carry the old whole-file vps_logs.json over into the first segment."""
+        for entry in load_json(self.LEGACY_FILE, []):
+            self.write(entry)
+        os.replace(self.LEGACY_FILE, self.LEGACY_FILE + ".imported")
+        logger.info(f"Imported {self.LEGACY_FILE} into {self.directory}")
+
+    def open_segment(self, path):
+        if self.segment:
+            self.segment.close()
+        self.segment = open(path, 'a')
+        self.segment_path = path
+        self.segment_size = os.path.getsize(path)
+
+    def rotate(self):
+        paths = self.segment_paths()
+        number = int(os.path.basename(paths[-1])[8:-7]) + 1 if paths else 1
+        self.open_segment(os.path.join(self.directory, f"segment-{number:08d}.ndjson"))
+        self.enforce_retention()
+
+    def enforce_retention(self):
+        cutoff = (datetime.utcnow() - timedelta(days=ACTIVITY_LOG_MAX_DAYS)).timestamp()
+        paths = [p for p in self.segment_paths() if p != self.segment_path]
+        total = sum(os.path.getsize(p) for p in paths) + self.segment_size
+        for path in paths:
+            # Segments are append-only, so mtime is the time of their newest entry.
+            if total <= ACTIVITY_LOG_MAX_BYTES and os.path.getmtime(path) >= cutoff:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+    def write(self, entry):
+        line = json.dumps(entry) + "\n"
+        if self.segment is None or (self.segment_size and self.segment_size + len(line) > ACTIVITY_SEGMENT_BYTES):
+            self.rotate()
+        self.segment.write(line)
+        self.segment.flush()
+        self.segment_size += len(line)
+
+    def remember(self, entry):
+        if len(self.ring) == self.ring.maxlen:
+            oldest = self.ring.popleft()
+            for field in self.INDEXED:
+                key = self.index_key(field, oldest)
+                if key is None:
+                    continue
+                seqs = self.indexes[field][key]
+                seqs.popleft()
+                if not seqs:
+                    del self.indexes[field][key]
+            self.first_seq += 1
+        seq = self.first_seq + len(self.ring)
+        self.ring.append(entry)
+        for field in self.INDEXED:
+            key = self.index_key(field, entry)
+            if key is not None:
+                self.indexes[field].setdefault(key, deque()).append(seq)
+
+    def record(self, action, user, details="", vps_id=None):
+        self.load()
+        entry = {
             "timestamp": datetime.utcnow().isoformat(),
             "action": action,
             "user": user.name if hasattr(user, 'name') else str(user),
+            "user_id": str(user.id) if hasattr(user, 'id') else None,
             "details": details,
             "vps_id": vps_id
         }
-        
-        logs_data.append(log_entry)
-        
-        if len(logs_data) > 1000:
-            logs_data = logs_data[-1000:]
-        
-        save_json(logs_file, logs_data)
-        
+        self.write(entry)
+        self.remember(entry)
+        return entry
+
+    def query(self, limit, vps_id=None, user_id=None, action=None):
+        """Newest-first entries matching every given filter."""
+        self.load()
+        filters = [
+            (field, self.index_key(field, {field: value}))
+            for field, value in (('vps_id', vps_id), ('user_id', user_id), ('action', action))
+            if value
+        ]
+        if filters:
+            # Walk the shortest posting list and check the remaining filters per entry.
+            postings = [self.indexes[field].get(key, ()) for field, key in filters]
+            candidates = reversed(min(postings, key=len))
+        else:
+            candidates = range(self.first_seq + len(self.ring) - 1, self.first_seq - 1, -1)
+        results = []
+        for seq in candidates:
+            entry = self.ring[seq - self.first_seq]
+            if all(self.index_key(field, entry) == key for field, key in filters):
+                results.append(entry)
+                if len(results) >= limit:
+                    break
+        return results
+
+activity_log = ActivityLog(ACTIVITY_LOG_DIR, ACTIVITY_RING_SIZE)
+
+LOG_ACTION_COLORS = {
+    "deploy": COLORS['success'],
+    "remove": COLORS['warning'],
+    "renew": COLORS['info'],
+    "suspend": COLORS['error'],
+    "unsuspend": COLORS['success'],
+    "start": COLORS['success'],
+    "stop": COLORS['warning'],
+    "restart": COLORS['info'],
+    "share": COLORS['admin'],
+    "admin": COLORS['premium'],
+    "points": COLORS['vps'],
+    "invite": COLORS['giveaway'],
+    "error": COLORS['error']
+}
+LOG_EMBED_FIELDS = 25  # Discord's per-embed limits
+LOG_EMBED_CHARS = 5500
+
+def log_color(action):
+    action_lower = action.lower()
+    for key, value in LOG_ACTION_COLORS.items():
+        if key in action_lower:
+            return value
+    return COLORS['info']
+
+def log_event_embed(event):
+    """The single-event embed, as posted when nothing else is queued"""
+    embed = create_embed(f"📊 {event['action']}", color=log_color(event['action']), footer="VPS Activity Log")
+    embed.add_field(name="👤 User", value=event['user'], inline=True)
+    if event['vps_id']:
+        embed.add_field(name="🆔 VPS ID", value=f"`{event['vps_id']}`", inline=True)
+    if event['details']:
+        embed.add_field(name="📝 Details", value=event['details'][:1024], inline=False)
+    embed.add_field(name="⏰ Time", value=f"<t:{event['time']}:R>", inline=True)
+    return embed
+
+def log_event_field(event):
+    value = f"👤 {event['user'].splitlines()[0]} • ⏰ <t:{event['time']}:R>"
+    if event['vps_id']:
+        value += f"\n🆔 `{event['vps_id']}`"
+    if event['details']:
+        value += f"\n📝 {event['details'][:300]}"
+    return f"📊 {event['action']}"[:256], value[:1024]
+
+def log_event_line(event):
+    stamp = datetime.utcfromtimestamp(event['time']).strftime('%Y-%m-%d %H:%M:%S')
+    user = event['user'].splitlines()[-1].strip('`')
+    return f"{stamp} UTC | {event['action']} | {user} | {event['vps_id'] or '-'} | {event['details']}"
+
+class LogShipper:
+    """Delivers send_log events to the log channel from a background task.
+
+    Events are gathered for LOG_BATCH_WINDOW seconds (or until an embed is
+    full) and posted as one embed with a field per event; a backlog beyond
+    LOG_FILE_THRESHOLD goes out as a single text attachment. Messages are
+    spaced LOG_SEND_INTERVAL apart and retried with backoff on rate limits
+    and server errors.
+    """
+
+    def __init__(self):
+        self.pending = deque()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.next_send = 0.0
+        self.sent = 0
+        self.dropped = 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def submit(self, event):
+        self.pending.append(event)
+        self.wakeup.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.wakeup.wait()
+            deadline = loop.time() + LOG_BATCH_WINDOW
+            while len(self.pending) < LOG_EMBED_FIELDS and loop.time() < deadline:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+            self.wakeup.clear()
+            try:
+                await self.ship()
+            except Exception as e:
+                logger.error(f"Failed to ship logs: {e}")
+
+    def take_batch(self):
+        if len(self.pending) > LOG_FILE_THRESHOLD:
+            events = list(self.pending)
+            self.pending.clear()
+            return events
+        events, size = [], 0
+        while self.pending and len(events) < LOG_EMBED_FIELDS:
+            name, value = log_event_field(self.pending[0])
+            if events and size + len(name) + len(value) > LOG_EMBED_CHARS:
+                break
+            size += len(name) + len(value)
+            events.append(self.pending.popleft())
+        return events
+
+    def render(self, events):
+        if len(events) == 1:
+            return {'embed': log_event_embed(events[0])}
+        if len(events) <= LOG_EMBED_FIELDS:
+            embed = create_embed(f"📊 {len(events)} Activities", color=COLORS['info'], footer="VPS Activity Log")
+            for event in events:
+                name, value = log_event_field(event)
+                embed.add_field(name=name, value=value, inline=False)
+            return {'embed': embed}
+        counts = {}
+        for event in events:
+            counts[event['action']] = counts.get(event['action'], 0) + 1
+        summary = "\n".join(f"• **{action}** × {count}" for action, count in sorted(counts.items(), key=lambda item: -item[1]))
+        embed = create_embed(f"📊 {len(events)} Activities", summary[:4000], COLORS['info'], footer="VPS Activity Log")
+        text = "\n".join(log_event_line(event) for event in events) + "\n"
+        filename = f"activity-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.txt"
+        return {'embed': embed, 'file': discord.File(io.BytesIO(text.encode()), filename=filename)}
+
+    async def deliver(self, channel, events):
+        loop = asyncio.get_running_loop()
+        delay = 1.0
+        for attempt in range(LOG_SEND_RETRIES):
+            wait = self.next_send - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                # Rendered per attempt: a discord.File cannot be sent twice.
+                await channel.send(**self.render(events))
+                self.next_send = loop.time() + LOG_SEND_INTERVAL
+                self.sent += 1
+                return True
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    logger.error(f"Log channel rejected {len(events)} event(s): {e}")
+                    return False
+                delay = max(delay, getattr(e, 'retry_after', 0) or 0)
+                logger.warning(f"Log channel send failed ({e.status}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+        return False
+
+    async def ship(self):
+        while self.pending:
+            channel = bot.get_channel(LOG_CHANNEL_ID) if LOG_CHANNEL_ID else None
+            if not channel:
+                logger.warning(f"Log channel {LOG_CHANNEL_ID} not found, dropping {len(self.pending)} event(s)")
+                self.dropped += len(self.pending)
+                self.pending.clear()
+                return
+            events = self.take_batch()
+            try:
+                delivered = await self.deliver(channel, events)
+            except asyncio.CancelledError:
+                # Interrupted by stop(); hand the batch back so the final flush sends it.
+                self.pending.extendleft(reversed(events))
+                raise
+            if not delivered:
+                self.dropped += len(events)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        try:
+            await asyncio.wait_for(self.ship(), timeout=10)
+        except Exception as e:
+            logger.error(f"Unsent logs at shutdown: {e}")
+
+log_shipper = LogShipper()
+
+async def send_log(action: str, user, vps_id: str = None, details: str = ""):
+    """Record an activity and queue it for the log channel"""
+    try:
+        activity_log.record(action, user, details, vps_id)
     except Exception as e:
-        print(f"Failed to send log: {e}")
+        logger.error(f"Failed to record activity: {e}")
 
-async def create_vps(owner_id, ram=DEFAULT_RAM_GB, cpu=DEFAULT_CPU, disk=DEFAULT_DISK_GB, paid=False, giveaway=False):
-    uid = str(owner_id)
-    cid, http_port, err = await docker_run_container(ram, cpu, disk)
-    if err: 
-        return {'error': err}
-    
-    await asyncio.sleep(10)
+    if not LOG_CHANNEL_ID:
+        return
     
-    success, setup_err = await setup_vps_environment(cid)
-    if not success:
-        logger.warning(f"Setup had issues for {cid}: {setup_err}")
+    log_shipper.submit({
+        "action": action,
+        "user": f"{user.mention}\n`{user.name}`" if hasattr(user, 'mention') else f"`{user}`",
+        "vps_id": vps_id,
+        "details": details or "",
+        "time": int(datetime.utcnow().timestamp())
+    })
+
+async def create_vps(owner_id, ram=DEFAULT_RAM_GB, cpu=DEFAULT_CPU, disk=DEFAULT_DISK_GB, paid=False, giveaway=False, giveaway_id=None, on_boot=None):
+    """Boot (or claim from the warm pool) and record a VPS; on_boot(cid) is called as soon as the container exists"""
+    uid = str(owner_id)
+    pooled = claim_warm_container(ram, cpu, disk)
+    if pooled:
+        cid, http_port = pooled['container_id'], pooled['http_port']
+        if on_boot:
+            on_boot(cid)
+    else:
+        cid, http_port, err = await boot_vps_container(ram, cpu, disk, on_boot)
+        if err: 
+            return {'error': err}
     
     ssh, ssh_err = await docker_exec_capture_ssh(cid)
     systemctl_works = await check_systemctl_status(cid)
@@ -508,12 +1185,13 @@ async def create_vps(owner_id, ram=DEFAULT_RAM_GB, cpu=DEFAULT_CPU, disk=DEFAULT
         "suspended": False,
         "paid_plan": paid,
         "giveaway_vps": giveaway,
+        "giveaway_id": giveaway_id,
         "shared_with": [],
         "additional_ports": [],
         "systemctl_working": systemctl_works
     }
     vps_db[cid] = rec
-    persist_vps()
+    persist_vps(cid)
     
     try:
         user = await bot.fetch_user(int(uid))
@@ -536,42 +1214,201 @@ def can_manage_vps(user_id, container_id):
     uid = str(user_id)
     return vps['owner'] == uid or uid in vps.get('shared_with', [])
 
+def host_resources():
+    return {
+        'ram': os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 3,
+        'cpu': os.cpu_count() or 1,
+        'disk': shutil.disk_usage(DATA_DIR).total / 1024 ** 3
+    }
+
 def get_resource_usage():
+    """Allocated RAM/CPU/disk as a share of the host's; past 100% means the host is overcommitted"""
     total_ram = sum(vps['ram'] for vps in vps_db.values())
     total_cpu = sum(vps['cpu'] for vps in vps_db.values())
     total_disk = sum(vps['disk'] for vps in vps_db.values())
-    
-    ram_percent = (total_ram / (DEFAULT_RAM_GB * 100)) * 100
-    cpu_percent = (total_cpu / (DEFAULT_CPU * 50)) * 100
-    disk_percent = (total_disk / (DEFAULT_DISK_GB * 200)) * 100
+    host = host_resources()
     
     return {
-        'ram': min(ram_percent, 100),
-        'cpu': min(cpu_percent, 100),
-        'disk': min(disk_percent, 100),
+        'ram': total_ram / host['ram'] * 100,
+        'cpu': total_cpu / host['cpu'] * 100,
+        'disk': total_disk / host['disk'] * 100,
         'total_ram': total_ram,
         'total_cpu': total_cpu,
-        'total_disk': total_disk
+        'total_disk': total_disk,
+        'host_ram': host['ram'],
+        'host_cpu': host['cpu'],
+        'host_disk': host['disk']
     }
 
+# ---------------- Giveaway Provisioning ----------------
+
+def provisioning_headroom(ram, cpu, disk):
+    """How many more VPS of this size fit, counting giveaway jobs not yet created"""
+    usage = get_resource_usage()
+    committed = {'ram': usage['total_ram'], 'cpu': usage['total_cpu'], 'disk': usage['total_disk']}
+    for giveaway in giveaways.values():
+        if giveaway.get('status') != 'provisioning':
+            continue
+        waiting = sum(1 for job in giveaway['jobs'].values() if job['status'] in ('queued', 'running'))
+        committed['ram'] += waiting * giveaway['vps_ram']
+        committed['cpu'] += waiting * giveaway['vps_cpu']
+        committed['disk'] += waiting * giveaway['vps_disk']
+    host = host_resources()
+    size = {'ram': ram, 'cpu': cpu, 'disk': disk}
+    return max(0, min(int((host[k] * HOST_OVERCOMMIT - committed[k]) // size[k]) for k in size if size[k] > 0))
+
+async def notify_giveaway_vps(user_id, rec, title):
+    try:
+        recipient = await bot.fetch_user(int(user_id))
+        embed = create_embed(
+            title,
+            color=COLORS['giveaway'],
+            footer="This is a giveaway VPS and cannot be renewed. It will auto-delete after 15 days."
+        )
+        embed.add_field(name="Container ID", value=f"`{rec['container_id']}`", inline=False)
+        embed.add_field(name="Specs", value=f"**{rec['ram']}GB RAM** | **{rec['cpu']} CPU** | **{rec['disk']}GB Disk**", inline=False)
+        embed.add_field(name="Expires", value=rec['expires_at'][:10], inline=True)
+        embed.add_field(name="Status", value="🟢 Active", inline=True)
+        embed.add_field(name="HTTP Access", value=f"http://{SERVER_IP}:{rec['http_port']}", inline=False)
+        embed.add_field(name="SSH Connection", value=f"```{rec['ssh']}```", inline=False)
+        await recipient.send(embed=embed)
+    except:
+        pass
+
+class GiveawayProvisioner:
+    """Creates giveaway VPS on a bounded pool of workers.
+
+    Every recipient is a job stored in giveaway['jobs'] (queued -> running ->
+    done/failed, or skipped when the host has no room), so progress shows in
+    /giveaway_list and resume() carries on after a restart. The giveaway stays
+    in 'provisioning' until every job has settled.
+    """
+
+    def __init__(self, workers):
+        self.size = workers
+        self.queue = asyncio.Queue()
+        self.workers = []
+
+    def start(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self.worker()) for _ in range(self.size)]
+
+    def fan_out(self, giveaway_id, recipients):
+        giveaway = giveaways[giveaway_id]
+        headroom = provisioning_headroom(giveaway['vps_ram'], giveaway['vps_cpu'], giveaway['vps_disk'])
+        jobs = giveaway.setdefault('jobs', {})
+        giveaway['status'] = 'provisioning'
+        for user_id in recipients:
+            if user_id in jobs:
+                continue
+            if headroom > 0:
+                jobs[user_id] = {'status': 'queued'}
+                self.queue.put_nowait((giveaway_id, user_id))
+                headroom -= 1
+            else:
+                jobs[user_id] = {'status': 'skipped', 'error': 'Insufficient host capacity'}
+        skipped = sum(1 for job in jobs.values() if job['status'] == 'skipped')
+        if skipped:
+            logger.warning(f"Giveaway {giveaway_id}: no capacity for {skipped} of {len(jobs)} VPS")
+        persist_giveaways(giveaway_id)
+        self.finish_if_done(giveaway_id)
+
+    def resume(self):
+        for giveaway_id, giveaway in giveaways.items():
+            if giveaway.get('status') != 'provisioning':
+                continue
+            resumed = 0
+            for user_id, job in giveaway['jobs'].items():
+                if job['status'] in ('queued', 'running'):
+                    self.queue.put_nowait((giveaway_id, user_id))
+                    resumed += 1
+            logger.info(f"Resuming {resumed} provisioning job(s) for giveaway {giveaway_id}")
+            self.finish_if_done(giveaway_id)
+
+    async def worker(self):
+        while True:
+            giveaway_id, user_id = await self.queue.get()
+            try:
+                await self.run_job(giveaway_id, user_id)
+            except Exception as e:
+                logger.error(f"Giveaway {giveaway_id} job for {user_id} failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def run_job(self, giveaway_id, user_id):
+        giveaway = giveaways[giveaway_id]
+        job = giveaway['jobs'][user_id]
+        # A job that was running when the bot stopped may already have its VPS.
+        rec = next((v for v in vps_db.values() if v.get('giveaway_id') == giveaway_id and v['owner'] == user_id), None)
+        if rec is None:
+            # Or only its container, booted but never recorded as a VPS.
+            await self.discard_container(giveaway_id, job)
+            job['status'] = 'running'
+            job['started_at'] = datetime.utcnow().isoformat()
+            persist_giveaways(giveaway_id)
+
+            def booted(cid):
+                job['container_id'] = cid
+                persist_giveaways(giveaway_id)
+
+            try:
+                rec = await create_vps(int(user_id), giveaway['vps_ram'], giveaway['vps_cpu'], giveaway['vps_disk'], giveaway=True, giveaway_id=giveaway_id, on_boot=booted)
+            except Exception as e:
+                rec = {'error': str(e)}
+
+        if 'error' in rec:
+            await self.discard_container(giveaway_id, job)
+            job['status'] = 'failed'
+            job['error'] = rec['error']
+            logger.error(f"Failed to create VPS for giveaway {giveaway_id} recipient {user_id}: {rec['error']}")
+        else:
+            job['status'] = 'done'
+            job['container_id'] = rec['container_id']
+            title = "🎉 You Won a VPS Giveaway!" if giveaway['winner_type'] == 'random' else "🎉 You Received a VPS from Giveaway!"
+            await notify_giveaway_vps(user_id, rec, title)
+        persist_giveaways(giveaway_id)
+        self.finish_if_done(giveaway_id)
+
+    async def discard_container(self, giveaway_id, job):
+        """Remove the container a job booted if it never became a VPS"""
+        cid = job.pop('container_id', None)
+        if cid and cid not in vps_db:
+            logger.warning(f"Giveaway {giveaway_id}: removing unrecorded container {cid}")
+            await docker_remove_container(cid)
+
+    def finish_if_done(self, giveaway_id):
+        giveaway = giveaways[giveaway_id]
+        jobs = giveaway['jobs']
+        if any(job['status'] in ('queued', 'running') for job in jobs.values()):
+            return
+        created = [job['container_id'] for job in jobs.values() if job['status'] == 'done']
+        giveaway['successful_creations'] = len(created)
+        giveaway['vps_created'] = bool(created)
+        if giveaway['winner_type'] == 'random' and created:
+            giveaway['winner_vps_id'] = created[0]
+        giveaway['status'] = 'ended'
+        persist_giveaways(giveaway_id)
+
+giveaway_provisioner = GiveawayProvisioner(PROVISION_WORKERS)
+
 # ---------------- Background Tasks ----------------
 @tasks.loop(minutes=10)
 async def expire_check_loop():
     now = datetime.utcnow()
-    changed = False
+    changed = []
     for cid, rec in list(vps_db.items()):
         if rec.get('active', True) and now >= datetime.fromisoformat(rec['expires_at']):
             await docker_stop_container(cid)
             rec['active'] = False
             rec['suspended'] = True
-            changed = True
+            changed.append(cid)
             try:
                 user = await bot.fetch_user(int(rec['owner']))
                 await send_log("VPS Expired", user, cid, "Auto-suspended due to expiry")
             except:
                 pass
     if changed: 
-        persist_vps()
+        persist_vps(*changed)
 
 @tasks.loop(minutes=5)
 async def giveaway_check_loop():
@@ -581,76 +1418,20 @@ async def giveaway_check_loop():
     for giveaway_id, giveaway in list(giveaways.items()):
         if giveaway['status'] == 'active' and now >= datetime.fromisoformat(giveaway['end_time']):
             participants = giveaway.get('participants', [])
-            if participants:
-                if giveaway['winner_type'] == 'random':
-                    winner_id = random.choice(participants)
-                    giveaway['winner_id'] = winner_id
-                    giveaway['status'] = 'ended'
-                    
-                    try:
-                        rec = await create_vps(int(winner_id), giveaway['vps_ram'], giveaway['vps_cpu'], giveaway['vps_disk'], giveaway_vps=True)
-                        if 'error' not in rec:
-                            giveaway['vps_created'] = True
-                            giveaway['winner_vps_id'] = rec['container_id']
-                            
-                            try:
-                                winner = await bot.fetch_user(int(winner_id))
-                                embed = create_embed(
-                                    "🎉 You Won a VPS Giveaway!",
-                                    color=COLORS['giveaway'],
-                                    footer="This is a giveaway VPS and cannot be renewed. It will auto-delete after 15 days."
-                                )
-                                embed.add_field(name="Container ID", value=f"`{rec['container_id']}`", inline=False)
-                                embed.add_field(name="Specs", value=f"**{rec['ram']}GB RAM** | **{rec['cpu']} CPU** | **{rec['disk']}GB Disk**", inline=False)
-                                embed.add_field(name="Expires", value=rec['expires_at'][:10], inline=True)
-                                embed.add_field(name="Status", value="🟢 Active", inline=True)
-                                embed.add_field(name="HTTP Access", value=f"http://{SERVER_IP}:{rec['http_port']}", inline=False)
-                                embed.add_field(name="SSH Connection", value=f"```{rec['ssh']}```", inline=False)
-                                await winner.send(embed=embed)
-                            except:
-                                pass
-                    except Exception as e:
-                        logger.error(f"Failed to create VPS for giveaway winner: {e}")
-                
-                elif giveaway['winner_type'] == 'all':
-                    successful_creations = 0
-                    for participant_id in participants:
-                        try:
-                            rec = await create_vps(int(participant_id), giveaway['vps_ram'], giveaway['vps_cpu'], giveaway['vps_disk'], giveaway_vps=True)
-                            if 'error' not in rec:
-                                successful_creations += 1
-                                
-                                try:
-                                    participant = await bot.fetch_user(int(participant_id))
-                                    embed = create_embed(
-                                        "🎉 You Received a VPS from Giveaway!",
-                                        color=COLORS['giveaway'],
-                                        footer="This is a giveaway VPS and cannot be renewed. It will auto-delete after 15 days."
-                                    )
-                                    embed.add_field(name="Container ID", value=f"`{rec['container_id']}`", inline=False)
-                                    embed.add_field(name="Specs", value=f"**{rec['ram']}GB RAM** | **{rec['cpu']} CPU** | **{rec['disk']}GB Disk**", inline=False)
-                                    embed.add_field(name="Expires", value=rec['expires_at'][:10], inline=True)
-                                    embed.add_field(name="Status", value="🟢 Active", inline=True)
-                                    embed.add_field(name="HTTP Access", value=f"http://{SERVER_IP}:{rec['http_port']}", inline=False)
-                                    embed.add_field(name="SSH Connection", value=f"```{rec['ssh']}```", inline=False)
-                                    await participant.send(embed=embed)
-                                except:
-                                    pass
-                        except Exception as e:
-                            logger.error(f"Failed to create VPS for giveaway participant: {e}")
-                    
-                    giveaway['vps_created'] = True
-                    giveaway['successful_creations'] = successful_creations
-                    giveaway['status'] = 'ended'
-            
+            # VPS creation takes minutes, so it runs on the provisioner's workers.
+            if participants and giveaway['winner_type'] == 'random':
+                winner_id = random.choice(participants)
+                giveaway['winner_id'] = winner_id
+                giveaway_provisioner.fan_out(giveaway_id, [winner_id])
+            elif participants and giveaway['winner_type'] == 'all':
+                giveaway_provisioner.fan_out(giveaway_id, participants)
             else:
                 giveaway['status'] = 'ended'
-                giveaway['no_participants'] = True
-            
-            ended_giveaways.append(giveaway_id)
+                giveaway['no_participants'] = not participants
+                ended_giveaways.append(giveaway_id)
     
     if ended_giveaways:
-        persist_giveaways()
+        persist_giveaways(*ended_giveaways)
 
 # ---------------- Bot Events ----------------
 @bot.event
@@ -659,6 +1440,9 @@ async def on_ready():
     logger.info(f"Connected to {len(bot.guilds)} guilds")
     expire_check_loop.start()
     giveaway_check_loop.start()
+    if WARM_POOL_SIZE > 0:
+        await prune_warm_pool()
+        bot.loop.create_task(refill_warm_pool())
 
 @bot.event
 async def on_message(message):
@@ -722,7 +1506,7 @@ async def on_member_join(member):
                 'inviter': invite.inviter.id if invite.inviter else None
             } for invite in invites_after
         }
-        save_json(INV_CACHE_FILE, invite_snapshot)
+        persist_invite_snapshot(str(guild.id))
         
     except Exception as e:
         logger.error(f"Error tracking invite: {e}")
@@ -755,7 +1539,7 @@ class EnhancedManageView(discord.ui.View):
             success = await docker_start_container(self.container_id)
             if success:
                 self.vps['active'] = True
-                persist_vps()
+                persist_vps(self.container_id)
                 await send_log("VPS Started", interaction.user, self.container_id)
                 
                 embed = create_success_embed(
@@ -780,7 +1564,7 @@ class EnhancedManageView(discord.ui.View):
             success = await docker_stop_container(self.container_id)
             if success:
                 self.vps['active'] = False
-                persist_vps()
+                persist_vps(self.container_id)
                 await send_log("VPS Stopped", interaction.user, self.container_id)
                 
                 embed = create_warning_embed(
@@ -809,7 +1593,7 @@ class EnhancedManageView(discord.ui.View):
         if success:
             self.vps['active'] = True
             self.vps['suspended'] = False
-            persist_vps()
+            persist_vps(self.container_id)
             await send_log("VPS Restarted", interaction.user, self.container_id)
             
             embed = create_success_embed(
@@ -865,7 +1649,7 @@ class EnhancedManageView(discord.ui.View):
             vps_db.pop(self.container_id, None)
             rec['expires_at'] = old_expiry
             vps_db[rec['container_id']] = rec
-            persist_vps()
+            persist_vps(self.container_id, rec['container_id'])
             
             await send_log("VPS Reinstalled", interaction.user, rec['container_id'], "Full system reset")
             
@@ -960,7 +1744,7 @@ class EnhancedManageView(discord.ui.View):
         uid = str(interaction.user.id)
         if uid not in users:
             users[uid] = {"points": 0, "inv_unclaimed": 0, "inv_total": 0}
-            persist_users()
+            persist_users(uid)
         
         current_mode = renew_mode.get("mode", "15")
         cost = POINTS_RENEW_15 if current_mode == "15" else POINTS_RENEW_30
@@ -1002,19 +1786,20 @@ class EnhancedManageView(discord.ui.View):
             await confirm_interaction.response.defer(ephemeral=True)
             
             users[uid]['points'] -= cost
-            persist_users()
+            persist_users(uid)
+            await flush_stores()
             
             self.vps['expires_at'] = new_expiry.isoformat()
             self.vps['active'] = True
             self.vps['suspended'] = False
-            persist_vps()
+            persist_vps(self.container_id)
             
             await send_log("VPS Renewed", interaction.user, self.container_id, f"Extended by {days} days")
             
             if not self.vps['active']:
                 await docker_start_container(self.container_id)
                 self.vps['active'] = True
-                persist_vps()
+                persist_vps(self.container_id)
             
             success_embed = create_success_embed(
                 f"**{self.container_id}** has been renewed for **{days} days**",
@@ -1057,7 +1842,7 @@ class EnhancedManageView(discord.ui.View):
             await interaction.followup.send(embed=embed, ephemeral=True)
         
         self.vps['ssh'] = ssh
-        persist_vps()
+        persist_vps(self.container_id)
         await send_log("SSH Reset", interaction.user, self.container_id)
         
         embed = create_success_embed(
@@ -1093,7 +1878,7 @@ class GiveawayView(discord.ui.View):
         
         participants.append(participant_id)
         giveaway['participants'] = participants
-        persist_giveaways()
+        persist_giveaways(self.giveaway_id)
         
         embed = create_success_embed("You have successfully joined the giveaway!")
         await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -1109,7 +1894,7 @@ async def deploy(interaction: discord.Interaction):
     uid = str(interaction.user.id)
     if uid not in users: 
         users[uid] = {"points": 0, "inv_unclaimed": 0, "inv_total": 0}
-        persist_users()
+        persist_users(uid)
     
     has_enough_points = users[uid]['points'] >= POINTS_PER_DEPLOY
     is_admin = interaction.user.id in ADMIN_IDS
@@ -1149,7 +1934,8 @@ async def deploy(interaction: discord.Interaction):
     if not is_admin:
         users[uid]['points'] -= POINTS_PER_DEPLOY
         points_deducted = POINTS_PER_DEPLOY
-        persist_users()
+        persist_users(uid)
+        await flush_stores()
     
     systemctl_status = "✅ Working" if rec.get('systemctl_working') else "⚠️ Limited"
     
@@ -1298,11 +2084,11 @@ async def remove_vps(interaction: discord.Interaction, container_id: str):
     refund_given = False
     if rec['owner'] == uid and interaction.user.id not in ADMIN_IDS and not rec.get('giveaway_vps', False):
         users[uid]['points'] += refund_amount
-        persist_users()
+        persist_users(uid)
         refund_given = True
     
     vps_db.pop(cid, None)
-    persist_vps()
+    persist_vps(cid)
     await send_log("VPS Removed", interaction.user, cid)
     
     result_embed = create_success_embed(f"VPS `{cid}` removed successfully.")
@@ -1424,9 +2210,16 @@ async def status(interaction: discord.Interaction):
         usage = get_resource_usage()
         embed.add_field(
             name="📈 Resource Usage", 
-            value=f"**RAM:** {usage['ram']:.1f}% ({usage['total_ram']}GB)\n**CPU:** {usage['cpu']:.1f}% ({usage['total_cpu']} cores)\n**Disk:** {usage['disk']:.1f}% ({usage['total_disk']}GB)", 
+            value=f"**RAM:** {usage['ram']:.1f}% ({usage['total_ram']}/{usage['host_ram']:.0f}GB)\n**CPU:** {usage['cpu']:.1f}% ({usage['total_cpu']}/{usage['host_cpu']} cores)\n**Disk:** {usage['disk']:.1f}% ({usage['total_disk']}/{usage['host_disk']:.0f}GB)\n**Overcommit limit:** {HOST_OVERCOMMIT:g}x", 
             inline=False
         )
+        if WARM_POOL_SIZE > 0:
+            embed.add_field(
+                name="⚡ Warm Pool",
+                value=f"**Idle:** {len(warm_pool)}/{WARM_POOL_SIZE}\n**Hits:** {warm_pool_stats['hits']} | **Misses:** {warm_pool_stats['misses']}",
+                inline=False
+            )
+        embed.add_field(name="💾 Store Writes", value=f"`{persist_scheduler.writes}`", inline=True)
     
     try:
         proc = await asyncio.create_subprocess_exec(
@@ -1490,7 +2283,7 @@ async def port_add(interaction: discord.Interaction, container_id: str, port: in
         if 'additional_ports' not in vps:
             vps['additional_ports'] = []
         vps['additional_ports'].append(port)
-        persist_vps()
+        persist_vps(cid)
         await send_log("Port Added", interaction.user, cid, f"Port: {port}")
         
         embed = create_success_embed(f"Port {port} added successfully to VPS `{cid}`")
@@ -1539,7 +2332,7 @@ async def mass_port(interaction: discord.Interaction, port: int, container_ids:
         else:
             invalid_containers.append(cid)
     
-    persist_vps()
+    persist_vps(*valid_containers)
     await send_log("Mass Port Add", interaction.user, None, f"Port: {port}, Success: {len(valid_containers)}, Failed: {len(invalid_containers)}")
     
     embed = create_success_embed(f"Port {port} added to {len(valid_containers)} VPS")
@@ -1579,7 +2372,7 @@ async def share_vps(interaction: discord.Interaction, container_id: str, user: d
         vps['shared_with'] = []
     
     vps['shared_with'].append(str(user.id))
-    persist_vps()
+    persist_vps(cid)
     await send_log("VPS Shared", interaction.user, cid, f"Shared with: {user.name}")
     
     embed = create_success_embed(f"VPS `{cid}` shared with {user.mention}")
@@ -1611,7 +2404,7 @@ async def share_remove(interaction: discord.Interaction, container_id: str, user
         return
     
     vps['shared_with'].remove(str(user.id))
-    persist_vps()
+    persist_vps(cid)
     await send_log("Share Removed", interaction.user, cid, f"Removed from: {user.name}")
     
     embed = create_success_embed(f"Removed VPS access from {user.mention}")
@@ -1779,8 +2572,13 @@ async def set_log_channel(interaction: discord.Interaction, channel: discord.Tex
     )
 
 @bot.tree.command(name="logs", description="[ADMIN] View recent VPS activities")
-@app_commands.describe(limit="Number of logs to show (default: 10, max: 25)")
-async def view_logs(interaction: discord.Interaction, limit: int = 10):
+@app_commands.describe(
+    limit="Number of logs to show (default: 10, max: 25)",
+    container_id="Only show activity for this VPS",
+    user="Only show activity by this user",
+    action="Only show this action, e.g. VPS Renewed"
+)
+async def view_logs(interaction: discord.Interaction, limit: int = 10, container_id: str = None, user: discord.User = None, action: str = None):
     """[ADMIN] View recent VPS activity logs"""
     if not await check_channel(interaction):
         return
@@ -1795,16 +2593,17 @@ async def view_logs(interaction: discord.Interaction, limit: int = 10):
     if limit < 1:
         limit = 10
     
-    logs_file = os.path.join(DATA_DIR, "vps_logs.json")
-    logs_data = load_json(logs_file, [])
+    recent_logs = activity_log.query(limit, vps_id=container_id, user_id=str(user.id) if user else None, action=action)
     
-    if not logs_data:
-        embed = create_embed("📊 VPS Activity Logs", "No logs found yet. Activities will appear here once they occur.", COLORS['info'])
+    if not recent_logs:
+        if container_id or user or action:
+            message = "No recent activity matches those filters."
+        else:
+            message = "No logs found yet. Activities will appear here once they occur."
+        embed = create_embed("📊 VPS Activity Logs", message, COLORS['info'])
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
     
-    recent_logs = list(reversed(logs_data[-limit:]))
-    
     embed = create_embed("📊 VPS Activity Logs", f"Showing last **{len(recent_logs)}** activities", COLORS['info'])
     
     total_vps = len(vps_db)
@@ -1823,7 +2622,7 @@ async def view_logs(interaction: discord.Interaction, limit: int = 10):
         timestamp = log.get('timestamp', 'Unknown')
         action = log.get('action', 'Unknown')
         user = log.get('user', 'Unknown')
-        details = log.get('details', '')
+        details = log.get('details') or ''
         
         try:
             if isinstance(timestamp, str) and timestamp != 'Unknown':
@@ -1890,7 +2689,7 @@ async def suspend_vps(interaction: discord.Interaction, container_id: str):
     if success:
         vps['active'] = False
         vps['suspended'] = True
-        persist_vps()
+        persist_vps(cid)
         await send_log("VPS Suspended", interaction.user, cid, "Admin suspension")
         
         embed = create_success_embed(f"VPS `{cid}` suspended successfully.")
@@ -1930,7 +2729,7 @@ async def unsuspend_vps(interaction: discord.Interaction, container_id: str):
     if success:
         vps['active'] = True
         vps['suspended'] = False
-        persist_vps()
+        persist_vps(cid)
         await send_log("VPS Unsuspended", interaction.user, cid, "Admin unsuspension")
         
         embed = create_success_embed(f"VPS `{cid}` unsuspended successfully.")
@@ -1985,7 +2784,7 @@ async def pointbal(interaction: discord.Interaction):
     uid = str(interaction.user.id)
     if uid not in users:
         users[uid] = {"points": 0, "inv_unclaimed": 0, "inv_total": 0}
-        persist_users()
+        persist_users(uid)
     
     embed = create_embed("💰 Your Points Balance", color=COLORS['premium'])
     embed.add_field(name="Available Points", value=users[uid]['points'], inline=True)
@@ -2015,7 +2814,7 @@ async def inv(interaction: discord.Interaction):
             "invites": [],
             "unique_joins": []
         }
-        persist_users()
+        persist_users(uid)
     
     user_data = users[uid]
     unique_invites = len(user_data.get('unique_joins', []))
@@ -2056,7 +2855,7 @@ async def inv(interaction: discord.Interaction):
         inline=False
     )
 
-     if user_data['inv_unclaimed'] > 0:
+    if user_data['inv_unclaimed'] > 0:
         embed.add_field(
             name="⚡ **Quick Action**",
             value=f"Use `/claimpoint` to convert **{user_data['inv_unclaimed']} invites** → **{user_data['inv_unclaimed']} points**!",
@@ -2090,7 +2889,7 @@ async def claimpoint(interaction: discord.Interaction):
     uid = str(interaction.user.id)
     if uid not in users:
         users[uid] = {"points": 0, "inv_unclaimed": 0, "inv_total": 0, "unique_joins": []}
-        persist_users()
+        persist_users(uid)
     
     user_data = users[uid]
     
@@ -2101,7 +2900,7 @@ async def claimpoint(interaction: discord.Interaction):
         
         user_data['points'] += points_to_add
         user_data['inv_unclaimed'] = 0
-        persist_users()
+        persist_users(uid)
         
         embed = create_success_embed("Unique Invites Converted!")
         embed.add_field(
@@ -2171,7 +2970,8 @@ async def point_share(interaction: discord.Interaction, amount: int, user: disco
     
     users[sender_id]['points'] -= amount
     users[receiver_id]['points'] += amount
-    persist_users()
+    persist_users(sender_id, receiver_id)
+    await flush_stores()
     
     embed = create_success_embed("Points Shared Successfully!")
     embed.add_field(name="From", value=interaction.user.mention, inline=True)
@@ -2272,7 +3072,7 @@ async def giveaway_create(interaction: discord.Interaction, duration_minutes: in
     }
     
     giveaways[giveaway_id] = giveaway
-    persist_giveaways()
+    persist_giveaways(giveaway_id)
     
     embed = create_embed("🎉 VPS Giveaway Created!", color=COLORS['giveaway'])
     embed.add_field(name="Description", value=description, inline=False)
@@ -2306,6 +3106,7 @@ async def giveaway_list(interaction: discord.Interaction):
     embed = create_embed("🎉 Active Giveaways", color=COLORS['giveaway'])
     
     active_giveaways = [g for g in giveaways.values() if g['status'] == 'active']
+    provisioning_giveaways = [g for g in giveaways.values() if g['status'] == 'provisioning']
     ended_giveaways = [g for g in giveaways.values() if g['status'] == 'ended']
     
     if active_giveaways:
@@ -2322,6 +3123,15 @@ async def giveaway_list(interaction: discord.Interaction):
             
             embed.add_field(name=f"`{giveaway['id']}`", value=value, inline=True)
     
+    if provisioning_giveaways:
+        embed.add_field(name="Provisioning Giveaways", value=f"{len(provisioning_giveaways)} creating VPS", inline=False)
+        for giveaway in provisioning_giveaways[:5]:
+            states = [job['status'] for job in giveaway['jobs'].values()]
+            value = f"**Done:** {states.count('done')}/{len(states)}\n"
+            value += f"**Queued/Running:** {states.count('queued')}/{states.count('running')}\n"
+            value += f"**Failed/Skipped:** {states.count('failed')}/{states.count('skipped')}"
+            embed.add_field(name=f"`{giveaway['id']}`", value=value, inline=True)
+    
     if ended_giveaways:
         embed.add_field(name="Ended Giveaways", value=f"{len(ended_giveaways)} ended", inline=False)
         for giveaway in list(ended_giveaways)[:3]:
@@ -2358,7 +3168,7 @@ async def pointgive(interaction: discord.Interaction, amount: int, user: discord
         users[user_id] = {"points": 0, "inv_unclaimed": 0, "inv_total": 0}
     
     users[user_id]['points'] += amount
-    persist_users()
+    persist_users(user_id)
     
     embed = create_success_embed("Points Given")
     embed.add_field(name="Admin", value=interaction.user.mention, inline=True)
@@ -2393,7 +3203,8 @@ async def pointremove(interaction: discord.Interaction, amount: int, user: disco
         amount = users[user_id]['points']
     
     users[user_id]['points'] -= amount
-    persist_users()
+    persist_users(user_id)
+    await flush_stores()
     
     embed = create_success_embed("Points Removed")
     embed.add_field(name="Admin", value=interaction.user.mention, inline=True)
@@ -2615,10 +3426,6 @@ def load_config():
 if __name__ == "__main__":
     load_config()
     
-    persist_users()
-    persist_vps()
-    save_json(INV_CACHE_FILE, invite_snapshot)
-    persist_giveaways()
     persist_renew_mode()
     
     try:
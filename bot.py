@@ -5,7 +5,6 @@ import os
 import random
 import string
 import json
-import subprocess
 from dotenv import load_dotenv
 import asyncio
 import datetime
@@ -22,8 +21,16 @@ import shutil
 from typing import Optional, Literal
 import sqlite3
 import pickle
+import gzip
+import zlib
+import glob
 import base64
 import threading
+import functools
+import hashlib
+import shlex
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, render_template, request, jsonify, session
 from flask_socketio import SocketIO, emit
 import docker
@@ -55,16 +62,79 @@ MAX_VPS_PER_USER = int(os.getenv('MAX_VPS_PER_USER', '3'))
 DEFAULT_OS_IMAGE = os.getenv('DEFAULT_OS_IMAGE', 'ubuntu:22.04')
 DOCKER_NETWORK = os.getenv('DOCKER_NETWORK', 'bridge')
 MAX_CONTAINERS = int(os.getenv('MAX_CONTAINERS', '100'))
+DOCKER_WORKERS = int(os.getenv('DOCKER_WORKERS', '16'))
+RECONCILE_CONCURRENCY = int(os.getenv('RECONCILE_CONCURRENCY', '8'))
+MINER_SCAN_INTERVAL = int(os.getenv('MINER_SCAN_INTERVAL', '300'))
+MINER_SCAN_CONCURRENCY = int(os.getenv('MINER_SCAN_CONCURRENCY', '16'))
+MINER_CPU_THRESHOLD = float(os.getenv('MINER_CPU_THRESHOLD', '0.9'))  # Fraction of allocated cores
+MINER_CPU_SUSTAINED_SWEEPS = int(os.getenv('MINER_CPU_SUSTAINED_SWEEPS', '3'))
+DB_READERS = int(os.getenv('DB_READERS', '4'))
+STATS_FLUSH_INTERVAL = int(os.getenv('STATS_FLUSH_INTERVAL', '30'))
+STATS_BUCKET_RETENTION_DAYS = int(os.getenv('STATS_BUCKET_RETENTION_DAYS', '90'))
+READY_TIMEOUT = int(os.getenv('READY_TIMEOUT', '90'))  # Seconds a container gets to boot before we give up
+PROVISION_CONCURRENCY = int(os.getenv('PROVISION_CONCURRENCY', '2'))  # Provisioning jobs running at once on this host
+BUILD_CONCURRENCY = int(os.getenv('BUILD_CONCURRENCY', '1'))  # Concurrent docker builds started by jobs
+# Allocated resources may exceed the host's physical ones by these factors (initial values of the *_overcommit_pct settings)
+MEMORY_OVERCOMMIT = float(os.getenv('MEMORY_OVERCOMMIT', '1.0'))
+CPU_OVERCOMMIT = float(os.getenv('CPU_OVERCOMMIT', '4.0'))
+DISK_OVERCOMMIT = float(os.getenv('DISK_OVERCOMMIT', '1.0'))
+# Docker nodes. The primary node is the daemon docker.from_env() reaches and hosts the warm pool; DOCKER_NODES seeds
+# more as name=url pairs, e.g. node2=tcp://10.0.0.2:2376,node3=ssh://root@10.0.0.3 (dind containers work for testing)
+PRIMARY_NODE = os.getenv('PRIMARY_NODE', 'local')
+DOCKER_NODES = os.getenv('DOCKER_NODES', '')  # name=url,... seeds the node table on first start; after that use /node_add and /node_remove
+DOCKER_CERT_DIR = os.getenv('DOCKER_CERT_DIR', 'docker_certs')  # <dir>/<node>/{ca,cert,key}.pem turns on TLS for tcp:// nodes
+NODE_HEALTH_INTERVAL = int(os.getenv('NODE_HEALTH_INTERVAL', '30'))
+NODE_HEALTH_TIMEOUT = int(os.getenv('NODE_HEALTH_TIMEOUT', '10'))
+NODE_FAILURE_THRESHOLD = int(os.getenv('NODE_FAILURE_THRESHOLD', '3'))  # Failed checks in a row before a node takes no new VPS
+MIGRATION_HELPER_IMAGE = os.getenv('MIGRATION_HELPER_IMAGE', 'alpine:3.20')  # Runs tar/find against data volumes during migrations
+MIGRATION_COMPRESS_LEVEL = int(os.getenv('MIGRATION_COMPRESS_LEVEL', '1'))  # gzip level for migration streams; 1 keeps up with fast links
+MIGRATION_CHUNK_BYTES = 1024 * 1024
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')  # Volume tarballs, named by the hash of their contents
+SNAPSHOT_RETENTION = int(os.getenv('SNAPSHOT_RETENTION', '3'))  # Snapshots kept per VPS unless /snapshot_retention says otherwise
+SNAPSHOT_COMPRESS_LEVEL = int(os.getenv('SNAPSHOT_COMPRESS_LEVEL', '6'))
+# Idle pre-booted containers kept per custom OS image, e.g. "ubuntu:22.04=2,debian:12=1" (empty disables the pool)
+WARM_POOL_SIZES = {
+    image.strip(): int(size)
+    for image, _, size in (entry.rpartition('=') for entry in os.getenv('WARM_POOL_SIZES', '').split(','))
+    if image.strip() and size.strip().isdigit() and int(size) > 0
+}
 DB_FILE = 'unixnodes.db'
-BACKUP_FILE = 'unixnodes_backup.pkl'
-
-# Known miner process names/patterns
-MINER_PATTERNS = [
-    'xmrig', 'ethminer', 'cgminer', 'sgminer', 'bfgminer',
-    'minerd', 'cpuminer', 'cryptonight', 'stratum', 'pool'
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_GENERATIONS = int(os.getenv('BACKUP_GENERATIONS', '7'))
+BACKUP_FORMAT_VERSION = 1
+# Pickle backup of older versions; converted into a backup generation on startup
+LEGACY_BACKUP_FILE = 'unixnodes_backup.pkl'
+HOT_BACKUP_DIR = os.path.join(BACKUP_DIR, 'hot')
+HOT_BACKUP_INTERVAL = int(os.getenv('HOT_BACKUP_INTERVAL', '3600'))  # Seconds, 0 disables scheduled backups
+# Retention: newest hot backup per hour / day / ISO week, for this many of each
+HOT_BACKUP_KEEP_HOURLY = int(os.getenv('HOT_BACKUP_KEEP_HOURLY', '24'))
+HOT_BACKUP_KEEP_DAILY = int(os.getenv('HOT_BACKUP_KEEP_DAILY', '7'))
+HOT_BACKUP_KEEP_WEEKLY = int(os.getenv('HOT_BACKUP_KEEP_WEEKLY', '4'))
+# Tables written to backups, in restore order
+BACKUP_TABLES = [
+    'system_settings', 'admin_users', 'banned_users', 'vps_instances', 'usage_stats', 'usage_stat_buckets', 'vps_events',
+    'provision_jobs', 'docker_nodes', 'vps_snapshots'
 ]
 
-# Dockerfile template for custom images
+# Weighted miner signatures: (kind, regex, weight)
+# 'name' must match the whole process name, 'arg' must start at a command-line token boundary
+MINER_SIGNATURES = [
+    ('name', r'xmrig|xmr-stak|ethminer|cgminer|sgminer|bfgminer|minerd|cpuminer(?:-\w+)?|ccminer|nbminer|t-rex|lolminer|phoenixminer|nanominer|teamredminer|gminer|srbminer(?:-multi)?', 10),
+    ('arg', r'stratum\d?\+(?:tcp|ssl|tls)://', 10),
+    ('arg', r'(?:-a|--algo)[= ](?:rx/\w+|randomx|cn[/-]\w+|cryptonight\S*|ethash|etchash|kawpow|autolykos\S*)', 6),
+    ('arg', r'cryptonight\S*|randomx', 4),
+    ('arg', r'--(?:donate-level|nicehash|cpu-max-threads-hint|randomx-1gb-pages|coin)\b', 4),
+]
+# Well-known stratum pool ports, matched against host:port arguments and established connections
+STRATUM_PORTS = {3333, 3334, 4444, 5555, 7777, 8888, 9999, 14433, 14444, 45560, 45700}
+STRATUM_PORT_WEIGHT = 5
+MINER_SCORE_THRESHOLD = int(os.getenv('MINER_SCORE_THRESHOLD', '10'))
+
+# Dockerfile template for the shared custom base images. It must not contain
+# anything VPS specific: per-VPS identity is applied at container start.
+BASE_IMAGE_REPO = 'unixnodes/base'
+MIGRATION_IMAGE_REPO = 'unixnodes/migrated'
+SNAPSHOT_IMAGE_REPO = 'unixnodes/snapshot'
 DOCKERFILE_TEMPLATE = """
 FROM {base_image}
 
@@ -79,14 +149,6 @@ RUN apt-get update && \\
                        docker.io openssh-server tmate && \\
     apt-get clean && rm -rf /var/lib/apt/lists/*
 
-# Root password
-RUN echo "root:{root_password}" | chpasswd
-
-# Create user and set password
-RUN useradd -m -s /bin/bash {username} && \\
-    echo "{username}:{user_password}" | chpasswd && \\
-    usermod -aG sudo {username}
-
 # Enable SSH login
 RUN mkdir /var/run/sshd && \\
     sed -i 's/#PermitRootLogin prohibit-password/PermitRootLogin yes/' /etc/ssh/sshd_config && \\
@@ -98,9 +160,7 @@ RUN systemctl enable ssh && \\
 
 # UnixNodes customization
 RUN echo '{welcome_message}' > /etc/motd && \\
-    echo 'echo "{welcome_message}"' >> /home/{username}/.bashrc && \\
-    echo '{watermark}' > /etc/machine-info && \\
-    echo 'unixnodes-{vps_id}' > /etc/hostname
+    echo '{watermark}' > /etc/machine-info
 
 # Install additional useful packages
 RUN apt-get update && \\
@@ -115,17 +175,155 @@ STOPSIGNAL SIGRTMIN+3
 CMD ["/sbin/init"]
 """
 
+def stat_bucket(timestamp=None):
+    """UTC hour bucket ('YYYY-MM-DDTHH') used for time-bucketed usage counters"""
+    return datetime.datetime.utcfromtimestamp(time.time() if timestamp is None else timestamp).strftime('%Y-%m-%dT%H')
+
+def write_backup_section(f, table, columns, count, rows):
+    """One table of a backup: a section line (name, columns, row count), then one JSON array per row"""
+    f.write(json.dumps({'table': table, 'columns': columns, 'rows': count}) + '\n')
+    for row in rows:
+        f.write(json.dumps(row) + '\n')
+
+class LegacyBackupUnpickler(pickle.Unpickler):
+    """Loads the plain dicts, lists and scalars of old pickle backups and refuses any other object"""
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from a legacy backup")
+
+class VPSIndex:
+    """In-memory copy of vps_instances, indexed by token, vps_id, container_id and owner"""
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.by_token = {}
+        self.token_by_vps_id = {}
+        self.token_by_container_id = {}
+        # Owner -> {token: None}, a dict so a user's VPS keep their creation order
+        self.tokens_by_owner = {}
+        # Node -> memory (GB), cores and disk (GB) promised to the VPS on it
+        self.allocated = {}
+
+    def load(self, rows):
+        self.clear()
+        for vps in rows:
+            self.put(vps)
+
+    def put(self, vps):
+        token = vps['token']
+        self._unlink(token)
+        self.by_token[token] = vps
+        self.token_by_vps_id[vps.get('vps_id')] = token
+        if vps.get('container_id'):
+            self.token_by_container_id[vps['container_id']] = token
+        self.tokens_by_owner.setdefault(vps.get('created_by'), {})[token] = None
+        totals = self.allocated.setdefault(vps.get('node') or PRIMARY_NODE, {'memory': 0, 'cpu': 0, 'disk': 0})
+        for resource in totals:
+            totals[resource] += vps.get(resource) or 0
+
+    def update(self, token, updates):
+        if token in self.by_token:
+            self.put({**self.by_token[token], **updates})
+
+    def discard(self, token):
+        self._unlink(token)
+        self.by_token.pop(token, None)
+
+    def _unlink(self, token):
+        vps = self.by_token.get(token)
+        if vps is None:
+            return
+        if self.token_by_vps_id.get(vps.get('vps_id')) == token:
+            del self.token_by_vps_id[vps.get('vps_id')]
+        if self.token_by_container_id.get(vps.get('container_id')) == token:
+            del self.token_by_container_id[vps.get('container_id')]
+        owned = self.tokens_by_owner.get(vps.get('created_by'), {})
+        owned.pop(token, None)
+        if not owned:
+            self.tokens_by_owner.pop(vps.get('created_by'), None)
+        totals = self.allocated[vps.get('node') or PRIMARY_NODE]
+        for resource in totals:
+            totals[resource] -= vps.get(resource) or 0
+
 class Database:
     """Handles all data persistence using SQLite3"""
+    # Schema migrations, applied in order and tracked in PRAGMA user_version
+    MIGRATIONS = [
+        # 1: indexes for the owner, container and status lookups
+        [
+            'CREATE INDEX IF NOT EXISTS idx_vps_created_by ON vps_instances (created_by)',
+            'CREATE INDEX IF NOT EXISTS idx_vps_container_id ON vps_instances (container_id)',
+            'CREATE INDEX IF NOT EXISTS idx_vps_status ON vps_instances (status)',
+            'CREATE INDEX IF NOT EXISTS idx_vps_events_vps_id ON vps_events (vps_id)',
+        ],
+        # 2: provisioning jobs are looked up by state on startup
+        [
+            'CREATE INDEX IF NOT EXISTS idx_provision_jobs_state ON provision_jobs (state)',
+        ],
+        # 3: the Docker node a VPS lives on; NULL means the primary node
+        [
+            'ALTER TABLE vps_instances ADD COLUMN node TEXT',
+        ],
+        # 4: snapshots are listed per VPS; NULL retention means SNAPSHOT_RETENTION
+        [
+            'CREATE INDEX IF NOT EXISTS idx_vps_snapshots_vps_id ON vps_snapshots (vps_id)',
+            'ALTER TABLE vps_instances ADD COLUMN snapshot_retention INTEGER',
+        ],
+    ]
+
     def __init__(self, db_file):
+        self.db_file = db_file
         self.conn = sqlite3.connect(db_file, check_same_thread=False)
-        self.cursor = self.conn.cursor()
+        # WAL lets readers run alongside the writer; NORMAL only fsyncs at checkpoints, which is safe under WAL
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # Every call gets its own cursor; the lock keeps multi-statement operations from interleaving across threads
+        self.lock = threading.RLock()
+        # Reads use one extra connection per thread, so under WAL they never wait for the writer
+        self.local = threading.local()
+        self.read_conns = []
+        # VPS reads are served from this index, every VPS write goes through to SQLite first.
+        # index_lock is only held while the index is copied or changed, never across a commit.
+        self.vps_index = VPSIndex()
+        self.index_lock = threading.Lock()
         self._create_tables()
+        self._migrate()
         self._initialize_settings()
+        self._initialize_nodes()
+        self._load_vps_index()
+        self._convert_legacy_backup()
+
+    def execute(self, sql, params=()):
+        """Run one statement on its own cursor and return it"""
+        with self.lock:
+            return self.conn.execute(sql, params)
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def query(self, sql, params=()):
+        """Run a read on this thread's own connection and return the cursor"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.read_conns.append(conn)
+        return conn.execute(sql, params)
+
+    def _migrate(self):
+        """Bring an existing database file up to the latest schema version"""
+        with self.lock:
+            version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, statements in enumerate(self.MIGRATIONS[version:], start=version + 1):
+                for statement in statements:
+                    self.conn.execute(statement)
+                self.conn.execute(f'PRAGMA user_version = {number}')
+                self.conn.commit()
+                logger.info(f"Migrated {self.db_file} to schema version {number}")
 
     def _create_tables(self):
         """Create necessary tables"""
-        self.cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS vps_instances (
                 token TEXT PRIMARY KEY,
                 vps_id TEXT UNIQUE,
@@ -148,230 +346,1929 @@ class Database:
             )
         ''')
         
-        self.cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS usage_stats (
                 key TEXT PRIMARY KEY,
                 value INTEGER DEFAULT 0
             )
         ''')
         
-        self.cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS system_settings (
                 key TEXT PRIMARY KEY,
                 value TEXT
             )
         ''')
         
-        self.cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS banned_users (
                 user_id TEXT PRIMARY KEY
             )
         ''')
         
-        self.cursor.execute('''
+        self.execute('''
             CREATE TABLE IF NOT EXISTS admin_users (
                 user_id TEXT PRIMARY KEY
             )
         ''')
         
-        self.conn.commit()
+        self.execute('''
+            CREATE TABLE IF NOT EXISTS usage_stat_buckets (
+                key TEXT,
+                bucket TEXT,
+                value INTEGER DEFAULT 0,
+                PRIMARY KEY (key, bucket)
+            )
+        ''')
+        
+        self.execute('''
+            CREATE TABLE IF NOT EXISTS vps_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                vps_id TEXT,
+                container_id TEXT,
+                event TEXT,
+                exit_code INTEGER,
+                created_at TEXT
+            )
+        ''')
+        
+        self.execute('''
+            CREATE TABLE IF NOT EXISTS provision_jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT,
+                vps_id TEXT,
+                state TEXT DEFAULT 'queued',
+                step TEXT,
+                message TEXT,
+                params TEXT,
+                progress TEXT,
+                error TEXT,
+                requested_by TEXT,
+                channel_id TEXT,
+                created_at TEXT,
+                updated_at TEXT
+            )
+        ''')
+        
+        self.execute('''
+            CREATE TABLE IF NOT EXISTS docker_nodes (
+                name TEXT PRIMARY KEY,
+                url TEXT,
+                disk_gb INTEGER,
+                draining BOOLEAN DEFAULT 0,
+                added_at TEXT
+            )
+        ''')
+        
+        self.execute('''
+            CREATE TABLE IF NOT EXISTS vps_snapshots (
+                id TEXT PRIMARY KEY,
+                vps_id TEXT,
+                node TEXT,
+                image TEXT,
+                image_bytes INTEGER,
+                volume_blob TEXT,
+                volume_bytes INTEGER,
+                stored_bytes INTEGER,
+                os_image TEXT,
+                use_custom_image BOOLEAN,
+                password TEXT,
+                root_password TEXT,
+                created_by TEXT,
+                created_at TEXT
+            )
+        ''')
+        
+        self.commit()
 
     def _initialize_settings(self):
         """Initialize default settings"""
         defaults = {
             'max_containers': str(MAX_CONTAINERS),
-            'max_vps_per_user': str(MAX_VPS_PER_USER)
+            'max_vps_per_user': str(MAX_VPS_PER_USER),
+            'memory_overcommit_pct': str(int(MEMORY_OVERCOMMIT * 100)),
+            'cpu_overcommit_pct': str(int(CPU_OVERCOMMIT * 100)),
+            'disk_overcommit_pct': str(int(DISK_OVERCOMMIT * 100))
         }
         for key, value in defaults.items():
-            self.cursor.execute('INSERT OR IGNORE INTO system_settings (key, value) VALUES (?, ?)', (key, value))
+            self.execute('INSERT OR IGNORE INTO system_settings (key, value) VALUES (?, ?)', (key, value))
         
         # Load admin users from database
-        self.cursor.execute('SELECT user_id FROM admin_users')
-        for row in self.cursor.fetchall():
+        cursor = self.execute('SELECT user_id FROM admin_users')
+        for row in cursor.fetchall():
             ADMIN_IDS.add(int(row[0]))
             
-        self.conn.commit()
+        self.commit()
+
+    def _initialize_nodes(self):
+        """Seed an empty node table with the primary node and DOCKER_NODES; later changes are the admins' to make"""
+        names = {row[0] for row in self.execute('SELECT name FROM docker_nodes').fetchall()}
+        if names:
+            if PRIMARY_NODE not in names:
+                logger.warning(f"Primary node {PRIMARY_NODE} is not registered; VPS without a node will not be reachable")
+            return
+        nodes = [(PRIMARY_NODE, None)]
+        for entry in filter(None, (part.strip() for part in DOCKER_NODES.split(','))):
+            name, _, url = entry.partition('=')
+            nodes.append((name.strip(), url.strip()))
+        for name, url in nodes:
+            self.execute(
+                'INSERT OR IGNORE INTO docker_nodes (name, url, added_at) VALUES (?, ?, ?)',
+                (name, url, str(datetime.datetime.now()))
+            )
+        self.commit()
+
+    def _load_vps_index(self):
+        """(Re)build the VPS index from the table, e.g. after a restore"""
+        cursor = self.execute('SELECT * FROM vps_instances')
+        columns = [desc[0] for desc in cursor.description]
+        # Streamed into the cleared index, so a rebuild never holds the table twice
+        with self.index_lock:
+            self.vps_index.load(dict(zip(columns, row)) for row in cursor)
 
     def get_setting(self, key, default=None):
-        self.cursor.execute('SELECT value FROM system_settings WHERE key = ?', (key,))
-        result = self.cursor.fetchone()
+        cursor = self.query('SELECT value FROM system_settings WHERE key = ?', (key,))
+        result = cursor.fetchone()
         return int(result[0]) if result else default
 
     def set_setting(self, key, value):
-        self.cursor.execute('INSERT OR REPLACE INTO system_settings (key, value) VALUES (?, ?)', (key, str(value)))
-        self.conn.commit()
+        self.execute('INSERT OR REPLACE INTO system_settings (key, value) VALUES (?, ?)', (key, str(value)))
+        self.commit()
 
     def get_stat(self, key, default=0):
-        self.cursor.execute('SELECT value FROM usage_stats WHERE key = ?', (key,))
-        result = self.cursor.fetchone()
+        cursor = self.query('SELECT value FROM usage_stats WHERE key = ?', (key,))
+        result = cursor.fetchone()
         return result[0] if result else default
 
     def increment_stat(self, key, amount=1):
-        current = self.get_stat(key)
-        self.cursor.execute('INSERT OR REPLACE INTO usage_stats (key, value) VALUES (?, ?)', (key, current + amount))
-        self.conn.commit()
+        self.increment_stats({(key, stat_bucket()): amount})
+
+    def increment_stats(self, counts):
+        """Add {(key, hour bucket): amount} to the totals and the hourly buckets in one transaction"""
+        totals = Counter()
+        for (key, _), amount in counts.items():
+            totals[key] += amount
+        cutoff = stat_bucket(time.time() - STATS_BUCKET_RETENTION_DAYS * 86400)
+        with self.lock:
+            self.conn.executemany(
+                'INSERT INTO usage_stats (key, value) VALUES (?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = value + excluded.value',
+                totals.items()
+            )
+            self.conn.executemany(
+                'INSERT INTO usage_stat_buckets (key, bucket, value) VALUES (?, ?, ?) '
+                'ON CONFLICT(key, bucket) DO UPDATE SET value = value + excluded.value',
+                [(key, bucket, amount) for (key, bucket), amount in counts.items()]
+            )
+            self.conn.execute('DELETE FROM usage_stat_buckets WHERE bucket < ?', (cutoff,))
+            self.conn.commit()
+
+    def get_stat_buckets(self, key, since, period='hour'):
+        """Counts of key per hour or per day, from the hour bucket `since` onwards"""
+        length = 13 if period == 'hour' else 10
+        cursor = self.query(
+            f'SELECT substr(bucket, 1, {length}) AS period, SUM(value) FROM usage_stat_buckets '
+            'WHERE key = ? AND bucket >= ? GROUP BY period ORDER BY period',
+            (key, since)
+        )
+        return dict(cursor.fetchall())
 
+    # VPS reads hand out copies so callers can never modify the index behind SQLite's back
     def get_vps_by_id(self, vps_id):
-        self.cursor.execute('SELECT * FROM vps_instances WHERE vps_id = ?', (vps_id,))
-        row = self.cursor.fetchone()
-        if not row:
-            return None, None
-        columns = [desc[0] for desc in self.cursor.description]
-        vps = dict(zip(columns, row))
-        return vps['token'], vps
+        with self.index_lock:
+            token = self.vps_index.token_by_vps_id.get(vps_id)
+            if token is None:
+                return None, None
+            return token, dict(self.vps_index.by_token[token])
 
     def get_vps_by_token(self, token):
-        self.cursor.execute('SELECT * FROM vps_instances WHERE token = ?', (token,))
-        row = self.cursor.fetchone()
-        if not row:
-            return None
-        columns = [desc[0] for desc in self.cursor.description]
-        return dict(zip(columns, row))
+        with self.index_lock:
+            vps = self.vps_index.by_token.get(token)
+            return dict(vps) if vps else None
+
+    def get_vps_by_container_id(self, container_id):
+        with self.index_lock:
+            token = self.vps_index.token_by_container_id.get(container_id)
+            if token is None:
+                return None, None
+            return token, dict(self.vps_index.by_token[token])
 
     def get_user_vps_count(self, user_id):
-        self.cursor.execute('SELECT COUNT(*) FROM vps_instances WHERE created_by = ?', (str(user_id),))
-        return self.cursor.fetchone()[0]
+        with self.index_lock:
+            return len(self.vps_index.tokens_by_owner.get(str(user_id), ()))
+
+    def get_allocated_resources(self):
+        """Node -> resources promised to its VPS"""
+        with self.index_lock:
+            return {node: dict(totals) for node, totals in self.vps_index.allocated.items()}
 
     def get_user_vps(self, user_id):
-        self.cursor.execute('SELECT * FROM vps_instances WHERE created_by = ?', (str(user_id),))
-        columns = [desc[0] for desc in self.cursor.description]
-        return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+        with self.index_lock:
+            tokens = self.vps_index.tokens_by_owner.get(str(user_id), ())
+            return [dict(self.vps_index.by_token[token]) for token in tokens]
 
     def get_all_vps(self):
-        self.cursor.execute('SELECT * FROM vps_instances')
-        columns = [desc[0] for desc in self.cursor.description]
-        return {row[0]: dict(zip(columns, row)) for row in self.cursor.fetchall()}
+        with self.index_lock:
+            return {token: dict(vps) for token, vps in self.vps_index.by_token.items()}
 
     def add_vps(self, vps_data):
         columns = ', '.join(vps_data.keys())
         placeholders = ', '.join('?' for _ in vps_data)
-        self.cursor.execute(f'INSERT INTO vps_instances ({columns}) VALUES ({placeholders})', tuple(vps_data.values()))
-        self.conn.commit()
-        self.increment_stat('total_vps_created')
+        self.execute(f'INSERT INTO vps_instances ({columns}) VALUES ({placeholders})', tuple(vps_data.values()))
+        self.commit()
+        # Read the row back so the index also holds the column defaults
+        cursor = self.execute('SELECT * FROM vps_instances WHERE token = ?', (vps_data['token'],))
+        columns = [desc[0] for desc in cursor.description]
+        vps = dict(zip(columns, cursor.fetchone()))
+        with self.index_lock:
+            self.vps_index.put(vps)
 
     def remove_vps(self, token):
-        self.cursor.execute('DELETE FROM vps_instances WHERE token = ?', (token,))
-        self.conn.commit()
-        return self.cursor.rowcount > 0
+        cursor = self.execute('DELETE FROM vps_instances WHERE token = ?', (token,))
+        self.commit()
+        with self.index_lock:
+            self.vps_index.discard(token)
+        return cursor.rowcount > 0
 
     def update_vps(self, token, updates):
         set_clause = ', '.join(f'{k} = ?' for k in updates)
         values = list(updates.values()) + [token]
-        self.cursor.execute(f'UPDATE vps_instances SET {set_clause} WHERE token = ?', values)
-        self.conn.commit()
-        return self.cursor.rowcount > 0
+        cursor = self.execute(f'UPDATE vps_instances SET {set_clause} WHERE token = ?', values)
+        self.commit()
+        updated = cursor.rowcount > 0
+        if updated:
+            with self.index_lock:
+                self.vps_index.update(token, updates)
+        return updated
+
+    def set_vps_status(self, token, status, expected):
+        """Change a VPS status only if it is still `expected`; returns whether it changed"""
+        cursor = self.execute('UPDATE vps_instances SET status = ? WHERE token = ? AND status = ?', (status, token, expected))
+        self.commit()
+        updated = cursor.rowcount > 0
+        if updated:
+            with self.index_lock:
+                self.vps_index.update(token, {'status': status})
+        return updated
+
+    def record_vps_event(self, vps_id, container_id, event, exit_code=None, created_at=None):
+        created_at = created_at or str(datetime.datetime.now())
+        self.execute('INSERT INTO vps_events (vps_id, container_id, event, exit_code, created_at) VALUES (?, ?, ?, ?, ?)',
+                            (vps_id, container_id, event, exit_code, created_at))
+        self.commit()
+
+    def get_vps_events(self, vps_id, limit=5):
+        cursor = self.query('SELECT event, exit_code, created_at FROM vps_events WHERE vps_id = ? ORDER BY id DESC LIMIT ?', (vps_id, limit))
+        return [{'event': row[0], 'exit_code': row[1], 'created_at': row[2]} for row in cursor.fetchall()]
+
+    def _job_from_row(self, cursor, row):
+        job = dict(zip([desc[0] for desc in cursor.description], row))
+        job['params'] = json.loads(job['params'] or '{}')
+        job['progress'] = json.loads(job['progress'] or '{}')
+        return job
+
+    def add_job(self, job):
+        row = {**job, 'params': json.dumps(job['params']), 'progress': json.dumps(job.get('progress', {}))}
+        columns = ', '.join(row.keys())
+        placeholders = ', '.join('?' for _ in row)
+        self.execute(f'INSERT INTO provision_jobs ({columns}) VALUES ({placeholders})', tuple(row.values()))
+        self.commit()
+
+    def update_job(self, job_id, updates):
+        updates = dict(updates, updated_at=str(datetime.datetime.now()))
+        if 'progress' in updates:
+            updates['progress'] = json.dumps(updates['progress'])
+        set_clause = ', '.join(f'{k} = ?' for k in updates)
+        self.execute(f'UPDATE provision_jobs SET {set_clause} WHERE id = ?', list(updates.values()) + [job_id])
+        self.commit()
+
+    def get_job(self, job_id):
+        cursor = self.query('SELECT * FROM provision_jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        return self._job_from_row(cursor, row) if row else None
+
+    def get_nodes(self):
+        cursor = self.query('SELECT * FROM docker_nodes ORDER BY added_at')
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def add_node(self, name, url, disk_gb=None):
+        self.execute(
+            'INSERT INTO docker_nodes (name, url, disk_gb, added_at) VALUES (?, ?, ?, ?)',
+            (name, url, disk_gb, str(datetime.datetime.now()))
+        )
+        self.commit()
+
+    def remove_node(self, name):
+        self.execute('DELETE FROM docker_nodes WHERE name = ?', (name,))
+        self.commit()
+
+    def set_node_draining(self, name, draining):
+        self.execute('UPDATE docker_nodes SET draining = ? WHERE name = ?', (int(draining), name))
+        self.commit()
+
+    def get_snapshots(self, vps_id=None):
+        """Snapshots of one VPS, or of all of them, newest first"""
+        if vps_id:
+            cursor = self.query('SELECT * FROM vps_snapshots WHERE vps_id = ? ORDER BY created_at DESC', (vps_id,))
+        else:
+            cursor = self.query('SELECT * FROM vps_snapshots ORDER BY created_at DESC')
+        columns = [desc[0] for desc in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_snapshot(self, snapshot_id):
+        cursor = self.query('SELECT * FROM vps_snapshots WHERE id = ?', (snapshot_id,))
+        row = cursor.fetchone()
+        return dict(zip([desc[0] for desc in cursor.description], row)) if row else None
+
+    def add_snapshot(self, snapshot):
+        columns = ', '.join(snapshot.keys())
+        placeholders = ', '.join('?' for _ in snapshot)
+        self.execute(f'INSERT OR IGNORE INTO vps_snapshots ({columns}) VALUES ({placeholders})', tuple(snapshot.values()))
+        self.commit()
+
+    def remove_snapshot(self, snapshot_id):
+        """Delete a snapshot row; returns True if no other snapshot still uses its volume blob"""
+        with self.lock:
+            row = self.conn.execute('SELECT volume_blob FROM vps_snapshots WHERE id = ?', (snapshot_id,)).fetchone()
+            self.conn.execute('DELETE FROM vps_snapshots WHERE id = ?', (snapshot_id,))
+            self.conn.commit()
+            if not row:
+                return False
+            return self.conn.execute('SELECT 1 FROM vps_snapshots WHERE volume_blob = ?', (row[0],)).fetchone() is None
+
+    def get_unfinished_jobs(self):
+        """Queued and running jobs, oldest first"""
+        cursor = self.query("SELECT * FROM provision_jobs WHERE state IN ('queued', 'running') ORDER BY created_at")
+        return [self._job_from_row(cursor, row) for row in cursor.fetchall()]
 
     def is_user_banned(self, user_id):
-        self.cursor.execute('SELECT 1 FROM banned_users WHERE user_id = ?', (str(user_id),))
-        return self.cursor.fetchone() is not None
+        cursor = self.query('SELECT 1 FROM banned_users WHERE user_id = ?', (str(user_id),))
+        return cursor.fetchone() is not None
 
     def ban_user(self, user_id):
-        self.cursor.execute('INSERT OR IGNORE INTO banned_users (user_id) VALUES (?)', (str(user_id),))
-        self.conn.commit()
+        self.execute('INSERT OR IGNORE INTO banned_users (user_id) VALUES (?)', (str(user_id),))
+        self.commit()
 
     def unban_user(self, user_id):
-        self.cursor.execute('DELETE FROM banned_users WHERE user_id = ?', (str(user_id),))
-        self.conn.commit()
+        self.execute('DELETE FROM banned_users WHERE user_id = ?', (str(user_id),))
+        self.commit()
 
     def get_banned_users(self):
-        self.cursor.execute('SELECT user_id FROM banned_users')
-        return [row[0] for row in self.cursor.fetchall()]
+        cursor = self.query('SELECT user_id FROM banned_users')
+        return [row[0] for row in cursor.fetchall()]
 
     def add_admin(self, user_id):
-        self.cursor.execute('INSERT OR IGNORE INTO admin_users (user_id) VALUES (?)', (str(user_id),))
-        self.conn.commit()
+        self.execute('INSERT OR IGNORE INTO admin_users (user_id) VALUES (?)', (str(user_id),))
+        self.commit()
         ADMIN_IDS.add(int(user_id))
 
     def remove_admin(self, user_id):
-        self.cursor.execute('DELETE FROM admin_users WHERE user_id = ?', (str(user_id),))
-        self.conn.commit()
+        self.execute('DELETE FROM admin_users WHERE user_id = ?', (str(user_id),))
+        self.commit()
         if int(user_id) in ADMIN_IDS:
             ADMIN_IDS.remove(int(user_id))
 
     def get_admins(self):
-        self.cursor.execute('SELECT user_id FROM admin_users')
-        return [row[0] for row in self.cursor.fetchall()]
+        cursor = self.query('SELECT user_id FROM admin_users')
+        return [row[0] for row in cursor.fetchall()]
 
     def backup_data(self):
-        """Backup all data to a file"""
-        data = {
-            'vps_instances': self.get_all_vps(),
-            'usage_stats': {},
-            'system_settings': {},
-            'banned_users': self.get_banned_users(),
-            'admin_users': self.get_admins()
-        }
-        
-        # Get usage stats
-        self.cursor.execute('SELECT * FROM usage_stats')
-        for row in self.cursor.fetchall():
-            data['usage_stats'][row[0]] = row[1]
-            
-        # Get system settings
-        self.cursor.execute('SELECT * FROM system_settings')
-        for row in self.cursor.fetchall():
-            data['system_settings'][row[0]] = row[1]
-            
-        with open(BACKUP_FILE, 'wb') as f:
-            pickle.dump(data, f)
-            
-        return True
-
-    def restore_data(self):
-        """Restore data from backup file"""
-        if not os.path.exists(BACKUP_FILE):
-            return False
-            
+        """Stream every table into a new gzip-compressed NDJSON backup generation and return its path.
+
+        Layout: a header line, then per table a section line (name, columns, row count) followed by
+        one JSON array per row.
+        """
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        path = os.path.join(BACKUP_DIR, f"unixnodes-{datetime.datetime.utcnow():%Y%m%d-%H%M%S-%f}.ndjson.gz")
+        temp_path = path + '.tmp'
+        # A private connection inside one read transaction is a consistent snapshot that never blocks the writer
+        conn = sqlite3.connect(self.db_file)
         try:
-            with open(BACKUP_FILE, 'rb') as f:
-                data = pickle.load(f)
-                
-            # Clear all tables
-            self.cursor.execute('DELETE FROM vps_instances')
-            self.cursor.execute('DELETE FROM usage_stats')
-            self.cursor.execute('DELETE FROM system_settings')
-            self.cursor.execute('DELETE FROM banned_users')
-            self.cursor.execute('DELETE FROM admin_users')
-            
-            # Restore VPS instances
-            for token, vps in data['vps_instances'].items():
-                columns = ', '.join(vps.keys())
-                placeholders = ', '.join('?' for _ in vps)
-                self.cursor.execute(f'INSERT INTO vps_instances ({columns}) VALUES ({placeholders})', tuple(vps.values()))
-            
-            # Restore usage stats
-            for key, value in data['usage_stats'].items():
-                self.cursor.execute('INSERT INTO usage_stats (key, value) VALUES (?, ?)', (key, value))
-                
-            # Restore system settings
-            for key, value in data['system_settings'].items():
-                self.cursor.execute('INSERT INTO system_settings (key, value) VALUES (?, ?)', (key, value))
-                
-            # Restore banned users
-            for user_id in data['banned_users']:
-                self.cursor.execute('INSERT INTO banned_users (user_id) VALUES (?)', (user_id,))
-                
-            # Restore admin users
-            for user_id in data['admin_users']:
-                self.cursor.execute('INSERT INTO admin_users (user_id) VALUES (?)', (user_id,))
-                ADMIN_IDS.add(int(user_id))
-                
-            self.conn.commit()
-            return True
+            conn.execute('BEGIN')
+            header = {
+                'format': 'unixnodes-backup',
+                'version': BACKUP_FORMAT_VERSION,
+                'schema_version': conn.execute('PRAGMA user_version').fetchone()[0],
+                'created_at': str(datetime.datetime.utcnow())
+            }
+            with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                f.write(json.dumps(header) + '\n')
+                for table in BACKUP_TABLES:
+                    count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                    cursor = conn.execute(f'SELECT * FROM {table}')
+                    write_backup_section(f, table, [desc[0] for desc in cursor.description], count, cursor)
+            os.replace(temp_path, path)
+        finally:
+            conn.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._rotate_backups()
+        return path
+
+    def _convert_legacy_backup(self):
+        """Turn the pickle backup of older versions into a backup generation, once; returns its path"""
+        if not os.path.exists(LEGACY_BACKUP_FILE):
+            return None
+        try:
+            with open(LEGACY_BACKUP_FILE, 'rb') as f:
+                data = LegacyBackupUnpickler(f).load()
+            taken = datetime.datetime.utcfromtimestamp(os.path.getmtime(LEGACY_BACKUP_FILE))
+            vps_rows = list(data.get('vps_instances', {}).values())
+            vps_columns = list(dict.fromkeys(column for vps in vps_rows for column in vps))
+            sections = [
+                ('system_settings', ['key', 'value'], [list(item) for item in data.get('system_settings', {}).items()]),
+                ('admin_users', ['user_id'], [[user_id] for user_id in data.get('admin_users', [])]),
+                ('banned_users', ['user_id'], [[user_id] for user_id in data.get('banned_users', [])]),
+                ('vps_instances', vps_columns, [[vps.get(column) for column in vps_columns] for vps in vps_rows]),
+                ('usage_stats', ['key', 'value'], [list(item) for item in data.get('usage_stats', {}).items()]),
+            ]
+            os.makedirs(BACKUP_DIR, exist_ok=True)
+            # Named after the time the pickle was written, so it sorts among the generations by age
+            path = os.path.join(BACKUP_DIR, f"unixnodes-{taken:%Y%m%d-%H%M%S-%f}.ndjson.gz")
+            header = {'format': 'unixnodes-backup', 'version': BACKUP_FORMAT_VERSION, 'schema_version': 0, 'created_at': str(taken)}
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+                f.write(json.dumps(header) + '\n')
+                for table, columns, rows in sections:
+                    write_backup_section(f, table, columns, len(rows), rows)
+            os.replace(path + '.tmp', path)
+            os.replace(LEGACY_BACKUP_FILE, LEGACY_BACKUP_FILE + '.converted')
         except Exception as e:
-            logger.error(f"Error restoring data: {e}")
+            logger.error(f"Could not convert legacy backup {LEGACY_BACKUP_FILE}, it was left in place: {e}")
+            return None
+        logger.info(f"Converted legacy backup {LEGACY_BACKUP_FILE} into {path}; /restore_data can restore it")
+        return path
+
+    def hot_backup(self):
+        """Copy the live database with the online backup API and verify the copy; returns (path, integrity)"""
+        os.makedirs(HOT_BACKUP_DIR, exist_ok=True)
+        path = os.path.join(HOT_BACKUP_DIR, f"unixnodes-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}.db")
+        temp_path = path + '.tmp'
+        source = sqlite3.connect(self.db_file)
+        target = sqlite3.connect(temp_path)
+        try:
+            # One step copies from a single read transaction. Under WAL that never blocks the writer, whereas a
+            # paged copy starts over whenever another connection commits and under steady writes may never finish.
+            source.backup(target, pages=-1)
+            integrity = target.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        if integrity != 'ok':
+            os.remove(temp_path)
+            raise sqlite3.DatabaseError(f"Hot backup failed integrity check: {integrity}")
+        os.replace(temp_path, path)
+        self._prune_hot_backups()
+        return path, integrity
+
+    def _prune_hot_backups(self):
+        paths = sorted(glob.glob(os.path.join(HOT_BACKUP_DIR, 'unixnodes-*.db')), reverse=True)
+        keep = set()
+        for fmt, count in (('%Y%m%d%H', HOT_BACKUP_KEEP_HOURLY), ('%Y%m%d', HOT_BACKUP_KEEP_DAILY), ('%G%V', HOT_BACKUP_KEEP_WEEKLY)):
+            periods = set()
+            for path in paths:
+                taken = datetime.datetime.strptime(os.path.basename(path), 'unixnodes-%Y%m%d-%H%M%S.db')
+                period = taken.strftime(fmt)
+                if period in periods:
+                    continue
+                if len(periods) >= count:
+                    break
+                # Newest first, so the first backup seen in each period is the one kept
+                periods.add(period)
+                keep.add(path)
+        for path in paths:
+            if path not in keep:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.error(f"Error removing old hot backup {path}: {e}")
+
+    def list_backups(self):
+        """Backup generations, oldest first"""
+        return sorted(glob.glob(os.path.join(BACKUP_DIR, 'unixnodes-*.ndjson.gz')))
+
+    def _rotate_backups(self):
+        for path in self.list_backups()[:-BACKUP_GENERATIONS]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"Error removing old backup {path}: {e}")
+
+    def _table_columns(self, table):
+        return {row[1] for row in self.conn.execute(f'PRAGMA table_info({table})')}
+
+    def restore_data(self, path=None):
+        """Restore the newest (or the given) backup generation in a single transaction"""
+        backups = self.list_backups()
+        path = path or (backups[-1] if backups else None)
+        if not path or not os.path.exists(path):
             return False
 
+        # Hold the lock for the whole restore so no other thread commits it half way
+        with self.lock:
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    header = json.loads(f.readline())
+                    if header.get('format') != 'unixnodes-backup' or header.get('version', 0) > BACKUP_FORMAT_VERSION:
+                        raise ValueError(f"{path} is not a supported backup")
+
+                    while True:
+                        line = f.readline()
+                        if not line:
+                            break
+                        section = json.loads(line)
+                        table = section['table']
+                        if table not in BACKUP_TABLES:
+                            raise ValueError(f"Unknown table {table} in backup")
+                        # Tables added after a backup was taken keep their current rows
+                        self.conn.execute(f'DELETE FROM {table}')
+                        # Columns dropped from the schema since the backup was taken are skipped
+                        current = self._table_columns(table)
+                        keep = [i for i, column in enumerate(section['columns']) if column in current]
+                        names = ', '.join(section['columns'][i] for i in keep)
+                        placeholders = ', '.join('?' for _ in keep)
+                        rows = (json.loads(f.readline()) for _ in range(section['rows']))
+                        self.conn.executemany(
+                            f'INSERT INTO {table} ({names}) VALUES ({placeholders})',
+                            ([row[i] for i in keep] for row in rows)
+                        )
+                # Snapshots are only usable for VPS the backup brought back
+                self.conn.execute('DELETE FROM vps_snapshots WHERE vps_id NOT IN (SELECT vps_id FROM vps_instances)')
+                # Jobs caught mid-way by the backup would resume against containers that have moved on since
+                self.conn.execute(
+                    "UPDATE provision_jobs SET state = 'failed', error = 'Interrupted by a data restore' "
+                    "WHERE state IN ('queued', 'running')"
+                )
+                self.conn.commit()
+            except Exception as e:
+                logger.error(f"Error restoring data from {path}: {e}")
+                self.conn.rollback()
+                return False
+            finally:
+                self._load_vps_index()
+
+        for user_id in self.get_admins():
+            ADMIN_IDS.add(int(user_id))
+        return True
+
     def close(self):
+        for conn in self.read_conns:
+            conn.close()
         self.conn.close()
 
+class AsyncDatabase:
+    """Awaitable front end for Database so no SQLite call runs on the event loop.
+
+    Writes are queued on a single writer thread, which keeps them ordered. SQL reads run on a
+    small reader pool over their own WAL connections. Indexed VPS lookups are answered inline.
+    """
+    def __init__(self, db, readers=DB_READERS):
+        self.sync = db
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader')
+        # Counter increments not written yet, keyed by (key, hour bucket); see flush_stats
+        self.pending_stats = Counter()
+
+    async def _write(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.writer, functools.partial(func, *args, **kwargs))
+
+    async def _read(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.readers, functools.partial(func, *args, **kwargs))
+
+    # Index lookups: O(1) and in memory, so not worth a thread hop
+    async def get_vps_by_id(self, vps_id):
+        return self.sync.get_vps_by_id(vps_id)
+
+    async def get_vps_by_token(self, token):
+        return self.sync.get_vps_by_token(token)
+
+    async def get_vps_by_container_id(self, container_id):
+        return self.sync.get_vps_by_container_id(container_id)
+
+    async def get_user_vps_count(self, user_id):
+        return self.sync.get_user_vps_count(user_id)
+
+    async def get_user_vps(self, user_id):
+        return self.sync.get_user_vps(user_id)
+
+    async def get_allocated_resources(self):
+        return self.sync.get_allocated_resources()
+
+    # Reads
+    async def get_all_vps(self):
+        return await self._read(self.sync.get_all_vps)
+
+    async def get_setting(self, key, default=None):
+        return await self._read(self.sync.get_setting, key, default)
+
+    async def get_stat(self, key, default=0):
+        value = await self._read(self.sync.get_stat, key, default)
+        return value + sum(amount for (pending_key, _), amount in self.pending_stats.items() if pending_key == key)
+
+    async def get_stat_buckets(self, key, since, period='hour'):
+        counts = Counter(await self._read(self.sync.get_stat_buckets, key, since, period))
+        length = 13 if period == 'hour' else 10
+        for (pending_key, bucket), amount in self.pending_stats.items():
+            if pending_key == key and bucket >= since:
+                counts[bucket[:length]] += amount
+        return dict(sorted(counts.items()))
+
+    async def get_vps_events(self, vps_id, limit=5):
+        return await self._read(self.sync.get_vps_events, vps_id, limit)
+
+    async def get_job(self, job_id):
+        return await self._read(self.sync.get_job, job_id)
+
+    async def get_nodes(self):
+        return await self._read(self.sync.get_nodes)
+
+    async def get_unfinished_jobs(self):
+        return await self._read(self.sync.get_unfinished_jobs)
+
+    async def get_snapshots(self, vps_id=None):
+        return await self._read(self.sync.get_snapshots, vps_id)
+
+    async def get_snapshot(self, snapshot_id):
+        return await self._read(self.sync.get_snapshot, snapshot_id)
+
+    async def is_user_banned(self, user_id):
+        return await self._read(self.sync.is_user_banned, user_id)
+
+    async def get_banned_users(self):
+        return await self._read(self.sync.get_banned_users)
+
+    async def get_admins(self):
+        return await self._read(self.sync.get_admins)
+
+    # Writes
+    async def set_setting(self, key, value):
+        return await self._write(self.sync.set_setting, key, value)
+
+    async def increment_stat(self, key, amount=1):
+        """Buffer a counter increment in memory; flush_stats writes the batch"""
+        self.pending_stats[(key, stat_bucket())] += amount
+
+    async def flush_stats(self):
+        if not self.pending_stats:
+            return
+        pending, self.pending_stats = self.pending_stats, Counter()
+        try:
+            await self._write(self.sync.increment_stats, pending)
+        except Exception:
+            self.pending_stats.update(pending)
+            raise
+
+    async def add_vps(self, vps_data):
+        result = await self._write(self.sync.add_vps, vps_data)
+        await self.increment_stat('total_vps_created')
+        return result
+
+    async def remove_vps(self, token):
+        return await self._write(self.sync.remove_vps, token)
+
+    async def update_vps(self, token, updates):
+        return await self._write(self.sync.update_vps, token, updates)
+
+    async def set_vps_status(self, token, status, expected):
+        return await self._write(self.sync.set_vps_status, token, status, expected)
+
+    async def record_vps_event(self, vps_id, container_id, event, exit_code=None, created_at=None):
+        return await self._write(self.sync.record_vps_event, vps_id, container_id, event, exit_code, created_at)
+
+    async def add_job(self, job):
+        return await self._write(self.sync.add_job, job)
+
+    async def update_job(self, job_id, updates):
+        return await self._write(self.sync.update_job, job_id, updates)
+
+    async def add_snapshot(self, snapshot):
+        return await self._write(self.sync.add_snapshot, snapshot)
+
+    async def remove_snapshot(self, snapshot_id):
+        return await self._write(self.sync.remove_snapshot, snapshot_id)
+
+    async def add_node(self, name, url, disk_gb=None):
+        return await self._write(self.sync.add_node, name, url, disk_gb)
+
+    async def remove_node(self, name):
+        return await self._write(self.sync.remove_node, name)
+
+    async def set_node_draining(self, name, draining):
+        return await self._write(self.sync.set_node_draining, name, draining)
+
+    async def ban_user(self, user_id):
+        return await self._write(self.sync.ban_user, user_id)
+
+    async def unban_user(self, user_id):
+        return await self._write(self.sync.unban_user, user_id)
+
+    async def add_admin(self, user_id):
+        return await self._write(self.sync.add_admin, user_id)
+
+    async def remove_admin(self, user_id):
+        return await self._write(self.sync.remove_admin, user_id)
+
+    async def backup_data(self):
+        # Reads its own snapshot, so it does not hold up queued writes
+        return await self._read(self.sync.backup_data)
+
+    async def list_backups(self):
+        return await self._read(self.sync.list_backups)
+
+    async def hot_backup(self):
+        return await self._read(self.sync.hot_backup)
+
+    async def restore_data(self, path=None):
+        return await self._write(self.sync.restore_data, path)
+
+    def close(self):
+        # Write out buffered counters and let queued writes finish before the connection goes away
+        if self.pending_stats:
+            self.writer.submit(self.sync.increment_stats, self.pending_stats)
+            self.pending_stats = Counter()
+        self.writer.shutdown(wait=True)
+        self.readers.shutdown(wait=True)
+        self.sync.close()
+
+class MinerSignatureMatcher:
+    """Scores container process tables against MINER_SIGNATURES compiled into two regexes"""
+    HOST_PORT_RE = re.compile(r'(?:^|[/@])[\w.-]+:(\d{2,5})(?:/|$)')
+
+    def __init__(self, signatures=MINER_SIGNATURES, stratum_ports=STRATUM_PORTS, threshold=MINER_SCORE_THRESHOLD):
+        self.weights = {}
+        name_patterns = []
+        arg_patterns = []
+        for index, (kind, pattern, weight) in enumerate(signatures):
+            group = f'sig{index}'
+            self.weights[group] = weight
+            (name_patterns if kind == 'name' else arg_patterns).append(f'(?P<{group}>{pattern})')
+        # Allow version suffixes on process names, e.g. xmrig-6.21
+        self.name_re = re.compile(r'(?:%s)(?:[-_.][\w.]*)?' % '|'.join(name_patterns), re.IGNORECASE)
+        self.arg_re = re.compile(r'(?<!\S)(?:%s)' % '|'.join(arg_patterns), re.IGNORECASE)
+        self.stratum_ports = set(stratum_ports)
+        self.threshold = threshold
+
+    def score(self, commands, remote_ports=()):
+        """Return (score, matched signature names) for a list of process command lines"""
+        hits = {}
+        ports = {port for port in remote_ports if port in self.stratum_ports}
+        for command in commands:
+            argv = command.split()
+            if not argv:
+                continue
+            match = self.name_re.fullmatch(os.path.basename(argv[0]).strip('[]'))
+            if match:
+                hits.setdefault(match.lastgroup, match.group(match.lastgroup))
+            arguments = ' '.join(argv[1:])
+            for match in self.arg_re.finditer(arguments):
+                hits.setdefault(match.lastgroup, match.group(match.lastgroup))
+            for token in argv[1:]:
+                port_match = self.HOST_PORT_RE.search(token)
+                if port_match and int(port_match.group(1)) in self.stratum_ports:
+                    ports.add(int(port_match.group(1)))
+
+        score = sum(self.weights[group] for group in hits)
+        reasons = sorted(hits.values())
+        if ports:
+            score += STRATUM_PORT_WEIGHT
+            reasons.append(f"stratum ports {sorted(ports)}")
+        return score, reasons
+
+    def is_miner(self, commands, remote_ports=()):
+        score, reasons = self.score(commands, remote_ports)
+        return score >= self.threshold, score, reasons
+
+class AsyncDockerClient:
+    """Runs blocking Docker SDK calls on a bounded thread pool so they never stall the event loop"""
+    def __init__(self, client, max_workers=DOCKER_WORKERS):
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='docker')
+
+    async def call(self, func, *args, **kwargs):
+        """Run any blocking callable on the Docker executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def get(self, container_id):
+        return await self.call(self.client.containers.get, container_id)
+
+    async def list(self, **kwargs):
+        return await self.call(self.client.containers.list, **kwargs)
+
+    async def run(self, image, **kwargs):
+        return await self.call(self.client.containers.run, image, **kwargs)
+
+    async def start(self, container):
+        return await self.call(container.start)
+
+    async def stop(self, container, **kwargs):
+        return await self.call(container.stop, **kwargs)
+
+    async def restart(self, container, **kwargs):
+        return await self.call(container.restart, **kwargs)
+
+    async def kill(self, container, **kwargs):
+        return await self.call(container.kill, **kwargs)
+
+    async def remove(self, container, **kwargs):
+        return await self.call(container.remove, **kwargs)
+
+    async def exec_run(self, container, cmd, **kwargs):
+        return await self.call(container.exec_run, cmd, **kwargs)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.client.close()
+
+class DockerNode:
+    """One Docker daemon: its client, worker pool, event stream and last health check"""
+    def __init__(self, name, url=None, disk_gb=None, draining=False):
+        self.name = name
+        self.url = url
+        # Docker does not report disk size, so remote nodes only get disk admission when an admin sets it
+        self.disk_gb = disk_gb
+        self.draining = draining
+        self.client = None
+        self.docker = None
+        self.events = None
+        # The event stream blocks a thread for as long as it is open, so it gets one of its own
+        self.event_pump = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'docker-events-{name}')
+        # timeNano of the last event handled; a reconnect resumes the stream right after it
+        self.last_event = None
+        self.healthy = False
+        self.failures = 0
+        self.last_seen = None
+        self.last_error = None
+        self.info = {}
+
+    def cert_dir(self):
+        path = os.path.join(DOCKER_CERT_DIR, self.name)
+        return path if self.url and self.url.startswith('tcp://') and os.path.isdir(path) else None
+
+    def connect(self):
+        """Open the client; blocking, so run it off the event loop"""
+        if not self.url:
+            client = docker.from_env()
+        else:
+            certs = self.cert_dir()
+            tls = docker.tls.TLSConfig(
+                client_cert=(os.path.join(certs, 'cert.pem'), os.path.join(certs, 'key.pem')),
+                ca_cert=os.path.join(certs, 'ca.pem'),
+                verify=True
+            ) if certs else False
+            client = docker.DockerClient(base_url=self.url, tls=tls, use_ssh_client=self.url.startswith('ssh://'))
+        self.client = client
+        self.docker = AsyncDockerClient(client)
+
+    def cli_env(self):
+        """Environment for docker CLI calls against this node; None keeps the CLI's own default"""
+        if not self.url:
+            return None
+        env = dict(os.environ, DOCKER_HOST=self.url)
+        certs = self.cert_dir()
+        if certs:
+            env.update(DOCKER_TLS_VERIFY='1', DOCKER_CERT_PATH=certs)
+        return env
+
+    def close(self):
+        if self.events:
+            self.events.close()
+        self.event_pump.shutdown(wait=False)
+        if self.docker:
+            self.docker.close()
+
+class NodeRegistry:
+    """The Docker nodes VPS can be placed on, with a health check loop.
+
+    A node is healthy after a successful check and unhealthy after NODE_FAILURE_THRESHOLD failed
+    ones in a row; only healthy nodes that are not draining take new VPS.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self.nodes = {}
+        self.by_client = {}
+        # Container id -> node name for containers the event stream and VPS index do not know yet
+        self.located = {}
+
+    @property
+    def primary(self):
+        return self.nodes.get(PRIMARY_NODE)
+
+    async def load(self):
+        for row in await self.bot.db.get_nodes():
+            await self.add(DockerNode(row['name'], row['url'], row['disk_gb'], bool(row['draining'])))
+
+    async def add(self, node):
+        self.nodes[node.name] = node
+        await self.connect(node)
+        return node
+
+    def remove(self, name):
+        node = self.nodes.pop(name)
+        self.by_client.pop(id(node.client), None)
+        node.close()
+
+    async def connect(self, node):
+        try:
+            await asyncio.wait_for(asyncio.to_thread(node.connect), NODE_HEALTH_TIMEOUT)
+        except Exception as e:
+            node.last_error = str(e)
+            logger.error(f"Could not connect to node {node.name}: {e}")
+            return
+        self.by_client[id(node.client)] = node
+        await self.check(node)
+
+    def watch(self, node):
+        self.bot.loop.create_task(self.bot.docker_events_monitor(node))
+
+    def online(self):
+        return [node for node in self.nodes.values() if node.docker and node.healthy]
+
+    def schedulable(self):
+        return [node for node in self.online() if not node.draining]
+
+    def node_for(self, container_id):
+        """The node a container lives on, falling back to the primary node for unknown ids"""
+        name = (self.bot.container_states.get(container_id) or {}).get('node') or self.located.get(container_id)
+        if not name:
+            _, vps = self.bot.db.sync.get_vps_by_container_id(container_id)
+            name = vps.get('node') if vps else None
+        return self.nodes.get(name or PRIMARY_NODE) or self.primary
+
+    def node_of(self, container):
+        """The node whose client produced a container object"""
+        return self.by_client.get(id(container.client)) or self.primary
+
+    async def check(self, node):
+        try:
+            info = await asyncio.wait_for(node.docker.call(node.client.info), NODE_HEALTH_TIMEOUT)
+        except Exception as e:
+            node.failures += 1
+            node.last_error = str(e) or type(e).__name__
+            if node.healthy and node.failures >= NODE_FAILURE_THRESHOLD:
+                node.healthy = False
+                logger.warning(f"Node {node.name} marked unhealthy after {node.failures} failed checks: {node.last_error}")
+            return
+        node.info = {
+            'memory': info['MemTotal'] / (1024 ** 3),
+            'cpu': info['NCPU'],
+            'containers': info['Containers'],
+            'running': info['ContainersRunning'],
+            'version': info['ServerVersion']
+        }
+        if not node.healthy:
+            logger.info(f"Node {node.name} is healthy")
+        node.healthy = True
+        node.failures = 0
+        node.last_seen = time.time()
+        node.last_error = None
+
+    async def health_loop(self):
+        while not self.bot.is_closed():
+            await asyncio.sleep(NODE_HEALTH_INTERVAL)
+            await asyncio.gather(*(
+                self.check(node) if node.docker else self.connect(node)
+                for node in list(self.nodes.values())
+            ))
+
+    def close(self):
+        for node in self.nodes.values():
+            node.close()
+
+class DockerCluster:
+    """AsyncDockerClient-shaped front over every node, so callers never pick a daemon themselves.
+
+    Calls on a container object run on the node whose client produced it. Lookups by id go to the
+    node the event stream, the VPS index or an earlier call put the container on, then to the rest.
+    """
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def node(self, name=None):
+        node = self.nodes.nodes.get(name) if name else self.nodes.primary
+        if node is None or node.docker is None:
+            raise docker.errors.DockerException(f"Node {name or PRIMARY_NODE} is not connected")
+        return node
+
+    async def call(self, func, *args, node=None, **kwargs):
+        return await self.node(node).docker.call(func, *args, **kwargs)
+
+    async def get(self, container_id):
+        home = self.nodes.node_for(container_id)
+        for node in [home] + [other for other in self.nodes.online() if other is not home]:
+            if node is None or node.docker is None:
+                continue
+            try:
+                container = await node.docker.get(container_id)
+            except docker.errors.NotFound:
+                continue
+            self.nodes.located[container.id] = node.name
+            return container
+        raise docker.errors.NotFound(f"No such container: {container_id}")
+
+    async def list(self, node=None, **kwargs):
+        """Containers of one node, or of every reachable node"""
+        if node:
+            return await self.node(node).docker.list(**kwargs)
+        targets = self.nodes.online()
+        results = await asyncio.gather(*(target.docker.list(**kwargs) for target in targets), return_exceptions=True)
+        containers = []
+        for target, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error listing containers on node {target.name}: {result}")
+            else:
+                containers.extend(result)
+        return containers
+
+    async def run(self, image, node=None, **kwargs):
+        target = self.node(node)
+        container = await target.docker.run(image, **kwargs)
+        self.nodes.located[container.id] = target.name
+        return container
+
+    async def start(self, container):
+        return await self.nodes.node_of(container).docker.start(container)
+
+    async def stop(self, container, **kwargs):
+        return await self.nodes.node_of(container).docker.stop(container, **kwargs)
+
+    async def restart(self, container, **kwargs):
+        return await self.nodes.node_of(container).docker.restart(container, **kwargs)
+
+    async def kill(self, container, **kwargs):
+        return await self.nodes.node_of(container).docker.kill(container, **kwargs)
+
+    async def remove(self, container, **kwargs):
+        return await self.nodes.node_of(container).docker.remove(container, **kwargs)
+
+    async def exec_run(self, container, cmd, **kwargs):
+        return await self.nodes.node_of(container).docker.exec_run(container, cmd, **kwargs)
+
+    def close(self):
+        self.nodes.close()
+
+class WarmPool:
+    """Keeps pre-booted custom-image containers idle so /create_vps only has to personalise one"""
+    LABEL = 'unixnodes.pool'
+    VPS_ID_LABEL = 'unixnodes.vps_id'
+
+    def __init__(self, bot, sizes=WARM_POOL_SIZES):
+        self.bot = bot
+        self.sizes = sizes
+        self.idle = {image: [] for image in sizes}
+        self.hits = 0
+        self.misses = 0
+        self.refill_lock = asyncio.Lock()
+
+    def idle_count(self):
+        return sum(len(entries) for entries in self.idle.values())
+
+    async def adopt_existing(self):
+        """Put unclaimed pool containers left over from a previous run back into the pool"""
+        if not self.sizes:
+            return
+        claimed = {vps['container_id'] for vps in (await self.bot.db.get_all_vps()).values()}
+        # A create job that claimed a container but has not recorded its VPS yet still owns it
+        claimed.update(job['progress'].get('container_id') for job in await self.bot.db.get_unfinished_jobs())
+        for container in await self.bot.docker.list(all=True, filters={'label': self.LABEL}):
+            if container.id in claimed:
+                continue
+            image = container.labels.get(self.LABEL)
+            if image in self.idle and container.status == 'running':
+                self.idle[image].append((container.labels.get(self.VPS_ID_LABEL), container))
+            else:
+                try:
+                    await self.bot.docker.remove(container, force=True)
+                except Exception as e:
+                    logger.error(f"Error removing stale warm pool container {container.id[:12]}: {e}")
+
+    def claim(self, os_image):
+        """Take an idle (vps_id, container) for os_image, or None on a miss"""
+        entries = self.idle.get(os_image)
+        if not entries:
+            if os_image in self.sizes:
+                self.misses += 1
+            return None
+        self.hits += 1
+        self.schedule_refill()
+        return entries.pop(0)
+
+    def schedule_refill(self):
+        if self.sizes:
+            self.bot.loop.create_task(self.refill())
+
+    async def refill(self):
+        """Boot containers until every image is at its target size or max_containers is reached"""
+        async with self.refill_lock:
+            limit = await self.bot.db.get_setting('max_containers', MAX_CONTAINERS)
+            # Containers come from the event-fed cache; ones booted in this pass may not have shown up in it yet
+            booted = []
+            for image, target in self.sizes.items():
+                while len(self.idle[image]) < target:
+                    count = len(self.bot.container_states) + sum(1 for container_id in booted if container_id not in self.bot.container_states)
+                    if count >= limit:
+                        logger.warning("Warm pool refill paused: container limit reached")
+                        return
+                    try:
+                        entry = await self.boot(image)
+                        booted.append(entry[1].id)
+                        self.idle[image].append(entry)
+                    except Exception as e:
+                        logger.error(f"Error booting warm pool container for {image}: {e}")
+                        break
+
+    async def boot(self, image):
+        vps_id = generate_vps_id()
+        image_tag = await build_custom_image(image)
+        container = await self.bot.docker.run(
+            image_tag,
+            detach=True,
+            privileged=True,
+            hostname=f"unixnodes-{vps_id}",
+            cap_add=["ALL"],
+            network=DOCKER_NETWORK,
+            volumes={
+                f'unixnodes-{vps_id}': {'bind': '/data', 'mode': 'rw'}
+            },
+            restart_policy={"Name": "always"},
+            labels={self.LABEL: image, self.VPS_ID_LABEL: vps_id}
+        )
+        logger.info(f"Warm pool booted {container.id[:12]} for {image}")
+        return vps_id, container
+
+class CapacityLedger:
+    """Memory, cores and disk promised to VPS against what each node physically has, and placement.
+
+    A node admits a request while its allocations stay within physical size times the overcommit
+    ratio of each resource (the *_overcommit_pct settings). Placement picks among the nodes that
+    admit it: fewest VPS of the same owner first, so one owner's VPS spread across nodes, then
+    best fit on memory and CPU, so large gaps stay open for large plans. Placed requests are held
+    until their job finishes, so two creates queued back to back cannot both take the last of
+    the headroom.
+    """
+    RESOURCES = ('memory', 'cpu', 'disk')
+    UNITS = {'memory': 'GB', 'cpu': ' cores', 'disk': 'GB'}
+    DEFAULT_RATIOS = {'memory': MEMORY_OVERCOMMIT, 'cpu': CPU_OVERCOMMIT, 'disk': DISK_OVERCOMMIT}
+
+    def __init__(self, bot):
+        self.bot = bot
+        # key -> (node name, request)
+        self.held = {}
+        self.lock = asyncio.Lock()
+
+    def physical(self, node):
+        """Node size; the primary node's comes from update_system_stats, or straight from psutil before its first sample"""
+        if node.url:
+            return {'memory': node.info.get('memory', 0), 'cpu': node.info.get('cpu', 0), 'disk': node.disk_gb}
+        stats = self.bot.system_stats
+        if stats.get('last_updated'):
+            return {'memory': stats['memory_total'], 'cpu': stats['cpu_count'], 'disk': stats['disk_total']}
+        return {
+            'memory': psutil.virtual_memory().total / (1024 ** 3),
+            'cpu': psutil.cpu_count(logical=True) or 1,
+            'disk': psutil.disk_usage('/').total / (1024 ** 3)
+        }
+
+    async def snapshot(self, node):
+        allocated = (await self.bot.db.get_allocated_resources()).get(node.name, {'memory': 0, 'cpu': 0, 'disk': 0})
+        for held_node, demand in self.held.values():
+            if held_node == node.name:
+                for resource in self.RESOURCES:
+                    allocated[resource] += demand[resource]
+        physical = self.physical(node)
+        ratios = {
+            resource: await self.bot.db.get_setting(f'{resource}_overcommit_pct', int(self.DEFAULT_RATIOS[resource] * 100)) / 100
+            for resource in self.RESOURCES
+        }
+        # A resource whose size is unknown is not limited
+        limit = {
+            resource: physical[resource] * ratios[resource] if physical[resource] is not None else float('inf')
+            for resource in self.RESOURCES
+        }
+        return {
+            'physical': physical,
+            'ratios': ratios,
+            'allocated': allocated,
+            'limit': limit,
+            'free': {resource: limit[resource] - allocated[resource] for resource in self.RESOURCES}
+        }
+
+    async def place(self, key, demand, owner_id=None, node=None):
+        """Pick a node for demand (or check the given one) and hold it under key; returns (node name, refusal)"""
+        async with self.lock:
+            candidates = [node] if node else self.bot.nodes.schedulable()
+            if not candidates:
+                return None, "No healthy Docker node is available"
+            owned = Counter(vps.get('node') or PRIMARY_NODE for vps in await self.bot.db.get_user_vps(owner_id)) if owner_id else Counter()
+            fits = []
+            refusals = []
+            for candidate in candidates:
+                snapshot = await self.snapshot(candidate)
+                free, limit = snapshot['free'], snapshot['limit']
+                short = [
+                    f"{resource} (needs {demand[resource]}{self.UNITS[resource]}, {max(free[resource], 0):.1f}{self.UNITS[resource]} free)"
+                    for resource in self.RESOURCES if demand[resource] > free[resource]
+                ]
+                if short:
+                    refusals.append(f"{candidate.name}: {', '.join(short)}")
+                    continue
+                leftover = sum((free[resource] - demand[resource]) / limit[resource] for resource in ('memory', 'cpu') if limit[resource])
+                fits.append((owned[candidate.name], leftover, candidate.name))
+            if not fits:
+                return None, "Not enough capacity: " + "; ".join(refusals)
+            chosen = min(fits)[2]
+            self.held[key] = (chosen, demand)
+        return chosen, None
+
+    def hold(self, key, node, demand):
+        self.held[key] = (node, demand)
+
+    def release(self, key):
+        self.held.pop(key, None)
+
+class JobReporter:
+    """Stands in for a status message, so setup_container's progress lines land in the job row"""
+    def __init__(self, jobs, job):
+        self.jobs = jobs
+        self.job = job
+
+    async def edit(self, content=None, **kwargs):
+        if content:
+            await self.jobs.save(self.job, message=content)
+
+class ProvisioningJobs:
+    """Durable queue for VPS create, reinstall, edit, delete, migrate, snapshot and restore operations.
+
+    Every job is a provision_jobs row and runs as a fixed list of steps. After each step the row
+    records the step name and whatever later steps need (container id, password, session), so
+    resume() continues an interrupted job after its last finished step. Container setup is the one
+    step that is not safe to repeat; a job cut off there is rolled back to a fresh container
+    instead. Job containers carry their job id as a label, so starting one is idempotent even if
+    the bot died before recording it. PROVISION_CONCURRENCY jobs run at once, jobs on the same VPS
+    run one after another and image builds are capped at BUILD_CONCURRENCY.
+    """
+    LABEL = 'unixnodes.job'
+    # kind -> [(step, method, safe to repeat after an interruption)]
+    STEPS = {
+        'create': [
+            ('prepare', 'step_prepare', True), ('container', 'step_container', True), ('setup', 'step_setup', False),
+            ('session', 'step_session', True), ('record', 'step_record', True), ('notify', 'step_notify', True)
+        ],
+        # The old container is only stopped until the new one is recorded, so a failed job can start it again
+        'reinstall': [
+            ('stop_old', 'step_stop_old', True), ('prepare', 'step_prepare', True), ('container', 'step_container', True),
+            ('setup', 'step_setup', False), ('session', 'step_session', True), ('record', 'step_record', True),
+            ('remove_old', 'step_remove_old', True), ('notify', 'step_notify', True)
+        ],
+        'edit': [
+            ('stop_old', 'step_stop_old', True), ('prepare', 'step_prepare', True), ('container', 'step_container', True),
+            ('setup', 'step_setup', False), ('record', 'step_record', True), ('remove_old', 'step_remove_old', True),
+            ('notify', 'step_notify', True)
+        ],
+        'delete': [
+            ('remove_old', 'step_remove_old', True), ('record', 'step_record', True), ('notify', 'step_notify', True)
+        ],
+        'migrate': [
+            ('precopy', 'step_precopy', True), ('cutover', 'step_cutover', True), ('session', 'step_session', True),
+            ('record', 'step_record', True), ('cleanup', 'step_cleanup_source', True), ('notify', 'step_notify', True)
+        ],
+        'snapshot': [
+            ('commit', 'step_snapshot_commit', True), ('volume', 'step_snapshot_volume', True), ('record', 'step_record', True),
+            ('prune', 'step_prune_snapshots', True), ('notify', 'step_notify', True)
+        ],
+        # No setup step: the snapshot image already holds the users, packages and configuration
+        'restore': [
+            ('restore_volume', 'step_restore_volume', True), ('container', 'step_restore_container', True),
+            ('session', 'step_session', True), ('record', 'step_record', True), ('remove_old', 'step_remove_old', True),
+            ('notify', 'step_notify', True)
+        ],
+    }
+
+    def __init__(self, bot, concurrency=PROVISION_CONCURRENCY, builds=BUILD_CONCURRENCY):
+        self.bot = bot
+        self.slots = asyncio.Semaphore(concurrency)
+        self.builds = asyncio.Semaphore(builds)
+        self.vps_locks = {}
+        # Unfinished jobs of this process; on_finish callbacks are in-memory only and do not survive a restart
+        self.active = {}
+        self.on_finish = {}
+
+    def pending_creates(self, owner_id=None):
+        return sum(
+            1 for job in self.active.values()
+            if job['kind'] == 'create' and (owner_id is None or job['params']['owner_id'] == str(owner_id))
+        )
+
+    async def submit(self, kind, vps_id, params, requested_by, channel_id=None, on_finish=None):
+        now = str(datetime.datetime.now())
+        job = {
+            'id': generate_job_id(),
+            'kind': kind,
+            'vps_id': vps_id,
+            'state': 'queued',
+            'step': None,
+            'message': 'Waiting for a free slot',
+            'params': params,
+            'progress': {},
+            'error': None,
+            'requested_by': str(requested_by),
+            'channel_id': str(channel_id) if channel_id else None,
+            'created_at': now,
+            'updated_at': now
+        }
+        await self.bot.db.add_job(job)
+        if on_finish:
+            self.on_finish[job['id']] = on_finish
+        self.schedule(job)
+        return job['id']
+
+    def schedule(self, job):
+        self.active[job['id']] = job
+        self.bot.loop.create_task(self.run(job))
+
+    async def resume(self):
+        """Pick up the jobs a previous run left queued or running"""
+        for job in await self.bot.db.get_unfinished_jobs():
+            steps = self.STEPS[job['kind']]
+            names = [name for name, _, _ in steps]
+            done = names.index(job['step']) + 1 if job['step'] in names else 0
+            if job['state'] == 'running' and done < len(steps) and not steps[done][2]:
+                logger.warning(f"Job {job['id']} was interrupted during {names[done]}, rolling back to a fresh container")
+                await self.discard_containers(job)
+                for key in ('container_id', 'pooled'):
+                    job['progress'].pop(key, None)
+                restart = names.index('prepare')
+                await self.save(job, step=names[restart - 1] if restart else None, progress=job['progress'])
+            if job['params'].get('reservation'):
+                self.bot.capacity.hold(job['params']['reservation'], job['params'].get('node') or PRIMARY_NODE, job['params']['reserved'])
+            logger.info(f"Resuming {job['kind']} job {job['id']} for VPS {job['vps_id']}")
+            self.schedule(job)
+
+    async def save(self, job, **updates):
+        job.update(updates)
+        await self.bot.db.update_job(job['id'], updates)
+
+    async def run(self, job):
+        lock = self.vps_locks.setdefault(job['vps_id'], asyncio.Lock())
+        step = None
+        async with lock, self.slots:
+            try:
+                await self.save(job, state='running')
+                steps = self.STEPS[job['kind']]
+                names = [name for name, _, _ in steps]
+                start = names.index(job['step']) + 1 if job['step'] in names else 0
+                for step, method, _ in steps[start:]:
+                    await getattr(self, method)(job)
+                    await self.save(job, step=step, progress=job['progress'])
+                await self.save(job, state='done', message='Finished')
+            except Exception as e:
+                logger.error(f"{job['kind'].capitalize()} job {job['id']} failed at {step}: {e}")
+                try:
+                    await self.discard_containers(job)
+                    rollback = getattr(self, f"rollback_{job['kind']}", None)
+                    if rollback:
+                        await rollback(job)
+                except Exception as cleanup_error:
+                    logger.error(f"Error rolling back job {job['id']}: {cleanup_error}")
+                await self.save(job, state='failed', error=str(e), message=f"Failed at {step}")
+                await self.announce(job, f"❌ {job['kind'].capitalize()} job `{job['id']}` for VPS {job['vps_id']} failed: {e}")
+            finally:
+                self.active.pop(job['id'], None)
+                self.bot.capacity.release(job['params'].get('reservation'))
+        callback = self.on_finish.pop(job['id'], None)
+        if callback:
+            try:
+                await callback(job)
+            except Exception as e:
+                logger.error(f"Error in job {job['id']} callback: {e}")
+
+    async def discard_containers(self, job):
+        """Remove the containers this job started that no VPS row points at"""
+        _, vps = await self.bot.db.get_vps_by_id(job['vps_id'])
+        keep = vps['container_id'] if vps else None
+        containers = {c.id: c for c in await self.bot.docker.list(all=True, filters={'label': f"{self.LABEL}={job['id']}"})}
+        claimed = job['progress'].get('container_id')
+        if claimed and claimed not in containers and job['progress'].get('pooled'):
+            try:
+                containers[claimed] = await self.bot.docker.get(claimed)
+            except docker.errors.NotFound:
+                pass
+        for container_id, container in containers.items():
+            if container_id != keep:
+                await self.bot.docker.remove(container, force=True)
+                logger.info(f"Removed container {container_id[:12]} of job {job['id']}")
+
+    async def announce(self, job, content):
+        if not job['channel_id']:
+            return
+        try:
+            channel = self.bot.get_channel(int(job['channel_id']))
+            if channel:
+                await channel.send(f"<@{job['requested_by']}> {content}")
+        except Exception as e:
+            logger.error(f"Error announcing job {job['id']}: {e}")
+
+    async def step_stop_old(self, job):
+        """Stop the old container but keep it until the new one has taken over"""
+        progress = job['progress']
+        try:
+            container = await self.bot.docker.get(job['params']['old_container_id'])
+        except docker.errors.NotFound:
+            progress.setdefault('was_running', False)
+            return
+        progress.setdefault('was_running', container.status == 'running')
+        await self.save(job, message="⏸️ Stopping old container...")
+        # Under restart policy "always" a daemon restart would start it again next to the new one
+        await self.bot.docker.call(container.update, restart_policy={'Name': 'no'}, node=self.bot.nodes.node_of(container).name)
+        await self.bot.docker.stop(container)
+
+    async def rollback_reinstall(self, job):
+        """Bring the old container back if the VPS still points at it"""
+        params, progress = job['params'], job['progress']
+        _, vps = await self.bot.db.get_vps_by_id(job['vps_id'])
+        if not vps or vps['container_id'] != params['old_container_id']:
+            return
+        try:
+            container = await self.bot.docker.get(params['old_container_id'])
+        except docker.errors.NotFound:
+            return
+        await self.bot.docker.call(container.update, restart_policy={'Name': 'always'}, node=self.bot.nodes.node_of(container).name)
+        if progress.get('was_running'):
+            await self.bot.docker.start(container)
+
+    rollback_edit = rollback_reinstall
+
+    async def step_remove_old(self, job):
+        await self.save(job, message="🧹 Removing old container...")
+        try:
+            container = await self.bot.docker.get(job['params']['old_container_id'])
+            await self.bot.docker.remove(container, force=True)
+        except docker.errors.NotFound:
+            pass
+
+    async def step_prepare(self, job):
+        """Pick the image to run, or claim a pre-booted container from the warm pool"""
+        params, progress = job['params'], job['progress']
+        progress['os_image'] = params['os_image']
+        progress['custom'] = params['use_custom_image']
+        # The warm pool lives on the primary node
+        if job['kind'] == 'create' and params['use_custom_image'] and (params.get('node') or PRIMARY_NODE) == PRIMARY_NODE:
+            pooled = self.bot.warm_pool.claim(params['os_image'])
+            if pooled:
+                # Pool containers were booted with their own VPS id baked into hostname and volume
+                progress['container_id'] = pooled[1].id
+                progress['pooled'] = True
+                await self.save(job, vps_id=pooled[0], message="⚡ Claimed a pre-booted container.")
+                return
+        if params['use_custom_image']:
+            await self.save(job, message="🔨 Preparing UnixNodes base image...")
+            async with self.builds:
+                progress['image'] = await build_custom_image(params['os_image'], node=params.get('node'))
+        else:
+            progress['image'] = params['os_image']
+
+    async def step_container(self, job):
+        params, progress = job['params'], job['progress']
+        if progress.get('container_id'):
+            return
+        existing = await self.bot.docker.list(node=params.get('node'), all=True, filters={'label': f"{self.LABEL}={job['id']}"})
+        if existing:
+            progress['container_id'] = existing[0].id
+            return
+        await self.save(job, message="⚙️ Initializing container...")
+        labels = {self.LABEL: job['id']}
+        try:
+            container = await self.bot.docker.run(
+                progress['image'], node=params.get('node'), **container_options(job['vps_id'], params['memory'], params['cpu'], progress['custom'], labels)
+            )
+        except docker.errors.ImageNotFound:
+            if progress['custom'] or progress['image'] == DEFAULT_OS_IMAGE:
+                raise
+            await self.save(job, message=f"❌ OS image {progress['image']} not found. Using default {DEFAULT_OS_IMAGE}")
+            progress['image'] = progress['os_image'] = DEFAULT_OS_IMAGE
+            container = await self.bot.docker.run(
+                DEFAULT_OS_IMAGE, node=params.get('node'), **container_options(job['vps_id'], params['memory'], params['cpu'], False, labels)
+            )
+        progress['container_id'] = container.id
+
+    async def step_setup(self, job):
+        params, progress = job['params'], job['progress']
+        setup_success, ssh_password, _ = await setup_container(
+            progress['container_id'],
+            JobReporter(self, job),
+            params['memory'],
+            params['username'],
+            vps_id=job['vps_id'],
+            use_custom_image=progress['custom'],
+            root_password=params.get('root_password') if progress['custom'] else None
+        )
+        if not setup_success:
+            raise Exception(job['message'])
+        progress['password'] = ssh_password
+
+    async def step_session(self, job):
+        await self.save(job, message="🔐 Starting SSH session...")
+        exec_cmd = await docker_cli(
+            "exec", job['progress']['container_id'], "tmate", "-F",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        ssh_session_line = await capture_ssh_session_line(exec_cmd)
+        if not ssh_session_line:
+            if job['kind'] == 'create':
+                raise Exception("Failed to get tmate session")
+            logger.warning(f"Job {job['id']}: no tmate session for VPS {job['vps_id']}")
+        job['progress']['tmate_session'] = ssh_session_line
+
+    async def step_record(self, job):
+        params, progress = job['params'], job['progress']
+        token, vps = await self.bot.db.get_vps_by_id(job['vps_id'])
+        if job['kind'] == 'create':
+            if vps:
+                return
+            await self.bot.db.add_vps({
+                "token": params['token'],
+                "vps_id": job['vps_id'],
+                "container_id": progress['container_id'],
+                "memory": params['memory'],
+                "cpu": params['cpu'],
+                "disk": params['disk'],
+                "username": params['username'],
+                "password": progress['password'],
+                "root_password": params['root_password'] if progress['custom'] else None,
+                "created_by": params['owner_id'],
+                "node": params.get('node') or PRIMARY_NODE,
+                "created_at": str(datetime.datetime.now()),
+                "tmate_session": progress['tmate_session'],
+                "watermark": WATERMARK,
+                "os_image": progress['os_image'],
+                "restart_count": 0,
+                "last_restart": None,
+                "status": "running",
+                "use_custom_image": progress['custom']
+            })
+        elif job['kind'] == 'delete':
+            if token:
+                await self.bot.db.remove_vps(token)
+            for snapshot in await self.bot.db.get_snapshots(job['vps_id']):
+                await self.drop_snapshot(snapshot)
+        elif job['kind'] == 'snapshot':
+            await self.bot.db.add_snapshot({
+                'id': job['id'],
+                'vps_id': job['vps_id'],
+                'node': params['node'],
+                'image': progress['image'],
+                'image_bytes': progress['image_bytes'],
+                'volume_blob': progress['volume_blob'],
+                'volume_bytes': progress['volume_bytes'],
+                'stored_bytes': progress['stored_bytes'],
+                'os_image': vps['os_image'] if vps else None,
+                'use_custom_image': vps['use_custom_image'] if vps else None,
+                'password': vps['password'] if vps else None,
+                'root_password': vps['root_password'] if vps else None,
+                'created_by': job['requested_by'],
+                'created_at': job['created_at']
+            })
+        elif job['kind'] == 'restore':
+            if not token:
+                raise Exception("VPS no longer exists")
+            snapshot = params['snapshot']
+            updates = {
+                'container_id': progress['container_id'],
+                'password': snapshot['password'],
+                'root_password': snapshot['root_password'],
+                'os_image': snapshot['os_image'],
+                'use_custom_image': snapshot['use_custom_image']
+            }
+            if progress.get('tmate_session'):
+                updates['tmate_session'] = progress['tmate_session']
+            await self.bot.db.update_vps(token, updates)
+        elif job['kind'] == 'migrate':
+            if not token:
+                raise Exception("VPS no longer exists")
+            # One UPDATE moves the VPS, so it never points at a half-migrated container
+            if vps['container_id'] == params['old_container_id']:
+                updates = {'container_id': progress['container_id'], 'node': params['node']}
+                if progress.get('tmate_session'):
+                    updates['tmate_session'] = progress['tmate_session']
+                await self.bot.db.update_vps(token, updates)
+        else:
+            if not token:
+                raise Exception("VPS no longer exists")
+            updates = {'container_id': progress['container_id'], 'password': progress['password'], 'status': 'running'}
+            if job['kind'] == 'reinstall':
+                updates.update(os_image=progress['os_image'], use_custom_image=progress['custom'])
+                if progress.get('tmate_session'):
+                    updates['tmate_session'] = progress['tmate_session']
+            else:
+                updates.update(memory=params['memory'], cpu=params['cpu'], disk=params['disk'])
+            await self.bot.db.update_vps(token, updates)
+
+    async def step_notify(self, job):
+        params, progress = job['params'], job['progress']
+        vps_id = job['vps_id']
+        if job['kind'] == 'create':
+            owner = await self.bot.fetch_user(int(params['owner_id']))
+            try:
+                embed = discord.Embed(title="🎉 IdkNodes VPS Creation Successful", color=discord.Color.green())
+                embed.add_field(name="🆔 VPS ID", value=vps_id, inline=True)
+                embed.add_field(name="💾 Memory", value=f"{params['memory']}GB", inline=True)
+                embed.add_field(name="⚡ CPU", value=f"{params['cpu']} cores", inline=True)
+                embed.add_field(name="💿 Disk", value=f"{params['disk']}GB", inline=True)
+                embed.add_field(name="👤 Username", value=params['username'], inline=True)
+                embed.add_field(name="🔑 User Password", value=f"||{progress['password']}||", inline=False)
+                if progress['custom']:
+                    embed.add_field(name="🔑 Root Password", value=f"||{params['root_password']}||", inline=False)
+                embed.add_field(name="🔒 Tmate Session", value=f"```{progress['tmate_session']}```", inline=False)
+                embed.add_field(name="🔌 Direct SSH", value=f"```ssh {params['username']}@<server-ip>```", inline=False)
+                embed.add_field(name="ℹ️ Note", value="This is a UnixNodes VPS instance. You can install and configure additional packages as needed.", inline=False)
+                await owner.send(embed=embed)
+                await self.announce(job, f"✅ IdkNodes VPS creation successful! VPS has been created for {owner.mention}. Check your DMs for connection details.")
+            except discord.Forbidden:
+                await self.announce(job, f"❌ I couldn't send a DM to {owner.mention}. Please ask them to enable DMs from server members.")
+        elif job['kind'] == 'reinstall':
+            if progress.get('tmate_session'):
+                try:
+                    owner = await self.bot.fetch_user(int(params['owner_id']))
+                    embed = discord.Embed(title=f"UnixNodes VPS Reinstalled - {vps_id}", color=discord.Color.blue())
+                    embed.add_field(name="New OS", value=progress['os_image'], inline=True)
+                    embed.add_field(name="New SSH Session", value=f"```{progress['tmate_session']}```", inline=False)
+                    embed.add_field(name="New SSH Password", value=f"||{progress['password']}||", inline=False)
+                    await owner.send(embed=embed)
+                except:
+                    pass
+            await self.announce(job, f"✅ UnixNodes VPS {vps_id} reinstalled successfully!")
+        elif job['kind'] == 'edit':
+            await self.announce(job, f"✅ VPS {vps_id} specifications updated successfully!")
+        elif job['kind'] == 'migrate':
+            summary = ", ".join(format_transfer(phase, transfer) for phase, transfer in progress['transfer'].items())
+            await self.announce(
+                job, f"✅ VPS {vps_id} migrated from {params['source_node']} to {params['node']} with "
+                f"{progress['downtime']:.1f}s downtime ({summary})"
+            )
+        elif job['kind'] == 'snapshot':
+            volume = format_size(progress['volume_bytes'])
+            if progress['deduplicated']:
+                volume += ", unchanged since an earlier snapshot and stored once"
+            else:
+                volume += f", {format_size(progress['stored_bytes'])} stored"
+            pruned = f" Removed {progress['pruned']} old snapshot(s) past the retention limit." if progress.get('pruned') else ""
+            await self.announce(
+                job, f"📸 Snapshot `{job['id']}` of VPS {vps_id} taken: filesystem layer {format_size(progress['image_bytes'])}, "
+                f"volume {volume}.{pruned}"
+            )
+        elif job['kind'] == 'restore':
+            await self.announce(
+                job, f"⏪ VPS {vps_id} restored to snapshot `{params['snapshot']['id']}` "
+                f"in {progress['restored_in']:.1f}s. The SSH password is the one it had when the snapshot was taken."
+            )
+        else:
+            await self.announce(job, f"✅ IdkNodes VPS {vps_id} has been deleted successfully!")
+
+    def transfer_reporter(self, job, label):
+        """Progress callback for stream_docker_cli that writes throughput to the job at most every few seconds"""
+        last = [0]
+
+        async def report(read, sent, seconds):
+            if seconds - last[0] >= 3:
+                last[0] = seconds
+                await self.save(job, message=f"📦 {label}: {format_transfer(None, {'read': read, 'sent': sent, 'seconds': seconds})}")
+        return report
+
+    def add_transfer(self, job, phase, read, sent, seconds):
+        totals = job['progress'].setdefault('transfer', {}).setdefault(phase, {'read': 0, 'sent': 0, 'seconds': 0})
+        totals['read'] += read
+        totals['sent'] += sent
+        totals['seconds'] += seconds
+
+    async def step_precopy(self, job):
+        """Copy the filesystem and data volume to the target node while the VPS keeps running"""
+        params, progress = job['params'], job['progress']
+        source = await self.bot.docker.get(params['old_container_id'])
+        progress.setdefault('was_running', source.status == 'running')
+        progress['precopy_started'] = time.time()
+        progress['transfer'] = {}
+        progress['image'] = f"{MIGRATION_IMAGE_REPO}:{job['vps_id'].lower()}-{job['id']}"
+
+        await self.save(job, message="📦 Pre-copying filesystem while the VPS runs...")
+        # docker import reads gzip directly; the image keeps the source's command, entrypoint and environment
+        self.add_transfer(job, 'precopy', *await stream_docker_cli(
+            ("export", source.id),
+            ("import", *image_config_changes(source.attrs['Config']), "-", progress['image']),
+            params['source_node'], params['node'], compress=True,
+            on_progress=self.transfer_reporter(job, "Filesystem pre-copy")
+        ))
+
+        await self.save(job, message="📦 Pre-copying data volume while the VPS runs...")
+        self.add_transfer(job, 'precopy', *await stream_docker_cli(
+            volume_helper_args(job['vps_id'], "tar -C /data -cf - .", read_only=True),
+            volume_helper_args(job['vps_id'], "tar -C /data -xzf -", stdin=True),
+            params['source_node'], params['node'], compress=True,
+            on_progress=self.transfer_reporter(job, "Volume pre-copy")
+        ))
+
+    async def step_cutover(self, job):
+        """Stop the VPS, send what changed since the pre-copy and start it on the target node"""
+        params, progress = job['params'], job['progress']
+        target = self.bot.docker.node(params['node'])
+        source = await self.bot.docker.get(params['old_container_id'])
+        await self.save(job, message="⏸️ Stopping VPS for the final sync...")
+        stopped_at = time.time()
+        await self.bot.docker.stop(source)
+        # Files changed since the pre-copy started, with a minute of slack for clock granularity
+        minutes = int((stopped_at - progress['precopy_started']) // 60) + 2
+        progress['transfer'].pop('final', None)
+
+        await self.save(job, message="🔁 Final sync of the data volume...")
+        self.add_transfer(job, 'final', *await stream_docker_cli(
+            volume_helper_args(job['vps_id'], f"cd /data && find . -mmin -{minutes} ! -type d | tar -cf - -T -", read_only=True),
+            volume_helper_args(job['vps_id'], "tar -C /data -xzf -", stdin=True),
+            params['source_node'], params['node'], compress=True
+        ))
+        # Send the full path list; the target deletes whatever is not on it any more
+        await stream_docker_cli(
+            volume_helper_args(job['vps_id'], "cd /data && find .", read_only=True),
+            volume_helper_args(
+                job['vps_id'],
+                "cd /data && cat > /tmp/keep && find . | sort > /tmp/have && sort /tmp/keep | comm -13 - /tmp/have"
+                " | while IFS= read -r path; do rm -rf \"$path\"; done",
+                stdin=True
+            ),
+            params['source_node'], params['node']
+        )
+
+        # The stopped container's filesystem is read back through a commit of it
+        snapshot = f"{progress['image']}-final"
+        await run_docker_cli("commit", source.id, snapshot, node=params['source_node'])
+        for stale in await self.bot.docker.list(node=target.name, all=True, filters={'label': f"{self.LABEL}={job['id']}"}):
+            await self.bot.docker.remove(stale, force=True)
+        options = container_options(job['vps_id'], params['memory'], params['cpu'], params['use_custom_image'], {self.LABEL: job['id']})
+        options.pop('detach')
+        container = await target.docker.call(target.client.containers.create, progress['image'], **options)
+        self.bot.nodes.located[container.id] = target.name
+        progress['container_id'] = container.id
+
+        await self.save(job, message="🔁 Final sync of the filesystem...")
+        changed = (
+            f"find / -xdev -mmin -{minutes} ! -type d ! -path '/proc/*' ! -path '/sys/*' ! -path '/dev/*' ! -path '/data/*'"
+            " ! -path /etc/hosts ! -path /etc/hostname ! -path /etc/resolv.conf | tar -cf - -T -"
+        )
+        self.add_transfer(job, 'final', *await stream_docker_cli(
+            ("run", "--rm", "--user", "0", "--entrypoint", "sh", snapshot, "-c", changed),
+            ("cp", "-a", "-", f"{container.id}:/"),
+            params['source_node'], params['node'], compress=True
+        ))
+        diff = await run_docker_cli("diff", source.id, node=params['source_node'])
+        deleted = [line[2:] for line in diff.splitlines() if line.startswith('D ') and not line[2:].startswith('/data/')]
+
+        await self.save(job, message="▶️ Starting VPS on the target node...")
+        await self.bot.docker.start(container)
+        # Deletions can only be replayed inside a running container
+        for start in range(0, len(deleted), 200):
+            await run_docker_cli("exec", container.id, "rm", "-rf", "--", *deleted[start:start + 200], node=target.name)
+        if not progress['was_running']:
+            await self.bot.docker.stop(container)
+        progress['downtime'] = time.time() - stopped_at
+
+    async def step_cleanup_source(self, job):
+        """Remove the source container, volume and snapshot once the VPS runs from the target"""
+        params, progress = job['params'], job['progress']
+        try:
+            source = await self.bot.docker.get(params['old_container_id'])
+            await self.bot.docker.remove(source, force=True)
+        except docker.errors.NotFound:
+            pass
+        for args in (("volume", "rm", "-f", f"unixnodes-{job['vps_id']}"), ("rmi", "-f", f"{progress['image']}-final")):
+            try:
+                await run_docker_cli(*args, node=params['source_node'])
+            except Exception as e:
+                logger.error(f"Migration {job['id']}: error cleaning up the source node: {e}")
+
+    async def rollback_migrate(self, job):
+        """Bring the VPS back up on its source node and drop what was copied to the target"""
+        params, progress = job['params'], job['progress']
+        _, vps = await self.bot.db.get_vps_by_id(job['vps_id'])
+        if not vps or vps['container_id'] != params['old_container_id']:
+            return
+        if progress.get('was_running'):
+            try:
+                await self.bot.docker.start(await self.bot.docker.get(params['old_container_id']))
+            except Exception as e:
+                logger.error(f"Migration {job['id']}: could not restart the source container: {e}")
+        for args, node in (
+            (("volume", "rm", "-f", f"unixnodes-{job['vps_id']}"), params['node']),
+            (("rmi", "-f", progress.get('image', '')), params['node']),
+            (("rmi", "-f", f"{progress.get('image', '')}-final"), params['source_node'])
+        ):
+            if progress.get('image'):
+                try:
+                    await run_docker_cli(*args, node=node)
+                except Exception:
+                    pass
+
+    async def step_snapshot_commit(self, job):
+        """Commit the container's filesystem; the image holds only what changed on top of the VPS image"""
+        params, progress = job['params'], job['progress']
+        progress['image'] = f"{SNAPSHOT_IMAGE_REPO}:{job['vps_id'].lower()}-{job['id']}"
+        await self.save(job, message="📸 Committing the filesystem...")
+        # docker commit pauses the container for the moment it takes to record the layer
+        await run_docker_cli("commit", params['container_id'], progress['image'], node=params['node'])
+        history = await run_docker_cli("image", "history", "--human=false", "--format", "{{.Size}}", progress['image'], node=params['node'])
+        progress['image_bytes'] = int(history.split()[0])
+
+    async def step_snapshot_volume(self, job):
+        params, progress = job['params'], job['progress']
+        await self.save(job, message="📸 Archiving the data volume...")
+        blob, read, stored, created = await save_volume_snapshot(job['vps_id'], params['node'])
+        progress.update(volume_blob=blob, volume_bytes=read, stored_bytes=stored, deduplicated=not created)
+
+    async def step_prune_snapshots(self, job):
+        """Drop the oldest snapshots past the VPS's retention limit"""
+        _, vps = await self.bot.db.get_vps_by_id(job['vps_id'])
+        keep = (vps or {}).get('snapshot_retention') or SNAPSHOT_RETENTION
+        expired = (await self.bot.db.get_snapshots(job['vps_id']))[keep:]
+        for snapshot in expired:
+            await self.drop_snapshot(snapshot)
+        job['progress']['pruned'] = len(expired)
+
+    async def drop_snapshot(self, snapshot):
+        """Remove a snapshot's row and image, and its volume tarball once no other snapshot shares it"""
+        try:
+            # A VPS restored from this snapshot still runs on the image; -f only removes the tag then
+            await run_docker_cli("rmi", "-f", snapshot['image'], node=snapshot['node'])
+        except Exception as e:
+            logger.error(f"Error removing snapshot image {snapshot['image']}: {e}")
+        if await self.bot.db.remove_snapshot(snapshot['id']):
+            # A snapshot still running may have produced the same tarball and not recorded it yet
+            in_flight = {job['progress'].get('volume_blob') for job in self.active.values() if job['kind'] == 'snapshot'}
+            if snapshot['volume_blob'] not in in_flight:
+                try:
+                    os.remove(snapshot_blob_path(snapshot['volume_blob']))
+                except FileNotFoundError:
+                    pass
+        logger.info(f"Removed snapshot {snapshot['id']} of VPS {snapshot['vps_id']}")
+
+    async def step_restore_volume(self, job):
+        """Stop the VPS and put the snapshot's tarball back into its data volume"""
+        params, progress = job['params'], job['progress']
+        _, vps = await self.bot.db.get_vps_by_id(job['vps_id'])
+        if vps and vps['status'] == 'suspended':
+            raise Exception("VPS is suspended")
+        progress.setdefault('started', time.time())
+        try:
+            old = await self.bot.docker.get(params['old_container_id'])
+            progress.setdefault('was_running', old.status == 'running')
+            await self.save(job, message="⏸️ Stopping VPS...")
+            await self.bot.docker.stop(old)
+        except docker.errors.NotFound:
+            progress.setdefault('was_running', False)
+        await self.save(job, message="⏪ Restoring the data volume...")
+        await load_volume_snapshot(job['vps_id'], params['snapshot']['node'], params['snapshot']['volume_blob'])
+
+    async def step_restore_container(self, job):
+        """Start a container straight from the snapshot image"""
+        params, progress = job['params'], job['progress']
+        snapshot = params['snapshot']
+        existing = await self.bot.docker.list(node=snapshot['node'], all=True, filters={'label': f"{self.LABEL}={job['id']}"})
+        if existing:
+            container = existing[0]
+        else:
+            await self.save(job, message="⏪ Starting the snapshot...")
+            container = await self.bot.docker.run(
+                snapshot['image'], node=snapshot['node'],
+                **container_options(job['vps_id'], params['memory'], params['cpu'], snapshot['use_custom_image'], {self.LABEL: job['id']})
+            )
+        progress['container_id'] = container.id
+        await wait_for_container_ready(container.id)
+        if snapshot['use_custom_image']:
+            # Custom images set their memory limit from inside, and a commit does not keep cgroup settings
+            await probe_container(container.id, f"echo {params['memory'] * 1024 * 1024 * 1024} > /sys/fs/cgroup/memory.max")
+        # Leave the VPS in the state it was in, so its recorded status stays true
+        if not progress['was_running']:
+            await self.bot.docker.stop(container)
+        progress['restored_in'] = time.time() - progress['started']
+
+    async def rollback_restore(self, job):
+        """Start the old container again; its data volume is only replaced once the archive unpacked in full"""
+        params, progress = job['params'], job['progress']
+        _, vps = await self.bot.db.get_vps_by_id(job['vps_id'])
+        if not vps or vps['container_id'] != params['old_container_id'] or not progress.get('was_running'):
+            return
+        try:
+            await self.bot.docker.start(await self.bot.docker.get(params['old_container_id']))
+        except Exception as e:
+            logger.error(f"Restore {job['id']}: could not restart the old container: {e}")
+
 # Initialize bot with command prefix '/'
 class UnixNodesBot(commands.Bot):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.db = Database(DB_FILE)
+        self.db = AsyncDatabase(Database(DB_FILE))
         self.session = None
-        self.docker_client = None
+        self.nodes = NodeRegistry(self)
+        self.docker = None
         self.system_stats = {
             'cpu_usage': 0,
             'memory_usage': 0,
@@ -379,40 +2276,216 @@ class UnixNodesBot(commands.Bot):
             'network_io': (0, 0),
             'last_updated': 0
         }
+        self.reconcile_stats = None
+        self.backup_stats = None
+        self.miner_stats = None
+        self.miner_matcher = MinerSignatureMatcher()
+        self.miner_cpu_samples = {}
+        self.warm_pool = WarmPool(self)
+        self.capacity = CapacityLedger(self)
+        self.jobs = ProvisioningJobs(self)
+        self.container_states = {}
         self.my_persistent_views = {}
 
     async def setup_hook(self):
         self.session = aiohttp.ClientSession()
+        self.loop.create_task(self.stats_flush_loop())
+        if HOT_BACKUP_INTERVAL > 0:
+            self.loop.create_task(self.hot_backup_loop())
         try:
-            self.docker_client = docker.from_env()
-            logger.info("Docker client initialized successfully")
+            await self.nodes.load()
+            if not self.nodes.online():
+                raise Exception("no Docker node is reachable")
+            self.docker = DockerCluster(self.nodes)
+            logger.info(f"Docker nodes initialized: {', '.join(node.name for node in self.nodes.online())}")
             self.loop.create_task(self.update_system_stats())
             self.loop.create_task(self.anti_miner_monitor())
             # Reconnect to existing containers
             await self.reconnect_containers()
+            # Track container state from each node's event stream from here on, and keep checking node health
+            for node in self.nodes.nodes.values():
+                self.nodes.watch(node)
+            self.loop.create_task(self.nodes.health_loop())
+            # Re-adopt idle pool containers and top the pool up in the background
+            await self.warm_pool.adopt_existing()
+            self.warm_pool.schedule_refill()
+            # Finish or roll back provisioning jobs the last run left behind
+            await self.jobs.resume()
             # Restore persistent views
             await self.restore_persistent_views()
         except Exception as e:
             logger.error(f"Failed to initialize Docker client: {e}")
-            self.docker_client = None
+            self.docker = None
 
     async def reconnect_containers(self):
-        """Reconnect to existing containers on startup"""
-        if not self.docker_client:
+        """Reconcile the vps_instances table against Docker in a single pass on startup"""
+        if not self.docker:
             return
-            
-        for token, vps in list(self.db.get_all_vps().items()):
-            if vps['status'] == 'running':
+
+        started_at = time.monotonic()
+        # One sparse listing per node instead of a containers.get round-trip per VPS
+        containers = {}
+        listed = set()
+        for node in self.nodes.online():
+            try:
+                containers.update((c.id, c) for c in await node.docker.list(all=True, sparse=True))
+                listed.add(node.name)
+            except Exception as e:
+                logger.error(f"Error listing containers on node {node.name} for reconciliation: {e}")
+        if not listed:
+            return
+
+        semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+
+        async def start_container(vps, container):
+            async with semaphore:
                 try:
-                    container = self.docker_client.containers.get(vps['container_id'])
-                    if container.status != 'running':
-                        container.start()
+                    await self.docker.start(container)
                     logger.info(f"Reconnected and started container for VPS {vps['vps_id']}")
-                except docker.errors.NotFound:
-                    logger.warning(f"Container {vps['container_id']} not found, removing from data")
-                    self.db.remove_vps(token)
+                    return True
                 except Exception as e:
                     logger.error(f"Error reconnecting container {vps['vps_id']}: {e}")
+                    return False
+
+        # An interrupted reinstall, edit or restore may have removed or stopped the container on purpose;
+        # jobs.resume() finishes or rolls those back, so they are not reconciled here
+        busy = {job['vps_id'] for job in await self.db.get_unfinished_jobs()}
+        pending = []
+        missing = 0
+        for token, vps in (await self.db.get_all_vps()).items():
+            # VPS on a node that could not be listed are left alone rather than taken for missing
+            if vps['status'] != 'running' or (vps.get('node') or PRIMARY_NODE) not in listed or vps['vps_id'] in busy:
+                continue
+            container = containers.get(vps['container_id'])
+            if container is None:
+                logger.warning(f"Container {vps['container_id']} not found, removing from data")
+                await self.db.remove_vps(token)
+                missing += 1
+            elif container.status != 'running':
+                pending.append(start_container(vps, container))
+
+        results = await asyncio.gather(*pending)
+        self.reconcile_stats = {
+            'duration': time.monotonic() - started_at,
+            'containers': len(containers),
+            'started': sum(results),
+            'failed': len(results) - sum(results),
+            'missing': missing
+        }
+        logger.info(
+            f"Startup reconciliation finished in {self.reconcile_stats['duration']:.2f}s: "
+            f"{self.reconcile_stats['started']} started, {self.reconcile_stats['failed']} failed, "
+            f"{missing} missing"
+        )
+
+    def container_status(self, container_id):
+        """Last known Docker status of a container from the event stream, or None if it does not exist"""
+        state = self.container_states.get(container_id)
+        return state['status'] if state else None
+
+    async def sync_container_states(self, node):
+        """Rebuild a node's container_states from one listing and fix VPS rows whose status drifted"""
+        containers = await node.docker.list(all=True, sparse=True)
+        now = time.time()
+        self.container_states = {
+            container_id: state for container_id, state in self.container_states.items() if state['node'] != node.name
+        }
+        self.container_states.update({
+            c.id: {'status': c.status, 'health': None, 'updated': now, 'stop_requested': False, 'node': node.name}
+            for c in containers
+        })
+        for token, vps in (await self.db.get_all_vps()).items():
+            if (vps.get('node') or PRIMARY_NODE) != node.name:
+                continue
+            status = self.container_status(vps['container_id'])
+            if status and vps['status'] in ('running', 'stopped'):
+                expected = 'running' if status == 'running' else 'stopped'
+                if vps['status'] != expected:
+                    await self.db.update_vps(token, {'status': expected})
+
+    async def docker_events_monitor(self, node):
+        """Follow a node's Docker event stream, reconnecting with backoff, so nothing has to poll container state"""
+        loop = asyncio.get_running_loop()
+        delay = 1
+        while not self.is_closed() and self.docker and self.nodes.nodes.get(node.name) is node:
+            if node.last_event:
+                # Replay what happened while disconnected, such as deaths and OOM kills, from just after the last event
+                after = node.last_event + 1
+                since = f"{after // 10 ** 9}.{after % 10 ** 9:09d}"
+            else:
+                since = int(time.time())
+            try:
+                if node.docker is None:
+                    raise Exception("node is not connected")
+                await self.sync_container_states(node)
+                await loop.run_in_executor(node.event_pump, self.pump_docker_events, node, loop, since)
+                delay = 1
+            except Exception as e:
+                if self.is_closed():
+                    return
+                logger.error(f"Docker event stream of node {node.name} interrupted: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    def pump_docker_events(self, node, loop, since):
+        """Read a node's container events on a worker thread and hand them to the event loop"""
+        node.events = node.client.events(
+            since=since,
+            decode=True,
+            filters={'type': 'container', 'event': ['start', 'kill', 'die', 'oom', 'destroy', 'health_status']}
+        )
+        try:
+            for event in node.events:
+                # Handlers start in arrival order and update container_states before their first await
+                asyncio.run_coroutine_threadsafe(self.handle_docker_event(node, event), loop)
+        finally:
+            node.events.close()
+            node.events = None
+
+    async def handle_docker_event(self, node, event):
+        """Apply one container event to container_states and the vps_instances table"""
+        container_id = event.get('id') or event.get('Actor', {}).get('ID')
+        action = event.get('Action') or event.get('status', '')
+        attributes = event.get('Actor', {}).get('Attributes', {})
+        timestamp = event.get('time', time.time())
+        node.last_event = event.get('timeNano') or int(timestamp * 10 ** 9)
+
+        if action == 'destroy':
+            self.container_states.pop(container_id, None)
+            self.nodes.located.pop(container_id, None)
+            return
+        state = self.container_states.setdefault(
+            container_id, {'status': 'created', 'health': None, 'updated': timestamp, 'stop_requested': False, 'node': node.name}
+        )
+        state['updated'] = timestamp
+
+        token, vps = await self.db.get_vps_by_container_id(container_id)
+        happened_at = str(datetime.datetime.fromtimestamp(timestamp))
+        if action == 'start':
+            state.update(status='running', stop_requested=False)
+            # Compare-and-set: a suspension committed since the lookup above must not be undone
+            if vps and vps['status'] == 'stopped':
+                await self.db.set_vps_status(token, 'running', 'stopped')
+        elif action == 'kill':
+            # docker stop/kill/restart send a kill first, so a die without one was not asked for
+            state['stop_requested'] = True
+        elif action == 'oom':
+            state['last_oom'] = timestamp
+            if vps:
+                logger.warning(f"VPS {vps['vps_id']} ran out of memory")
+                await self.db.record_vps_event(vps['vps_id'], container_id, 'oom', created_at=happened_at)
+        elif action == 'die':
+            exit_code = int(attributes.get('exitCode', 0))
+            unexpected = not state['stop_requested']
+            state.update(status='exited', exit_code=exit_code, stop_requested=False)
+            if vps:
+                if unexpected:
+                    logger.warning(f"VPS {vps['vps_id']} exited unexpectedly with code {exit_code}")
+                    await self.db.record_vps_event(vps['vps_id'], container_id, 'unexpected_exit', exit_code, happened_at)
+                if vps['status'] == 'running':
+                    await self.db.set_vps_status(token, 'stopped', 'running')
+        elif action.startswith('health_status'):
+            state['health'] = action.partition(':')[2].strip()
 
     async def restore_persistent_views(self):
         """Restore persistent views after restart"""
@@ -423,36 +2496,130 @@ class UnixNodesBot(commands.Bot):
         """Periodically check for mining activities"""
         await self.wait_until_ready()
         while not self.is_closed():
+            sweep_started = time.monotonic()
             try:
-                for token, vps in self.db.get_all_vps().items():
-                    if vps['status'] != 'running':
-                        continue
-                    try:
-                        container = self.docker_client.containers.get(vps['container_id'])
-                        if container.status != 'running':
-                            continue
-                        
-                        # Check processes
-                        exec_result = container.exec_run("ps aux")
-                        output = exec_result.output.decode().lower()
-                        
-                        for pattern in MINER_PATTERNS:
-                            if pattern in output:
-                                logger.warning(f"Mining detected in VPS {vps['vps_id']}, suspending...")
-                                container.stop()
-                                self.db.update_vps(token, {'status': 'suspended'})
-                                # Notify owner
-                                try:
-                                    owner = await self.fetch_user(int(vps['created_by']))
-                                    await owner.send(f"⚠️ Your VPS {vps['vps_id']} has been suspended due to detected mining activity. Contact admin to unsuspend.")
-                                except:
-                                    pass
-                                break
-                    except Exception as e:
-                        logger.error(f"Error checking VPS {vps['vps_id']} for mining: {e}")
+                if self.docker:
+                    await self.scan_for_miners()
             except Exception as e:
                 logger.error(f"Error in anti_miner_monitor: {e}")
-            await asyncio.sleep(300)  # Check every 5 minutes
+            await asyncio.sleep(max(0, MINER_SCAN_INTERVAL - (time.monotonic() - sweep_started)))
+
+    async def scan_for_miners(self):
+        """Scan all running VPS containers concurrently and record sweep metrics"""
+        sweep_started = time.monotonic()
+        running = {token: vps for token, vps in (await self.db.get_all_vps()).items() if vps['status'] == 'running'}
+        semaphore = asyncio.Semaphore(MINER_SCAN_CONCURRENCY)
+        latencies = []
+        flagged = []
+
+        async def scan(token, vps):
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    if await self.scan_container(token, vps):
+                        flagged.append(vps['vps_id'])
+                except docker.errors.APIError as e:
+                    # 404/409: container is gone or not running, nothing to scan
+                    if e.status_code not in (404, 409):
+                        logger.error(f"Error checking VPS {vps['vps_id']} for mining: {e}")
+                except Exception as e:
+                    logger.error(f"Error checking VPS {vps['vps_id']} for mining: {e}")
+                finally:
+                    latencies.append(time.monotonic() - started)
+
+        await asyncio.gather(*(scan(token, vps) for token, vps in running.items()))
+
+        # Forget CPU samples of VPS that are no longer running
+        for token in list(self.miner_cpu_samples):
+            if token not in running:
+                del self.miner_cpu_samples[token]
+
+        self.miner_stats = {
+            'sweep_duration': time.monotonic() - sweep_started,
+            'containers_scanned': len(latencies),
+            'avg_scan_latency': sum(latencies) / len(latencies) if latencies else 0,
+            'max_scan_latency': max(latencies, default=0),
+            'cpu_flagged': flagged,
+            'last_sweep': time.time()
+        }
+        logger.info(
+            f"Anti-miner sweep scanned {len(latencies)} containers in {self.miner_stats['sweep_duration']:.2f}s "
+            f"(avg {self.miner_stats['avg_scan_latency'] * 1000:.0f}ms, max {self.miner_stats['max_scan_latency'] * 1000:.0f}ms)"
+        )
+
+    async def scan_container(self, token, vps):
+        """Check one container from the host; returns True if it is flagged for sustained high CPU"""
+        node = self.nodes.node_for(vps['container_id'])
+        commands, cpu_usage, remote_ports = await node.docker.call(
+            sample_container_processes, node.client.api, vps['container_id'], local=not node.url
+        )
+
+        is_miner, score, reasons = self.miner_matcher.is_miner(commands, remote_ports)
+        if is_miner:
+            logger.warning(f"Miner signatures in VPS {vps['vps_id']} scored {score}: {', '.join(reasons)}")
+            await self.suspend_for_mining(token, vps)
+            return False
+
+        if cpu_usage is None:
+            return False
+
+        now = time.monotonic()
+        streak = 0
+        previous = self.miner_cpu_samples.get(token)
+        if previous:
+            previous_usage, previous_time, previous_streak = previous
+            elapsed_usec = (now - previous_time) * 1_000_000
+            if elapsed_usec > 0 and cpu_usage >= previous_usage:
+                cores_used = (cpu_usage - previous_usage) / elapsed_usec
+                if cores_used >= MINER_CPU_THRESHOLD * max(vps['cpu'] or 1, 1):
+                    streak = previous_streak + 1
+        self.miner_cpu_samples[token] = (cpu_usage, now, streak)
+
+        if streak >= MINER_CPU_SUSTAINED_SWEEPS:
+            logger.warning(f"Sustained high CPU usage in VPS {vps['vps_id']} for {streak} sweeps, possible renamed miner")
+            return True
+        return False
+
+    async def suspend_for_mining(self, token, vps):
+        """Stop a VPS caught mining and notify its owner"""
+        logger.warning(f"Mining detected in VPS {vps['vps_id']}, suspending...")
+        container = await self.docker.get(vps['container_id'])
+        await self.docker.stop(container)
+        await self.db.update_vps(token, {'status': 'suspended'})
+        self.miner_cpu_samples.pop(token, None)
+        # Notify owner
+        try:
+            owner = await self.fetch_user(int(vps['created_by']))
+            await owner.send(f"⚠️ Your VPS {vps['vps_id']} has been suspended due to detected mining activity. Contact admin to unsuspend.")
+        except:
+            pass
+
+    async def stats_flush_loop(self):
+        """Write buffered usage counters to the database in one batch per interval"""
+        while not self.is_closed():
+            await asyncio.sleep(STATS_FLUSH_INTERVAL)
+            try:
+                await self.db.flush_stats()
+            except Exception as e:
+                logger.error(f"Error flushing usage counters: {e}")
+
+    async def hot_backup_loop(self):
+        """Take a verified online backup of the database every HOT_BACKUP_INTERVAL seconds"""
+        while not self.is_closed():
+            await asyncio.sleep(HOT_BACKUP_INTERVAL)
+            started = time.monotonic()
+            try:
+                path, integrity = await self.db.hot_backup()
+                self.backup_stats = {
+                    'duration': time.monotonic() - started,
+                    'size': os.path.getsize(path),
+                    'path': path,
+                    'integrity': integrity,
+                    'last_backup': time.time()
+                }
+                logger.info(f"Hot backup {path} took {self.backup_stats['duration']:.2f}s ({self.backup_stats['size'] / 1024 ** 2:.1f}MB)")
+            except Exception as e:
+                logger.error(f"Error taking hot backup: {e}")
 
     async def update_system_stats(self):
         """Update system statistics periodically"""
@@ -473,6 +2640,7 @@ class UnixNodesBot(commands.Bot):
                 
                 self.system_stats = {
                     'cpu_usage': cpu_percent,
+                    'cpu_count': psutil.cpu_count(logical=True) or 1,
                     'memory_usage': mem.percent,
                     'memory_used': mem.used / (1024 ** 3),  # GB
                     'memory_total': mem.total / (1024 ** 3),  # GB
@@ -491,8 +2659,8 @@ class UnixNodesBot(commands.Bot):
         await super().close()
         if self.session:
             await self.session.close()
-        if self.docker_client:
-            self.docker_client.close()
+        if self.docker:
+            self.docker.close()
         self.db.close()
 
 def generate_token():
@@ -503,6 +2671,241 @@ def generate_vps_id():
     """Generate a unique VPS ID"""
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
 
+def generate_job_id():
+    """Generate a provisioning job ID"""
+    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+
+def container_options(vps_id, memory, cpu, use_custom_image, labels=None):
+    """docker run options for a VPS container; custom images boot systemd and get limits from setup_container"""
+    options = dict(
+        detach=True,
+        privileged=True,
+        hostname=f"unixnodes-{vps_id}",
+        cap_add=["ALL"],
+        network=DOCKER_NETWORK,
+        volumes={
+            f'unixnodes-{vps_id}': {'bind': '/data', 'mode': 'rw'}
+        },
+        restart_policy={"Name": "always"},
+        labels=labels or {}
+    )
+    if not use_custom_image:
+        options.update(
+            mem_limit=memory * 1024 * 1024 * 1024,
+            cpu_period=100000,
+            cpu_quota=int(cpu * 100000),
+            command="tail -f /dev/null",
+            tty=True
+        )
+    return options
+
+def format_capacity(snapshot):
+    """One line per resource: allocated/limit, the overcommit ratio of the physical size and the free headroom"""
+    lines = []
+    for resource in CapacityLedger.RESOURCES:
+        unit = CapacityLedger.UNITS[resource]
+        allocated, physical = snapshot['allocated'][resource], snapshot['physical'][resource]
+        if physical is None:
+            lines.append(f"{resource.capitalize()}: {allocated:g}{unit} (size not set)")
+        else:
+            lines.append(
+                f"{resource.capitalize()}: {allocated:g}/{snapshot['limit'][resource]:.0f}{unit} "
+                f"({snapshot['ratios'][resource]:g}x of {physical:.0f}), {snapshot['free'][resource]:.0f} free"
+            )
+    return "\n".join(lines)
+
+def format_transfer(phase, transfer):
+    read, sent, seconds = transfer['read'], transfer['sent'], max(transfer['seconds'], 0.001)
+    text = f"{read / 1024 ** 2:.1f}MB at {read / seconds / 1024 ** 2:.1f}MB/s"
+    if sent and sent != read:
+        text += f", {sent / 1024 ** 2:.1f}MB on the wire"
+    return f"{phase} {text}" if phase else text
+
+def image_config_changes(config):
+    """docker import --change options that keep a container's command, entrypoint and environment"""
+    changes = []
+    if config.get('Entrypoint'):
+        changes.append(f"ENTRYPOINT {json.dumps(config['Entrypoint'])}")
+    if config.get('Cmd'):
+        changes.append(f"CMD {json.dumps(config['Cmd'])}")
+    for variable in config.get('Env') or []:
+        key, _, value = variable.partition('=')
+        changes.append(f"ENV {key}={json.dumps(value)}")
+    if config.get('WorkingDir'):
+        changes.append(f"WORKDIR {config['WorkingDir']}")
+    if config.get('StopSignal'):
+        changes.append(f"STOPSIGNAL {config['StopSignal']}")
+    return [arg for change in changes for arg in ("--change", change)]
+
+def volume_helper_args(vps_id, script, read_only=False, stdin=False):
+    """docker run arguments for a throwaway container that runs script against a VPS data volume"""
+    mount = f"unixnodes-{vps_id}:/data" + (":ro" if read_only else "")
+    return ("run", "--rm", *(("-i",) if stdin else ()), "-v", mount, MIGRATION_HELPER_IMAGE, "sh", "-c", script)
+
+async def run_docker_cli(*args, node=None):
+    """Run a docker CLI command to completion and return its output, raising on failure"""
+    process = await docker_cli(*args, node=node, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise Exception(f"docker {args[0]} failed: {stderr.decode().strip()[-500:]}")
+    return stdout.decode()
+
+async def stream_docker_cli(source_args, target_args, source_node, target_node, compress=False, on_progress=None):
+    """Pipe a docker command's output on one node into a docker command on another; returns (bytes read, bytes sent, seconds).
+
+    Nothing touches local disk. With compress the stream is gzipped on the way, which docker import,
+    docker cp and tar -z all read.
+    """
+    started = time.monotonic()
+    source = await docker_cli(*source_args, node=source_node, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    target = await docker_cli(
+        *target_args, node=target_node,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    # wbits 31 selects the gzip container rather than raw zlib
+    compressor = zlib.compressobj(MIGRATION_COMPRESS_LEVEL, zlib.DEFLATED, 31) if compress else None
+    read = sent = 0
+    target_gone = False
+    try:
+        while True:
+            chunk = await source.stdout.read(MIGRATION_CHUNK_BYTES)
+            if not chunk:
+                break
+            read += len(chunk)
+            data = await asyncio.to_thread(compressor.compress, chunk) if compressor else chunk
+            target.stdin.write(data)
+            await target.stdin.drain()
+            sent += len(data)
+            if on_progress:
+                await on_progress(read, sent, time.monotonic() - started)
+        if compressor:
+            data = compressor.flush()
+            target.stdin.write(data)
+            sent += len(data)
+        await target.stdin.drain()
+        target.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # The target exited early; its own error says more than the broken pipe
+        target_gone = True
+        source.kill()
+    except BaseException:
+        for process in (source, target):
+            if process.returncode is None:
+                process.kill()
+        raise
+    source_error = await source.stderr.read()
+    await source.wait()
+    _, target_error = await target.communicate()
+    results = [(source_args, source.returncode, source_error), (target_args, target.returncode, target_error)]
+    if target_gone:
+        # Report the target first: the source only died because we killed it
+        results.reverse()
+    for args, returncode, error in results:
+        if returncode != 0 or (target_gone and args is target_args):
+            raise Exception(f"docker {args[0]} failed: {error.decode().strip()[-500:] or 'stream closed early'}")
+    return read, sent, time.monotonic() - started
+
+def snapshot_blob_path(blob):
+    return os.path.join(SNAPSHOT_DIR, f"{blob}.tar.gz")
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+async def save_volume_snapshot(vps_id, node):
+    """Archive a VPS data volume into SNAPSHOT_DIR; returns (blob, bytes archived, bytes stored, whether the blob is new).
+
+    The tarball is named by the SHA-256 of the uncompressed tar. tar walks an unchanged volume in the
+    same order with the same headers, so a volume that did not change between snapshots is kept once.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    temp_path = os.path.join(SNAPSHOT_DIR, f".{vps_id}-{generate_job_id()}.tmp")
+    process = await docker_cli(
+        *volume_helper_args(vps_id, "tar -C /data -cf - .", read_only=True), node=node,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    digest = hashlib.sha256()
+    compressor = zlib.compressobj(SNAPSHOT_COMPRESS_LEVEL, zlib.DEFLATED, 31)
+    read = 0
+    try:
+        with open(temp_path, 'wb') as archive:
+            def store(chunk):
+                digest.update(chunk)
+                archive.write(compressor.compress(chunk))
+            while True:
+                chunk = await process.stdout.read(MIGRATION_CHUNK_BYTES)
+                if not chunk:
+                    break
+                read += len(chunk)
+                await asyncio.to_thread(store, chunk)
+            archive.write(compressor.flush())
+        stderr = await process.stderr.read()
+        await process.wait()
+        if process.returncode != 0:
+            raise Exception(f"Archiving volume failed: {stderr.decode().strip()[-500:]}")
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    blob = digest.hexdigest()
+    path = snapshot_blob_path(blob)
+    created = not os.path.exists(path)
+    if created:
+        os.replace(temp_path, path)
+    else:
+        os.remove(temp_path)
+    return blob, read, os.path.getsize(path), created
+
+SNAPSHOT_RESTORE_SCRIPT = (
+    # Unpack next to the live data first; a bad or truncated archive leaves the volume as it was
+    "S=/data/.unixnodes-restore; rm -rf $S && mkdir $S && { tar -C $S -xzf - || { rm -rf $S; exit 1; }; }"
+    # Only then swap the contents. Rerunning after a crash mid-swap unpacks and swaps again.
+    " && find /data -mindepth 1 -maxdepth 1 ! -name .unixnodes-restore -exec rm -rf {} \\;"
+    " && find $S -mindepth 1 -maxdepth 1 -exec mv {} /data/ \\; && rmdir $S"
+)
+
+async def load_volume_snapshot(vps_id, node, blob):
+    """Replace everything in a VPS data volume with the contents of a snapshot tarball, once it has unpacked in full"""
+    path = snapshot_blob_path(blob)
+    if not os.path.exists(path):
+        raise Exception(f"Volume archive {blob[:12]} is missing from {SNAPSHOT_DIR}")
+    process = await docker_cli(
+        *volume_helper_args(vps_id, SNAPSHOT_RESTORE_SCRIPT, stdin=True), node=node,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        with open(path, 'rb') as archive:
+            while True:
+                chunk = await asyncio.to_thread(archive.read, MIGRATION_CHUNK_BYTES)
+                if not chunk:
+                    break
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        process.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # The helper exited early; its stderr below says why
+        pass
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        raise
+    stderr = await process.stderr.read()
+    await process.wait()
+    if process.returncode != 0:
+        raise Exception(f"Restoring volume failed: {stderr.decode().strip()[-500:] or 'archive not fully read'}")
+
+async def docker_cli(*args, node=None, **kwargs):
+    """Start the docker CLI against a node; exec commands go to the node running their container"""
+    if node is None and args[0] == 'exec':
+        target = bot.nodes.node_for(next(arg for arg in args[1:] if not arg.startswith('-')))
+    else:
+        target = bot.docker.node(node)
+    return await asyncio.create_subprocess_exec("docker", *args, env=target.cli_env(), **kwargs)
+
 def generate_ssh_password():
     """Generate a random SSH password"""
     chars = string.ascii_letters + string.digits + "!@#$%^&*"
@@ -537,11 +2940,79 @@ async def capture_ssh_session_line(process):
         logger.error(f"Error capturing SSH session: {e}")
         return None
 
+def read_cgroup_cpu_usage(pid):
+    """Read the cumulative CPU time (microseconds) of the cgroup that owns a host PID"""
+    try:
+        with open(f'/proc/{pid}/cgroup') as f:
+            entries = f.read().splitlines()
+    except OSError:
+        return None
+
+    for entry in entries:
+        hierarchy, controllers, path = entry.split(':', 2)
+        if hierarchy == '0' and not controllers:
+            # cgroup v2 unified hierarchy
+            try:
+                with open(f'/sys/fs/cgroup{path}/cpu.stat') as f:
+                    for line in f:
+                        key, value = line.split()
+                        if key == 'usage_usec':
+                            return int(value)
+            except OSError:
+                continue
+        elif 'cpuacct' in controllers.split(','):
+            # cgroup v1 reports nanoseconds
+            for mount in ('cpu,cpuacct', 'cpuacct,cpu', 'cpuacct'):
+                try:
+                    with open(f'/sys/fs/cgroup/{mount}{path}/cpuacct.usage') as f:
+                        return int(f.read()) // 1000
+                except OSError:
+                    continue
+    return None
+
+def read_remote_ports(pid):
+    """Remote ports of established TCP connections in the network namespace of a host PID"""
+    ports = set()
+    for table in ('tcp', 'tcp6'):
+        try:
+            with open(f'/proc/{pid}/net/{table}') as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3] == '01':  # ESTABLISHED
+                        ports.add(int(fields[2].rsplit(':', 1)[1], 16))
+        except (OSError, ValueError):
+            continue
+    return ports
+
+def sample_container_processes(api, container_id, local=True):
+    """Collect a container's process commands via `docker top` plus its cgroup CPU counter
+    and outbound ports, without exec'ing into it.
+
+    `docker top` PIDs are only meaningful in this host's /proc for the local node; containers on
+    remote nodes get their CPU counter from the stats API and no port sample.
+    """
+    top = api.top(container_id)
+    titles = top.get('Titles') or []
+    processes = top.get('Processes') or []
+    pid_index = titles.index('PID') if 'PID' in titles else 1
+    cmd_index = titles.index('CMD') if 'CMD' in titles else len(titles) - 1
+
+    commands = [process[cmd_index] for process in processes]
+    if not local:
+        usage = api.stats(container_id, stream=False).get('cpu_stats', {}).get('cpu_usage', {}).get('total_usage')
+        # The stats API reports nanoseconds, the cgroup counters are compared in microseconds
+        return commands, usage // 1000 if usage is not None else None, set()
+    if not processes:
+        return commands, None, set()
+    init_pid = processes[0][pid_index]
+    return commands, read_cgroup_cpu_usage(init_pid), read_remote_ports(init_pid)
+
 async def run_docker_command(container_id, command, timeout=120):
     """Run a Docker command asynchronously with timeout"""
     try:
-        process = await asyncio.create_subprocess_exec(
-            "docker", "exec", container_id, *command,
+        process = await docker_cli(
+            "exec", container_id, *command,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
@@ -557,13 +3028,65 @@ async def run_docker_command(container_id, command, timeout=120):
         logger.error(f"Error running Docker command: {e}")
         return False, str(e)
 
+# Readiness probes, each a shell check that exits 0 once the container has reached that state
+SYSTEMD_READY_PROBE = (
+    '[ "$(cat /proc/1/comm)" != systemd ] || '
+    '{ state=$(systemctl is-system-running 2>/dev/null); [ "$state" = running ] || [ "$state" = degraded ]; }'
+)
+SSHD_READY_PROBE = "grep -qE '^ *[0-9]+: [0-9A-F]+:0016 [0-9A-F]+:[0-9A-F]+ 0A ' /proc/net/tcp /proc/net/tcp6 2>/dev/null"
+APT_IDLE_PROBE = "! grep -qxE 'apt|apt-get|dpkg' /proc/[0-9]*/comm 2>/dev/null"
+
+async def probe_container(container_id, script):
+    """Run a shell check inside a container, True when it exits 0"""
+    process = await docker_cli(
+        "exec", container_id, "sh", "-c", script,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    return await process.wait() == 0
+
+async def wait_until(probe, description, timeout=READY_TIMEOUT, initial_delay=0.2, max_delay=3.0):
+    """Await probe() with exponential backoff until it is truthy, raising TimeoutError at the deadline"""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        try:
+            if await probe():
+                return
+        except docker.errors.NotFound:
+            raise
+        except Exception as e:
+            logger.debug(f"Probe for {description} failed: {e}")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Timed out after {timeout}s waiting for {description}")
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+async def wait_for_container_ready(container_id, sshd=False, timeout=READY_TIMEOUT):
+    """Wait until a container runs, its systemd (if PID 1) has booted and, optionally, sshd listens"""
+    deadline = time.monotonic() + timeout
+
+    async def running():
+        container = await bot.docker.get(container_id)
+        return container.status == "running"
+
+    await wait_until(running, f"container {container_id[:12]} to start", timeout)
+    await wait_until(lambda: probe_container(container_id, SYSTEMD_READY_PROBE),
+                     f"systemd in {container_id[:12]} to boot", max(0, deadline - time.monotonic()))
+    if sshd:
+        await wait_until(lambda: probe_container(container_id, SSHD_READY_PROBE),
+                         f"sshd in {container_id[:12]} to listen", max(0, deadline - time.monotonic()))
+
 async def kill_apt_processes(container_id):
     """Kill any running apt processes"""
     try:
         success, _ = await run_docker_command(container_id, ["bash", "-c", "killall apt apt-get dpkg || true"])
-        await asyncio.sleep(2)
+        try:
+            await wait_until(lambda: probe_container(container_id, APT_IDLE_PROBE), "apt processes to exit", timeout=10)
+        except TimeoutError as e:
+            logger.warning(f"{container_id[:12]}: {e}")
         success, _ = await run_docker_command(container_id, ["bash", "-c", "rm -f /var/lib/apt/lists/lock /var/cache/apt/archives/lock /var/lib/dpkg/lock*"])
-        await asyncio.sleep(2)
         return success
     except Exception as e:
         logger.error(f"Error killing apt processes: {e}")
@@ -576,8 +3099,8 @@ async def wait_for_apt_lock(container_id, status_msg):
         try:
             await kill_apt_processes(container_id)
             
-            process = await asyncio.create_subprocess_exec(
-                "docker", "exec", container_id, "bash", "-c", "lsof /var/lib/dpkg/lock-frontend",
+            process = await docker_cli(
+                "exec", container_id, "bash", "-c", "lsof /var/lib/dpkg/lock-frontend",
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
@@ -597,33 +3120,52 @@ async def wait_for_apt_lock(container_id, status_msg):
     
     return False
 
-async def build_custom_image(vps_id, username, root_password, user_password, base_image=DEFAULT_OS_IMAGE):
-    """Build a custom Docker image using our template"""
+# One lock per base image tag so concurrent /create_vps calls build it only once
+base_image_locks = {}
+
+async def build_custom_image(base_image=DEFAULT_OS_IMAGE, node=None):
+    """Return the shared UnixNodes image for a base image on a node, building it only if it is not cached there yet"""
+    # Generate Dockerfile content; the tag is derived from it so template changes produce a new image
+    dockerfile_content = DOCKERFILE_TEMPLATE.format(
+        base_image=base_image,
+        welcome_message=WELCOME_MESSAGE,
+        watermark=WATERMARK
+    )
+    digest = hashlib.sha256(dockerfile_content.encode()).hexdigest()[:16]
+    image_tag = f"{BASE_IMAGE_REPO}:{digest}"
+
+    target = bot.docker.node(node)
+    lock = base_image_locks.setdefault((target.name, image_tag), asyncio.Lock())
+    async with lock:
+        try:
+            await target.docker.call(target.client.images.get, image_tag)
+            return image_tag
+        except docker.errors.ImageNotFound:
+            logger.info(f"Building base image {image_tag} for {base_image}")
+
+        temp_dir = f"temp_dockerfiles/base-{target.name}-{digest}"
+        try:
+            await bot.docker.call(write_dockerfile, temp_dir, dockerfile_content)
+            return await run_image_build(image_tag, temp_dir, node=target.name)
+        finally:
+            # Clean up temporary directory
+            try:
+                if os.path.exists(temp_dir):
+                    shutil.rmtree(temp_dir)
+            except Exception as e:
+                logger.error(f"Error cleaning up temp directory: {e}")
+
+def write_dockerfile(temp_dir, dockerfile_content):
+    """Write a Dockerfile into a fresh build context directory"""
+    os.makedirs(temp_dir, exist_ok=True)
+    with open(os.path.join(temp_dir, "Dockerfile"), 'w') as f:
+        f.write(dockerfile_content)
+
+async def run_image_build(image_tag, temp_dir, node=None):
+    """Build a Docker image from a directory using the docker CLI"""
     try:
-        # Create a temporary directory for the Dockerfile
-        temp_dir = f"temp_dockerfiles/{vps_id}"
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Generate Dockerfile content
-        dockerfile_content = DOCKERFILE_TEMPLATE.format(
-            base_image=base_image,
-            root_password=root_password,
-            username=username,
-            user_password=user_password,
-            welcome_message=WELCOME_MESSAGE,
-            watermark=WATERMARK,
-            vps_id=vps_id
-        )
-        
-        # Write Dockerfile
-        dockerfile_path = os.path.join(temp_dir, "Dockerfile")
-        with open(dockerfile_path, 'w') as f:
-            f.write(dockerfile_content)
-        
-        # Build the image
-        image_tag = f"unixnodes/{vps_id.lower()}:latest"
-        build_process = await asyncio.create_subprocess_exec(
-            "docker", "build", "-t", image_tag, temp_dir,
+        build_process = await docker_cli(
+            "build", "-t", image_tag, temp_dir, node=node,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
@@ -637,15 +3179,82 @@ async def build_custom_image(vps_id, username, root_password, user_password, bas
     except Exception as e:
         logger.error(f"Error building custom image: {e}")
         raise
-    finally:
-        # Clean up temporary directory
-        try:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-        except Exception as e:
-            logger.error(f"Error cleaning up temp directory: {e}")
 
-async def setup_container(container_id, status_msg, memory, username, vps_id=None, use_custom_image=False):
+# Runs each step in its own shell and prints one JSON object per step; output is base64 so it is always valid JSON.
+# The first failing required step stops the script, every step is safe to re-run.
+# Steps run in a subshell of the script itself: no command line carries a password, and with stdin
+# from /dev/null a step that reads input cannot swallow the rest of the script
+SETUP_SCRIPT_PRELUDE = r"""
+run_step() {
+    out=$( (eval "$3") </dev/null 2>&1 ); rc=$?
+    printf '{"step": "%s", "rc": %d, "output": "%s"}\n' "$1" "$rc" "$(printf '%s' "$out" | tail -c 1000 | base64 | tr -d '\n')"
+    if [ "$rc" -ne 0 ] && [ "$2" = required ]; then exit 1; fi
+}
+"""
+
+def build_setup_steps(username, ssh_password, vps_id, memory, use_custom_image=False, root_password=None):
+    """Personalisation steps as (name, shell command, required)"""
+    user = shlex.quote(username)
+    home = f"/home/{user}"
+    bashrc_line = shlex.quote(f'echo "{WELCOME_MESSAGE}"')
+    # The shared custom image carries no per-VPS identity
+    steps = [
+        ('create_user', f"id -u {user} >/dev/null 2>&1 || useradd -m -s /bin/bash {user}", True),
+        ('user_password', f"echo {shlex.quote(f'{username}:{ssh_password}')} | chpasswd", True),
+        ('sudo_group', f"usermod -aG sudo {user}", True),
+    ]
+    if root_password:
+        steps.append(('root_password', f"echo {shlex.quote(f'root:{root_password}')} | chpasswd", True))
+    if not use_custom_image:
+        steps += [
+            ('sshd_config', "sed -i -e 's/#PermitRootLogin prohibit-password/PermitRootLogin no/' -e 's/#PasswordAuthentication yes/PasswordAuthentication yes/' /etc/ssh/sshd_config", True),
+            ('ssh_restart', "service ssh restart", True),
+        ]
+    steps += [
+        ('welcome_message', f"echo {shlex.quote(WELCOME_MESSAGE)} > /etc/motd && (grep -qxF {bashrc_line} {home}/.bashrc || echo {bashrc_line} >> {home}/.bashrc)", False),
+        ('hostname', f"echo unixnodes-{vps_id} > /etc/hostname && hostname unixnodes-{vps_id}", True),
+        ('memory_limit', f"echo {memory * 1024 * 1024 * 1024} > /sys/fs/cgroup/memory.max", False),
+        ('machine_info', f"echo {shlex.quote(WATERMARK)} > /etc/machine-info", False),
+        ('ufw_allow_ssh', "ufw allow ssh", False),
+        ('ufw_enable', "ufw --force enable", False),
+        ('apt_autoremove', "apt-get -y autoremove", False),
+        ('apt_clean', "apt-get clean", False),
+        ('home_owner', f"chown -R {user}:{user} {home}", False),
+        ('home_mode', f"chmod 700 {home}", False),
+    ]
+    return steps
+
+async def run_setup_script(container_id, steps, timeout=300):
+    """Run setup steps as one script over a single docker exec and return the per-step results"""
+    script = SETUP_SCRIPT_PRELUDE + "".join(
+        f"run_step {name} {'required' if required else 'optional'} {shlex.quote(cmd)}\n"
+        for name, cmd, required in steps
+    )
+    # The script goes in over stdin so passwords never show up in a process list
+    process = await docker_cli(
+        "exec", "-i", container_id, "bash", "-s",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(script.encode()), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        raise Exception(f"Setup script timed out after {timeout} seconds")
+
+    results = []
+    for line in stdout.decode(errors='replace').splitlines():
+        if line.startswith('{"step"'):
+            result = json.loads(line)
+            result['output'] = base64.b64decode(result['output']).decode(errors='replace').strip()
+            results.append(result)
+    ran = {result['step'] for result in results}
+    not_run = stderr.decode(errors='replace').strip() or "not run"
+    results += [{'step': name, 'rc': None, 'output': not_run} for name, _, _ in steps if name not in ran]
+    return results
+
+async def setup_container(container_id, status_msg, memory, username, vps_id=None, use_custom_image=False, root_password=None):
     """Enhanced container setup with UnixNodes customization"""
     try:
         # Ensure container is running
@@ -654,14 +3263,14 @@ async def setup_container(container_id, status_msg, memory, username, vps_id=Non
         else:
             await status_msg.edit(content="🔍 Checking container status...")
             
-        container = bot.docker_client.containers.get(container_id)
+        container = await bot.docker.get(container_id)
         if container.status != "running":
             if isinstance(status_msg, discord.Interaction):
                 await status_msg.followup.send("🚀 Starting container...", ephemeral=True)
             else:
                 await status_msg.edit(content="🚀 Starting container...")
-            container.start()
-            await asyncio.sleep(5)
+            await bot.docker.start(container)
+        await wait_for_container_ready(container_id)
 
         # Generate SSH password
         ssh_password = generate_ssh_password()
@@ -687,78 +3296,31 @@ async def setup_container(container_id, status_msg, memory, username, vps_id=Non
             if not success:
                 raise Exception(f"Failed to install packages: {output}")
 
-        # Setup SSH
-        if isinstance(status_msg, discord.Interaction):
-            await status_msg.followup.send("🔐 Configuring SSH access...", ephemeral=True)
-        else:
-            await status_msg.edit(content="🔐 Configuring SSH access...")
-            
-        # Create user and set password (if not using custom image)
-        if not use_custom_image:
-            user_setup_commands = [
-                f"useradd -m -s /bin/bash {username}",
-                f"echo '{username}:{ssh_password}' | chpasswd",
-                f"usermod -aG sudo {username}",
-                "sed -i 's/#PermitRootLogin prohibit-password/PermitRootLogin no/' /etc/ssh/sshd_config",
-                "sed -i 's/#PasswordAuthentication yes/PasswordAuthentication yes/' /etc/ssh/sshd_config",
-                "service ssh restart"
-            ]
-            
-            for cmd in user_setup_commands:
-                success, output = await run_docker_command(container_id, ["bash", "-c", cmd])
-                if not success:
-                    raise Exception(f"Failed to setup user: {output}")
-
-        # Set UnixNodes customization
+        # Personalise the container in a single exec
         if isinstance(status_msg, discord.Interaction):
-            await status_msg.followup.send("🎨 Setting up IdkNodes customization...", ephemeral=True)
+            await status_msg.followup.send("🔐 Configuring SSH access and IdkNodes customization...", ephemeral=True)
         else:
-            await status_msg.edit(content="🎨 Setting up IdkNodes customization...")
-            
-        # Create welcome message file
-        welcome_cmd = f"echo '{WELCOME_MESSAGE}' > /etc/motd && echo 'echo \"{WELCOME_MESSAGE}\"' >> /home/{username}/.bashrc"
-        success, output = await run_docker_command(container_id, ["bash", "-c", welcome_cmd])
-        if not success:
-            logger.warning(f"Could not set welcome message: {output}")
+            await status_msg.edit(content="🔐 Configuring SSH access and IdkNodes customization...")
 
-        # Set hostname and watermark
         if not vps_id:
             vps_id = generate_vps_id()
-        hostname_cmd = f"echo 'unixnodes-{vps_id}' > /etc/hostname && hostname unixnodes-{vps_id}"
-        success, output = await run_docker_command(container_id, ["bash", "-c", hostname_cmd])
-        if not success:
-            raise Exception(f"Failed to set hostname: {output}")
+        steps = build_setup_steps(username, ssh_password, vps_id, memory, use_custom_image, root_password)
+        results = await run_setup_script(container_id, steps)
+        logger.info(f"Setup results for {container_id[:12]}: {json.dumps(results)}")
 
-        # Set memory limit in cgroup
-        if isinstance(status_msg, discord.Interaction):
-            await status_msg.followup.send("⚙️ Setting resource limits...", ephemeral=True)
-        else:
-            await status_msg.edit(content="⚙️ Setting resource limits...")
-            
-        memory_bytes = memory * 1024 * 1024 * 1024
-        success, output = await run_docker_command(container_id, ["bash", "-c", f"echo {memory_bytes} > /sys/fs/cgroup/memory.max"])
-        if not success:
-            logger.warning(f"Could not set memory limit in cgroup: {output}")
-
-        # Set watermark in machine info
-        success, output = await run_docker_command(container_id, ["bash", "-c", f"echo '{WATERMARK}' > /etc/machine-info"])
-        if not success:
-            logger.warning(f"Could not set machine info: {output}")
-
-        # Basic security setup
-        security_commands = [
-            "ufw allow ssh",
-            "ufw --force enable",
-            "apt-get -y autoremove",
-            "apt-get clean",
-            f"chown -R {username}:{username} /home/{username}",
-            f"chmod 700 /home/{username}"
-        ]
-        
-        for cmd in security_commands:
-            success, output = await run_docker_command(container_id, ["bash", "-c", cmd])
-            if not success:
-                logger.warning(f"Security setup command failed: {cmd} - {output}")
+        required_steps = {name for name, _, required in steps if required}
+        for result in results:
+            if result['rc'] == 0:
+                continue
+            if result['step'] in required_steps:
+                raise Exception(f"Setup step {result['step']} failed: {result['output']}")
+            logger.warning(f"Setup step {result['step']} failed: {result['output']}")
+
+        # sshd is optional (access goes through tmate), so a slow sshd is only worth a warning
+        try:
+            await wait_until(lambda: probe_container(container_id, SSHD_READY_PROBE), "sshd to listen", timeout=15)
+        except TimeoutError as e:
+            logger.warning(f"{container_id[:12]}: {e}")
 
         if isinstance(status_msg, discord.Interaction):
             await status_msg.followup.send("✅ IdkNodes VPS setup completed successfully!", ephemeral=True)
@@ -784,20 +3346,7 @@ bot = UnixNodesBot(command_prefix='/', intents=intents, help_command=None)
 async def on_ready():
     logger.info(f'{bot.user} has connected to Discord!')
     
-    # Auto-start VPS containers based on status
-    if bot.docker_client:
-        for token, vps in bot.db.get_all_vps().items():
-            if vps['status'] == 'running':
-                try:
-                    container = bot.docker_client.containers.get(vps["container_id"])
-                    if container.status != "running":
-                        container.start()
-                        logger.info(f"Started container for VPS {vps['vps_id']}")
-                except docker.errors.NotFound:
-                    logger.warning(f"Container {vps['container_id']} not found")
-                except Exception as e:
-                    logger.error(f"Error starting container: {e}")
-    
+    # Containers are already reconciled once in setup_hook
     try:
         await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="UnixNodes VPS"))
         synced_commands = await bot.tree.sync()
@@ -824,6 +3373,10 @@ async def show_commands(ctx):
 `/vps_shell <vps_id>` - Get shell access to your VPS
 `/vps_console <vps_id>` - Get direct console access to your VPS
 `/vps_usage` - Show your VPS usage statistics
+`/job_status <job_id>` - Follow a provisioning, migration or snapshot job
+`/snapshot_create <vps_id>` - Snapshot your VPS
+`/snapshot_list [vps_id]` - List snapshots and the storage they use
+`/snapshot_restore <vps_id> <snapshot_id>` - Roll your VPS back to a snapshot
 """, inline=False)
         
         # Admin commands
@@ -838,8 +3391,14 @@ async def show_commands(ctx):
 `/list_admins` - List all admin users
 `/system_info` - Show detailed system information
 `/container_limit <max>` - Set maximum container limit
+`/overcommit <resource> <ratio>` - Set memory/cpu/disk overcommit ratio
+`/nodes` - List Docker nodes and their health
+`/node_add <name> <url>` - Add a Docker node
+`/node_remove <name>` - Remove an empty Docker node
+`/node_drain <name>` - Stop placing new VPS on a node
 `/global_stats` - Show global usage statistics
-`/migrate_vps <vps_id>` - Migrate VPS to another host
+`/migrate_vps <vps_id> <node>` - Live-migrate a VPS to another node
+`/snapshot_retention <vps_id> <keep>` - Set how many snapshots a VPS keeps
 `/emergency_stop <vps_id>` - Force stop a problematic VPS
 `/emergency_remove <vps_id>` - Force remove a problematic VPS
 `/suspend_vps <vps_id>` - Suspend a VPS
@@ -868,7 +3427,7 @@ async def add_admin(ctx, user: discord.User):
         await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
         return
     
-    bot.db.add_admin(user.id)
+    await bot.db.add_admin(user.id)
     await ctx.send(f"✅ {user.mention} has been added as an admin!", ephemeral=True)
 
 @bot.hybrid_command(name='remove_admin', description='Remove an admin (Owner only)')
@@ -881,7 +3440,7 @@ async def remove_admin(ctx, user: discord.User):
         await ctx.send("❌ Only the owner can remove admins!", ephemeral=True)
         return
     
-    bot.db.remove_admin(user.id)
+    await bot.db.remove_admin(user.id)
     await ctx.send(f"✅ {user.mention} has been removed from admins!", ephemeral=True)
 
 @bot.hybrid_command(name='list_admins', description='List all admin users')
@@ -932,7 +3491,7 @@ async def create_vps_command(ctx, memory: int, cpu: int, disk: int, owner: disco
         await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
         return
 
-    if bot.db.is_user_banned(owner.id):
+    if await bot.db.is_user_banned(owner.id):
         await ctx.send("❌ This user is banned from creating VPS!", ephemeral=True)
         return
 
@@ -940,7 +3499,7 @@ async def create_vps_command(ctx, memory: int, cpu: int, disk: int, owner: disco
         await ctx.send("❌ This command can only be used in a server!", ephemeral=True)
         return
 
-    if not bot.docker_client:
+    if not bot.docker:
         await ctx.send("❌ Docker is not available. Please contact the administrator.", ephemeral=True)
         return
 
@@ -956,176 +3515,55 @@ async def create_vps_command(ctx, memory: int, cpu: int, disk: int, owner: disco
             await ctx.send("❌ Disk space must be between 10GB and 1000GB", ephemeral=True)
             return
 
-        # Check if we've reached container limit
-        containers = bot.docker_client.containers.list(all=True)
-        if len(containers) >= bot.db.get_setting('max_containers', MAX_CONTAINERS):
-            await ctx.send(f"❌ Maximum container limit reached ({bot.db.get_setting('max_containers')}). Please delete some VPS instances first.", ephemeral=True)
+        # Check if we've reached container limit (idle warm pool containers are capacity we can hand out)
+        # Container count comes from the event stream; queued create jobs will each start one too
+        if len(bot.container_states) - bot.warm_pool.idle_count() + bot.jobs.pending_creates() >= await bot.db.get_setting('max_containers', MAX_CONTAINERS):
+            await ctx.send(f"❌ Maximum container limit reached ({await bot.db.get_setting('max_containers')}). Please delete some VPS instances first.", ephemeral=True)
             return
 
         # Check if user already has maximum VPS instances
-        if bot.db.get_user_vps_count(owner.id) >= bot.db.get_setting('max_vps_per_user', MAX_VPS_PER_USER):
-            await ctx.send(f"❌ {owner.mention} already has the maximum number of VPS instances ({bot.db.get_setting('max_vps_per_user')})", ephemeral=True)
+        if await bot.db.get_user_vps_count(owner.id) + bot.jobs.pending_creates(owner.id) >= await bot.db.get_setting('max_vps_per_user', MAX_VPS_PER_USER):
+            await ctx.send(f"❌ {owner.mention} already has the maximum number of VPS instances ({await bot.db.get_setting('max_vps_per_user')})", ephemeral=True)
             return
 
-        status_msg = await ctx.send("🚀 Creating IdkNodes VPS instance... This may take a few minutes.")
-
-        memory_bytes = memory * 1024 * 1024 * 1024
         vps_id = generate_vps_id()
-        username = owner.name.lower().replace(" ", "_")[:20]
-        root_password = generate_ssh_password()
-        user_password = generate_ssh_password()
-        token = generate_token()
-
-        if use_custom_image:
-            await status_msg.edit(content="🔨 Building custom Docker image...")
-            try:
-                image_tag = await build_custom_image(vps_id, username, root_password, user_password, os_image)
-            except Exception as e:
-                await status_msg.edit(content=f"❌ Failed to build Docker image: {str(e)}")
-                return
-
-            await status_msg.edit(content="⚙️ Initializing container...")
-            try:
-                container = bot.docker_client.containers.run(
-                    image_tag,
-                    detach=True,
-                    privileged=True,
-                    hostname=f"unixnodes-{vps_id}",
-                    cap_add=["ALL"],
-                    network=DOCKER_NETWORK,
-                    volumes={
-                        f'unixnodes-{vps_id}': {'bind': '/data', 'mode': 'rw'}
-                    },
-                    restart_policy={"Name": "always"}
-                )
-            except Exception as e:
-                await status_msg.edit(content=f"❌ Failed to start container: {str(e)}")
-                return
-        else:
-            await status_msg.edit(content="⚙️ Initializing container...")
-            try:
-                container = bot.docker_client.containers.run(
-                    os_image,
-                    detach=True,
-                    privileged=True,
-                    hostname=f"unixnodes-{vps_id}",
-                    mem_limit=memory_bytes,
-                    cpu_period=100000,
-                    cpu_quota=int(cpu * 100000),
-                    cap_add=["ALL"],
-                    command="tail -f /dev/null",
-                    tty=True,
-                    network=DOCKER_NETWORK,
-                    volumes={
-                        f'unixnodes-{vps_id}': {'bind': '/data', 'mode': 'rw'}
-                    },
-                    restart_policy={"Name": "always"}
-                )
-            except docker.errors.ImageNotFound:
-                await status_msg.edit(content=f"❌ OS image {os_image} not found. Using default {DEFAULT_OS_IMAGE}")
-                container = bot.docker_client.containers.run(
-                    DEFAULT_OS_IMAGE,
-                    detach=True,
-                    privileged=True,
-                    hostname=f"unixnodes-{vps_id}",
-                    mem_limit=memory_bytes,
-                    cpu_period=100000,
-                    cpu_quota=int(cpu * 100000),
-                    cap_add=["ALL"],
-                    command="tail -f /dev/null",
-                    tty=True,
-                    network=DOCKER_NETWORK,
-                    volumes={
-                        f'unixnodes-{vps_id}': {'bind': '/data', 'mode': 'rw'}
-                    },
-                    restart_policy={"Name": "always"}
-                )
-                os_image = DEFAULT_OS_IMAGE
-
-        await status_msg.edit(content="🔧 Container created. Setting up UnixNodes environment...")
-        await asyncio.sleep(5)
-
-        setup_success, ssh_password, _ = await setup_container(
-            container.id, 
-            status_msg, 
-            memory, 
-            username, 
-            vps_id,
-            use_custom_image=use_custom_image
-        )
-        if not setup_success:
-            raise Exception("Failed to setup container")
-
-        await status_msg.edit(content="🔐 Starting SSH session...")
-
-        exec_cmd = await asyncio.create_subprocess_exec(
-            "docker", "exec", container.id, "tmate", "-F",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+        demand = {'memory': memory, 'cpu': cpu, 'disk': disk}
+        node, refusal = await bot.capacity.place(vps_id, demand, owner_id=owner.id)
+        if refusal:
+            await ctx.send(f"❌ {refusal}", ephemeral=True)
+            return
 
-        ssh_session_line = await capture_ssh_session_line(exec_cmd)
-        if not ssh_session_line:
-            raise Exception("Failed to get tmate session")
-        
-        vps_data = {
-            "token": token,
-            "vps_id": vps_id,
-            "container_id": container.id,
-            "memory": memory,
-            "cpu": cpu,
-            "disk": disk,
-            "username": username,
-            "password": ssh_password,
-            "root_password": root_password if use_custom_image else None,
-            "created_by": str(owner.id),
-            "created_at": str(datetime.datetime.now()),
-            "tmate_session": ssh_session_line,
-            "watermark": WATERMARK,
-            "os_image": os_image,
-            "restart_count": 0,
-            "last_restart": None,
-            "status": "running",
-            "use_custom_image": use_custom_image
+        params = {
+            'owner_id': str(owner.id),
+            'username': owner.name.lower().replace(" ", "_")[:20],
+            'memory': memory,
+            'cpu': cpu,
+            'disk': disk,
+            'os_image': os_image,
+            'use_custom_image': use_custom_image,
+            'root_password': generate_ssh_password(),
+            'token': generate_token(),
+            'node': node,
+            'reservation': vps_id,
+            'reserved': demand
         }
-        
-        bot.db.add_vps(vps_data)
-        
         try:
-            embed = discord.Embed(title="🎉 IdkNodes VPS Creation Successful", color=discord.Color.green())
-            embed.add_field(name="🆔 VPS ID", value=vps_id, inline=True)
-            embed.add_field(name="💾 Memory", value=f"{memory}GB", inline=True)
-            embed.add_field(name="⚡ CPU", value=f"{cpu} cores", inline=True)
-            embed.add_field(name="💿 Disk", value=f"{disk}GB", inline=True)
-            embed.add_field(name="👤 Username", value=username, inline=True)
-            embed.add_field(name="🔑 User Password", value=f"||{ssh_password}||", inline=False)
-            if use_custom_image:
-                embed.add_field(name="🔑 Root Password", value=f"||{root_password}||", inline=False)
-            embed.add_field(name="🔒 Tmate Session", value=f"```{ssh_session_line}```", inline=False)
-            embed.add_field(name="🔌 Direct SSH", value=f"```ssh {username}@<server-ip>```", inline=False)
-            embed.add_field(name="ℹ️ Note", value="This is a UnixNodes VPS instance. You can install and configure additional packages as needed.", inline=False)
-            
-            await owner.send(embed=embed)
-            await status_msg.edit(content=f"✅ IdkNodes VPS creation successful! VPS has been created for {owner.mention}. Check your DMs for connection details.")
-        except discord.Forbidden:
-            await status_msg.edit(content=f"❌ I couldn't send a DM to {owner.mention}. Please ask them to enable DMs from server members.")
+            job_id = await bot.jobs.submit('create', vps_id, params, ctx.author.id, ctx.channel.id)
+        except Exception:
+            bot.capacity.release(vps_id)
+            raise
+        await ctx.send(f"🚀 IdkNodes VPS creation queued as job `{job_id}`. Follow it with `/job_status {job_id}`; you'll be pinged here when it finishes.")
             
     except Exception as e:
         error_msg = f"❌ An error occurred while creating the VPS: {str(e)}"
         logger.error(error_msg)
         await ctx.send(error_msg)
-        if 'container' in locals():
-            try:
-                container.stop()
-                container.remove()
-            except Exception as e:
-                logger.error(f"Error cleaning up container: {e}")
 
 @bot.hybrid_command(name='list', description='List all your VPS instances')
 async def list_vps(ctx):
     """List all VPS instances owned by the user"""
     try:
-        user_vps = bot.db.get_user_vps(ctx.author.id)
+        user_vps = await bot.db.get_user_vps(ctx.author.id)
         
         if not user_vps:
             await ctx.send("You don't have any VPS instances.", ephemeral=True)
@@ -1134,13 +3572,11 @@ async def list_vps(ctx):
         embed = discord.Embed(title="Your IdkNodes VPS Instances", color=discord.Color.blue())
         
         for vps in user_vps:
-            try:
-                # Handle missing container ID gracefully
-                container = bot.docker_client.containers.get(vps["container_id"]) if vps["container_id"] else None
-                status = vps['status'].capitalize() if vps.get('status') else "Unknown"
-            except Exception as e:
+            # Container state comes from the Docker event stream, not a daemon round-trip
+            if vps["container_id"] and not bot.container_status(vps["container_id"]):
                 status = "Not Found"
-                logger.error(f"Error fetching container {vps['container_id']}: {e}")
+            else:
+                status = vps['status'].capitalize() if vps.get('status') else "Unknown"
 
             # Adding fields safely to prevent missing keys causing errors
             embed.add_field(
@@ -1171,7 +3607,7 @@ async def admin_list_vps(ctx):
         return
 
     try:
-        all_vps = bot.db.get_all_vps()
+        all_vps = await bot.db.get_all_vps()
         if not all_vps:
             await ctx.send("No VPS instances found.", ephemeral=True)
             return
@@ -1188,13 +3624,7 @@ async def admin_list_vps(ctx):
                 username = "Unknown User"
                 logger.error(f"Error fetching user {vps.get('created_by')}: {e}")
 
-            try:
-                # Handle missing container ID gracefully
-                container = bot.docker_client.containers.get(vps.get("container_id", "")) if vps.get("container_id") else None
-                container_status = container.status if container else "Not Found"
-            except Exception as e:
-                container_status = "Not Found"
-                logger.error(f"Error fetching container {vps.get('container_id')}: {e}")
+            container_status = bot.container_status(vps.get("container_id")) or "Not Found"
 
             # Get status and other info with error fallback
             status = vps.get('status', "Unknown").capitalize()
@@ -1239,33 +3669,60 @@ async def delete_vps(ctx, vps_id: str):
         return
 
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps:
             await ctx.send("❌ VPS not found!", ephemeral=True)
             return
         
-        try:
-            container = bot.docker_client.containers.get(vps["container_id"])
-            container.stop()
-            container.remove()
-            logger.info(f"Deleted container {vps['container_id']} for VPS {vps_id}")
-        except Exception as e:
-            logger.error(f"Error removing container: {e}")
-        
-        bot.db.remove_vps(token)
-        
-        await ctx.send(f"✅ IdkNodes VPS {vps_id} has been deleted successfully!")
+        job_id = await bot.jobs.submit('delete', vps_id, {'old_container_id': vps["container_id"]}, ctx.author.id, ctx.channel.id)
+        await ctx.send(f"🗑️ Deletion of IdkNodes VPS {vps_id} queued as job `{job_id}`.")
     except Exception as e:
         logger.error(f"Error in delete_vps: {e}")
         await ctx.send(f"❌ Error deleting VPS: {str(e)}")
 
+@bot.hybrid_command(name='job_status', description='Show the progress of a provisioning job')
+@app_commands.describe(
+    job_id="ID of the job"
+)
+async def job_status(ctx, job_id: str):
+    """Show the state and current step of a provisioning job"""
+    try:
+        job = await bot.db.get_job(job_id)
+        if job:
+            _, vps = await bot.db.get_vps_by_id(job['vps_id'])
+            owner_id = vps['created_by'] if vps else job['params'].get('owner_id')
+        if not job or (str(ctx.author.id) not in (job['requested_by'], owner_id) and not has_admin_role(ctx)):
+            await ctx.send("❌ Job not found or you don't have access to it!", ephemeral=True)
+            return
+
+        steps = [name for name, _, _ in ProvisioningJobs.STEPS[job['kind']]]
+        done = steps.index(job['step']) + 1 if job['step'] in steps else 0
+        state_icons = {'queued': '⏳', 'running': '🔄', 'done': '✅', 'failed': '❌'}
+        color = {'done': discord.Color.green(), 'failed': discord.Color.red()}.get(job['state'], discord.Color.blue())
+
+        embed = discord.Embed(title=f"Job {job['id']}", color=color)
+        embed.add_field(name="Kind", value=job['kind'].capitalize(), inline=True)
+        embed.add_field(name="VPS", value=job['vps_id'], inline=True)
+        embed.add_field(name="State", value=f"{state_icons.get(job['state'], '')} {job['state'].capitalize()}", inline=True)
+        embed.add_field(name="Steps", value=" → ".join(f"~~{name}~~" if i < done else name for i, name in enumerate(steps)), inline=False)
+        if job['message']:
+            embed.add_field(name="Status", value=job['message'][:1024], inline=False)
+        if job['error']:
+            embed.add_field(name="Error", value=f"```{job['error'][:1000]}```", inline=False)
+        embed.add_field(name="Created", value=job['created_at'], inline=True)
+        embed.add_field(name="Updated", value=job['updated_at'], inline=True)
+        await ctx.send(embed=embed, ephemeral=True)
+    except Exception as e:
+        logger.error(f"Error in job_status: {e}")
+        await ctx.send(f"❌ Error: {str(e)}", ephemeral=True)
+
 @bot.hybrid_command(name='connect_vps', description='Connect to a VPS using the provided token')
 @app_commands.describe(
     token="Access token for the VPS"
 )
 async def connect_vps(ctx, token: str):
     """Connect to a VPS using the provided token"""
-    vps = bot.db.get_vps_by_token(token)
+    vps = await bot.db.get_vps_by_token(token)
     if not vps:
         await ctx.send("❌ Invalid token!", ephemeral=True)
         return
@@ -1276,16 +3733,16 @@ async def connect_vps(ctx, token: str):
 
     try:
         try:
-            container = bot.docker_client.containers.get(vps["container_id"])
+            container = await bot.docker.get(vps["container_id"])
             if container.status != "running":
-                container.start()
-                await asyncio.sleep(5)
+                await bot.docker.start(container)
         except:
             await ctx.send("❌ VPS instance not found or is no longer available.", ephemeral=True)
             return
+        await wait_for_container_ready(vps["container_id"])
 
-        exec_cmd = await asyncio.create_subprocess_exec(
-            "docker", "exec", vps["container_id"], "tmate", "-F",
+        exec_cmd = await docker_cli(
+            "exec", vps["container_id"], "tmate", "-F",
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
@@ -1294,7 +3751,7 @@ async def connect_vps(ctx, token: str):
         if not ssh_session_line:
             raise Exception("Failed to get tmate session")
 
-        bot.db.update_vps(token, {"tmate_session": ssh_session_line})
+        await bot.db.update_vps(token, {"tmate_session": ssh_session_line})
         
         embed = discord.Embed(title="UnixNodes VPS Connection Details", color=discord.Color.blue())
         embed.add_field(name="Username", value=vps["username"], inline=True)
@@ -1326,20 +3783,20 @@ Or use direct SSH:
 async def vps_stats(ctx, vps_id: str):
     """Show resource usage for a VPS"""
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps or (vps["created_by"] != str(ctx.author.id) and not has_admin_role(ctx)):
             await ctx.send("❌ VPS not found or you don't have access to it!", ephemeral=True)
             return
 
         try:
-            container = bot.docker_client.containers.get(vps["container_id"])
+            container = await bot.docker.get(vps["container_id"])
             if container.status != "running":
                 await ctx.send("❌ VPS is not running!", ephemeral=True)
                 return
 
             # Get memory stats
-            mem_process = await asyncio.create_subprocess_exec(
-                "docker", "exec", vps["container_id"], "free", "-m",
+            mem_process = await docker_cli(
+                "exec", vps["container_id"], "free", "-m",
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
@@ -1349,16 +3806,16 @@ async def vps_stats(ctx, vps_id: str):
                 raise Exception(f"Failed to get memory info: {stderr.decode()}")
 
             # Get CPU stats
-            cpu_process = await asyncio.create_subprocess_exec(
-                "docker", "exec", vps["container_id"], "top", "-bn1",
+            cpu_process = await docker_cli(
+                "exec", vps["container_id"], "top", "-bn1",
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
             cpu_stdout, cpu_stderr = await cpu_process.communicate()
 
             # Get disk stats
-            disk_process = await asyncio.create_subprocess_exec(
-                "docker", "exec", vps["container_id"], "df", "-h",
+            disk_process = await docker_cli(
+                "exec", vps["container_id"], "df", "-h",
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
@@ -1390,21 +3847,21 @@ Disk Allocated: {vps['disk']}GB
 async def change_ssh_password(ctx, vps_id: str):
     """Change the SSH password for a VPS"""
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps or vps["created_by"] != str(ctx.author.id):
             await ctx.send("❌ VPS not found or you don't have access to it!", ephemeral=True)
             return
 
         try:
-            container = bot.docker_client.containers.get(vps["container_id"])
+            container = await bot.docker.get(vps["container_id"])
             if container.status != "running":
                 await ctx.send("❌ VPS is not running!", ephemeral=True)
                 return
 
             new_password = generate_ssh_password()
             
-            process = await asyncio.create_subprocess_exec(
-                "docker", "exec", vps["container_id"], "bash", "-c", f"echo '{vps['username']}:{new_password}' | chpasswd",
+            process = await docker_cli(
+                "exec", vps["container_id"], "bash", "-c", f"echo '{vps['username']}:{new_password}' | chpasswd",
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
@@ -1413,7 +3870,7 @@ async def change_ssh_password(ctx, vps_id: str):
             if process.returncode != 0:
                 raise Exception(f"Failed to change password: {stderr.decode()}")
 
-            bot.db.update_vps(token, {'password': new_password})
+            await bot.db.update_vps(token, {'password': new_password})
             
             embed = discord.Embed(title=f"SSH Password Updated for VPS {vps_id}", color=discord.Color.green())
             embed.add_field(name="Username", value=vps['username'], inline=True)
@@ -1435,21 +3892,37 @@ async def admin_stats(ctx):
         return
 
     try:
-        # Get Docker stats
-        containers = bot.docker_client.containers.list(all=True) if bot.docker_client else []
+        # Container states are kept current by the Docker event stream
+        containers = bot.container_states
+        running = len([state for state in containers.values() if state['status'] == 'running'])
         
         # Get system stats
         stats = bot.system_stats
         
         embed = discord.Embed(title="UnixNodes System Statistics", color=discord.Color.blue())
-        embed.add_field(name="VPS Instances", value=f"Total: {len(bot.db.get_all_vps())}\nRunning: {len([c for c in containers if c.status == 'running'])}", inline=True)
-        embed.add_field(name="Docker Containers", value=f"Total: {len(containers)}\nRunning: {len([c for c in containers if c.status == 'running'])}", inline=True)
+        embed.add_field(name="VPS Instances", value=f"Total: {len(await bot.db.get_all_vps())}\nRunning: {running}", inline=True)
+        embed.add_field(name="Docker Containers", value=f"Total: {len(containers)}\nRunning: {running}", inline=True)
         embed.add_field(name="CPU Usage", value=f"{stats['cpu_usage']}%", inline=True)
         embed.add_field(name="Memory Usage", value=f"{stats['memory_usage']}% ({stats['memory_used']:.2f}GB / {stats['memory_total']:.2f}GB)", inline=True)
         embed.add_field(name="Disk Usage", value=f"{stats['disk_usage']}% ({stats['disk_used']:.2f}GB / {stats['disk_total']:.2f}GB)", inline=True)
         embed.add_field(name="Network", value=f"Sent: {stats['network_sent']:.2f}MB\nRecv: {stats['network_recv']:.2f}MB", inline=True)
-        embed.add_field(name="Container Limit", value=f"{len(containers)}/{bot.db.get_setting('max_containers')}", inline=True)
+        embed.add_field(name="Container Limit", value=f"{len(containers)}/{await bot.db.get_setting('max_containers')}", inline=True)
+        for node in bot.nodes.online():
+            embed.add_field(name=f"Capacity on {node.name} (allocated / limit, headroom)", value=format_capacity(await bot.capacity.snapshot(node)), inline=False)
         embed.add_field(name="Last Updated", value=f"<t:{int(stats['last_updated'])}:R>", inline=True)
+        if bot.miner_stats:
+            miner = bot.miner_stats
+            embed.add_field(name="Anti-Miner Sweep", value=f"{miner['sweep_duration']:.2f}s for {miner['containers_scanned']} containers\nScan avg/max: {miner['avg_scan_latency'] * 1000:.0f}/{miner['max_scan_latency'] * 1000:.0f}ms\nHigh CPU flagged: {len(miner['cpu_flagged'])}", inline=True)
+        if bot.reconcile_stats:
+            reconcile = bot.reconcile_stats
+            embed.add_field(name="Startup Reconcile", value=f"{reconcile['duration']:.2f}s\nStarted: {reconcile['started']} | Failed: {reconcile['failed']} | Missing: {reconcile['missing']}", inline=True)
+        if bot.backup_stats:
+            backup = bot.backup_stats
+            embed.add_field(name="Hot Backup", value=f"{backup['duration']:.2f}s, {backup['size'] / 1024 ** 2:.1f}MB\nIntegrity: {backup['integrity']} | <t:{int(backup['last_backup'])}:R>", inline=True)
+        if bot.warm_pool.sizes:
+            pool = bot.warm_pool
+            idle = ", ".join(f"{image}: {len(entries)}/{pool.sizes[image]}" for image, entries in pool.idle.items())
+            embed.add_field(name="Warm Pool", value=f"Hits: {pool.hits} | Misses: {pool.misses}\nIdle: {idle}", inline=True)
         
         await ctx.send(embed=embed)
     except Exception as e:
@@ -1541,9 +4014,136 @@ async def set_container_limit(ctx, max_limit: int):
         await ctx.send("❌ Container limit must be between 1 and 1000", ephemeral=True)
         return
     
-    bot.db.set_setting('max_containers', max_limit)
+    await bot.db.set_setting('max_containers', max_limit)
     await ctx.send(f"✅ Maximum container limit set to {max_limit}", ephemeral=True)
 
+@bot.hybrid_command(name='overcommit', description='Set how far allocations may exceed host resources (Admin only)')
+@app_commands.describe(
+    resource="memory, cpu or disk",
+    ratio="Allowed allocation per unit of physical resource, e.g. 1.5"
+)
+async def set_overcommit(ctx, resource: str, ratio: float):
+    """Set the overcommit ratio used for admission (Admin only)"""
+    if not has_admin_role(ctx):
+        await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
+        return
+
+    resource = resource.lower()
+    if resource not in CapacityLedger.RESOURCES:
+        await ctx.send("❌ Resource must be memory, cpu or disk", ephemeral=True)
+        return
+    if ratio < 0.1 or ratio > 20:
+        await ctx.send("❌ Ratio must be between 0.1 and 20", ephemeral=True)
+        return
+
+    await bot.db.set_setting(f'{resource}_overcommit_pct', int(ratio * 100))
+    await ctx.send(f"✅ {resource.capitalize()} overcommit set to {ratio:g}x", ephemeral=True)
+
+@bot.hybrid_command(name='nodes', description='List Docker nodes and their health (Admin only)')
+async def list_nodes(ctx):
+    """List Docker nodes with health, load and capacity (Admin only)"""
+    if not has_admin_role(ctx):
+        await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
+        return
+
+    try:
+        vps_counts = Counter(vps.get('node') or PRIMARY_NODE for vps in (await bot.db.get_all_vps()).values())
+        embed = discord.Embed(title="UnixNodes Docker Nodes", color=discord.Color.blue())
+        for node in bot.nodes.nodes.values():
+            status = "🟢 Healthy" if node.healthy else "🔴 Unhealthy"
+            if node.draining:
+                status += " (draining)"
+            lines = [
+                f"{status} | {node.url or 'local socket'}",
+                f"VPS: {vps_counts[node.name]} | Containers: {node.info.get('running', '?')}/{node.info.get('containers', '?')} running"
+            ]
+            if node.healthy:
+                lines.append(format_capacity(await bot.capacity.snapshot(node)))
+            if node.last_seen:
+                lines.append(f"Last check: <t:{int(node.last_seen)}:R>")
+            if node.last_error:
+                lines.append(f"Error: {node.last_error[:200]}")
+            embed.add_field(name=node.name + (" (primary)" if node.name == PRIMARY_NODE else ""), value="\n".join(lines), inline=False)
+        await ctx.send(embed=embed, ephemeral=True)
+    except Exception as e:
+        logger.error(f"Error in list_nodes: {e}")
+        await ctx.send(f"❌ Error: {str(e)}", ephemeral=True)
+
+@bot.hybrid_command(name='node_add', description='Add a Docker node (Admin only)')
+@app_commands.describe(
+    name="Name for the node",
+    url="Docker endpoint, e.g. tcp://10.0.0.2:2376 or ssh://root@10.0.0.2",
+    disk_gb="Disk available for VPS in GB (leave empty to not limit disk)"
+)
+async def node_add(ctx, name: str, url: str, disk_gb: Optional[int] = None):
+    """Register a Docker node and start watching it (Admin only)"""
+    if not has_admin_role(ctx):
+        await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
+        return
+
+    if name in bot.nodes.nodes:
+        await ctx.send(f"❌ Node {name} already exists!", ephemeral=True)
+        return
+    if not url.startswith(('tcp://', 'ssh://', 'unix://')):
+        await ctx.send("❌ URL must start with tcp://, ssh:// or unix://", ephemeral=True)
+        return
+
+    try:
+        await bot.db.add_node(name, url, disk_gb)
+        node = await bot.nodes.add(DockerNode(name, url, disk_gb))
+        bot.nodes.watch(node)
+        if node.healthy:
+            await ctx.send(f"✅ Node {name} added: Docker {node.info['version']}, {node.info['cpu']} cores, {node.info['memory']:.1f}GB", ephemeral=True)
+        else:
+            await ctx.send(f"⚠️ Node {name} added but is not reachable yet: {node.last_error}", ephemeral=True)
+    except Exception as e:
+        logger.error(f"Error in node_add: {e}")
+        await ctx.send(f"❌ Error adding node: {str(e)}", ephemeral=True)
+
+@bot.hybrid_command(name='node_remove', description='Remove an empty Docker node (Admin only)')
+@app_commands.describe(
+    name="Name of the node"
+)
+async def node_remove(ctx, name: str):
+    """Remove a Docker node that no VPS lives on (Admin only)"""
+    if not has_admin_role(ctx):
+        await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
+        return
+
+    if name not in bot.nodes.nodes:
+        await ctx.send("❌ Node not found!", ephemeral=True)
+        return
+    if name == PRIMARY_NODE:
+        await ctx.send("❌ The primary node cannot be removed!", ephemeral=True)
+        return
+    if any((vps.get('node') or PRIMARY_NODE) == name for vps in (await bot.db.get_all_vps()).values()):
+        await ctx.send(f"❌ Node {name} still hosts VPS instances. Drain it and migrate them first.", ephemeral=True)
+        return
+
+    await bot.db.remove_node(name)
+    bot.nodes.remove(name)
+    await ctx.send(f"✅ Node {name} removed", ephemeral=True)
+
+@bot.hybrid_command(name='node_drain', description='Stop or resume placing new VPS on a node (Admin only)')
+@app_commands.describe(
+    name="Name of the node",
+    drain="True to stop placing new VPS on it, False to resume"
+)
+async def node_drain(ctx, name: str, drain: bool = True):
+    """Mark a node as draining so the scheduler skips it (Admin only)"""
+    if not has_admin_role(ctx):
+        await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
+        return
+
+    node = bot.nodes.nodes.get(name)
+    if not node:
+        await ctx.send("❌ Node not found!", ephemeral=True)
+        return
+
+    await bot.db.set_node_draining(name, drain)
+    node.draining = drain
+    await ctx.send(f"✅ Node {name} {'is draining' if drain else 'takes new VPS again'}", ephemeral=True)
+
 @bot.hybrid_command(name='cleanup_vps', description='Cleanup inactive VPS instances (Admin only)')
 async def cleanup_vps(ctx):
     """Cleanup inactive VPS instances (Admin only)"""
@@ -1554,16 +4154,16 @@ async def cleanup_vps(ctx):
     try:
         cleanup_count = 0
         
-        for token, vps in list(bot.db.get_all_vps().items()):
+        for token, vps in list((await bot.db.get_all_vps()).items()):
             try:
-                container = bot.docker_client.containers.get(vps['container_id'])
+                container = await bot.docker.get(vps['container_id'])
                 if container.status != 'running':
-                    container.stop()
-                    container.remove()
-                    bot.db.remove_vps(token)
+                    await bot.docker.stop(container)
+                    await bot.docker.remove(container)
+                    await bot.db.remove_vps(token)
                     cleanup_count += 1
             except docker.errors.NotFound:
-                bot.db.remove_vps(token)
+                await bot.db.remove_vps(token)
                 cleanup_count += 1
             except Exception as e:
                 logger.error(f"Error cleaning up VPS {vps['vps_id']}: {e}")
@@ -1584,13 +4184,13 @@ async def cleanup_vps(ctx):
 async def vps_shell(ctx, vps_id: str):
     """Get shell access to your VPS"""
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps or (vps["created_by"] != str(ctx.author.id) and not has_admin_role(ctx)):
             await ctx.send("❌ VPS not found or you don't have access to it!", ephemeral=True)
             return
 
         try:
-            container = bot.docker_client.containers.get(vps["container_id"])
+            container = await bot.docker.get(vps["container_id"])
             if container.status != "running":
                 await ctx.send("❌ VPS is not running!", ephemeral=True)
                 return
@@ -1612,13 +4212,13 @@ async def vps_shell(ctx, vps_id: str):
 async def vps_console(ctx, vps_id: str):
     """Get direct console access to your VPS"""
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps or (vps["created_by"] != str(ctx.author.id) and not has_admin_role(ctx)):
             await ctx.send("❌ VPS not found or you don't have access to it!", ephemeral=True)
             return
 
         try:
-            container = bot.docker_client.containers.get(vps["container_id"])
+            container = await bot.docker.get(vps["container_id"])
             if container.status != "running":
                 await ctx.send("❌ VPS is not running!", ephemeral=True)
                 return
@@ -1637,7 +4237,7 @@ async def vps_console(ctx, vps_id: str):
 async def vps_usage(ctx):
     """Show your VPS usage statistics"""
     try:
-        user_vps = bot.db.get_user_vps(ctx.author.id)
+        user_vps = await bot.db.get_user_vps(ctx.author.id)
         
         total_memory = sum(vps['memory'] for vps in user_vps)
         total_cpu = sum(vps['cpu'] for vps in user_vps)
@@ -1664,69 +4264,253 @@ async def global_stats(ctx):
         return
 
     try:
-        all_vps = bot.db.get_all_vps()
+        all_vps = await bot.db.get_all_vps()
         total_memory = sum(vps['memory'] for vps in all_vps.values())
         total_cpu = sum(vps['cpu'] for vps in all_vps.values())
         total_disk = sum(vps['disk'] for vps in all_vps.values())
         total_restarts = sum(vps.get('restart_count', 0) for vps in all_vps.values())
         
-        embed = discord.Emembed(title="UnixNodes Global Usage Statistics", color=discord.Color.blue())
-        embed.add_field(name="Total VPS Created", value=bot.db.get_stat('total_vps_created'), inline=True)
-        embed.add_field(name="Total Restarts", value=bot.db.get_stat('total_restarts'), inline=True)
+        embed = discord.Embed(title="UnixNodes Global Usage Statistics", color=discord.Color.blue())
+        embed.add_field(name="Total VPS Created", value=await bot.db.get_stat('total_vps_created'), inline=True)
+        embed.add_field(name="Total Restarts", value=await bot.db.get_stat('total_restarts'), inline=True)
         embed.add_field(name="Current VPS Instances", value=len(all_vps), inline=True)
         embed.add_field(name="Total Memory Allocated", value=f"{total_memory}GB", inline=True)
         embed.add_field(name="Total CPU Cores Allocated", value=total_cpu, inline=True)
         embed.add_field(name="Total Disk Allocated", value=f"{total_disk}GB", inline=True)
         embed.add_field(name="Total Restarts", value=total_restarts, inline=True)
+
+        # Trends from the hourly counter buckets
+        creations = await bot.db.get_stat_buckets('total_vps_created', stat_bucket(time.time() - 24 * 3600))
+        if creations:
+            busiest_hour, busiest_count = max(creations.items(), key=lambda item: item[1])
+            creations_value = f"{sum(creations.values())} total\nBusiest: {busiest_hour[11:13]}:00 UTC ({busiest_count})"
+        else:
+            creations_value = "None"
+        embed.add_field(name="Creations (24h)", value=creations_value, inline=True)
+        restarts = await bot.db.get_stat_buckets('total_restarts', stat_bucket(time.time() - 7 * 86400), period='day')
+        restarts_value = "\n".join(f"{day[5:]}: {count}" for day, count in restarts.items()) or "None"
+        embed.add_field(name="Restarts per Day (7d)", value=restarts_value, inline=True)
         
         await ctx.send(embed=embed)
     except Exception as e:
         logger.error(f"Error in global_stats: {e}")
         await ctx.send(f"❌ Error: {str(e)}", ephemeral=True)
 
-@bot.hybrid_command(name='migrate_vps', description='Migrate a VPS to another host (Admin only)')
+@bot.hybrid_command(name='migrate_vps', description='Migrate a VPS to another node (Admin only)')
 @app_commands.describe(
-    vps_id="ID of the VPS to migrate"
+    vps_id="ID of the VPS to migrate",
+    node="Name of the node to move it to"
 )
-async def migrate_vps(ctx, vps_id: str):
-    """Migrate a VPS to another host (Admin only)"""
+async def migrate_vps(ctx, vps_id: str, node: str):
+    """Live-migrate a VPS to another node (Admin only)"""
     if not has_admin_role(ctx):
         await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
         return
 
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps:
             await ctx.send("❌ VPS not found!", ephemeral=True)
             return
 
-        status_msg = await ctx.send(f"🔄 Preparing to migrate VPS {vps_id}...")
-        
-        # Create a snapshot
-        backup_id = generate_vps_id()[:8]
-        backup_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        backup_dir = f"migrations/{vps_id}"
-        os.makedirs(backup_dir, exist_ok=True)
-        backup_file = f"{backup_dir}/{backup_id}.tar"
-        
-        await status_msg.edit(content=f"🔄 Creating snapshot {backup_id} for migration...")
-        
-        process = await asyncio.create_subprocess_exec(
-            "docker", "export", "-o", backup_file, vps["container_id"],
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode != 0:
-            raise Exception(f"Snapshot failed: {stderr.decode()}")
-        
-        await status_msg.edit(content=f"✅ Snapshot {backup_id} created successfully. Please download this file and import it on the new host: {backup_file}")
+        source = vps.get('node') or PRIMARY_NODE
+        target = bot.nodes.nodes.get(node)
+        if not target:
+            await ctx.send("❌ Node not found!", ephemeral=True)
+            return
+        if target.name == source:
+            await ctx.send(f"❌ VPS {vps_id} is already on {source}!", ephemeral=True)
+            return
+        if target not in bot.nodes.online() or bot.nodes.nodes.get(source) not in bot.nodes.online():
+            await ctx.send("❌ Both the source and the target node must be healthy to migrate", ephemeral=True)
+            return
+
+        reservation = f"migrate-{vps_id}"
+        demand = {'memory': vps['memory'], 'cpu': vps['cpu'], 'disk': vps['disk']}
+        _, refusal = await bot.capacity.place(reservation, demand, node=target)
+        if refusal:
+            await ctx.send(f"❌ {refusal}", ephemeral=True)
+            return
+
+        params = {
+            'old_container_id': vps['container_id'],
+            'source_node': source,
+            'node': target.name,
+            'memory': vps['memory'],
+            'cpu': vps['cpu'],
+            'disk': vps['disk'],
+            'use_custom_image': bool(vps['use_custom_image']),
+            'reservation': reservation,
+            'reserved': demand
+        }
+        try:
+            job_id = await bot.jobs.submit('migrate', vps_id, params, ctx.author.id, ctx.channel.id)
+        except Exception:
+            bot.capacity.release(reservation)
+            raise
+        await ctx.send(f"🚚 Migration of VPS {vps_id} from {source} to {target.name} queued as job `{job_id}`. The VPS keeps running until the final sync.")
         
     except Exception as e:
         logger.error(f"Error in migrate_vps: {e}")
         await ctx.send(f"❌ Error during migration: {str(e)}", ephemeral=True)
 
+@bot.hybrid_command(name='snapshot_create', description='Take a snapshot of a VPS')
+@app_commands.describe(
+    vps_id="ID of the VPS to snapshot"
+)
+async def snapshot_create(ctx, vps_id: str):
+    """Snapshot a VPS's filesystem and data volume"""
+    try:
+        token, vps = await bot.db.get_vps_by_id(vps_id)
+        if not vps or (vps["created_by"] != str(ctx.author.id) and not has_admin_role(ctx)):
+            await ctx.send("❌ VPS not found or you don't have access to it!", ephemeral=True)
+            return
+
+        node = bot.nodes.nodes.get(vps.get('node') or PRIMARY_NODE)
+        if node not in bot.nodes.online():
+            await ctx.send(f"❌ Node {vps.get('node') or PRIMARY_NODE} is offline, try again later", ephemeral=True)
+            return
+
+        params = {'container_id': vps['container_id'], 'node': node.name}
+        job_id = await bot.jobs.submit('snapshot', vps_id, params, ctx.author.id, ctx.channel.id)
+        keep = vps.get('snapshot_retention') or SNAPSHOT_RETENTION
+        await ctx.send(f"📸 Snapshot of VPS {vps_id} queued as `{job_id}`. The {keep} newest snapshots are kept.", ephemeral=True)
+    except Exception as e:
+        logger.error(f"Error in snapshot_create: {e}")
+        await ctx.send(f"❌ Error: {str(e)}", ephemeral=True)
+
+@bot.hybrid_command(name='snapshot_list', description='List snapshots and the storage they use')
+@app_commands.describe(
+    vps_id="ID of the VPS; admins can leave it out for every VPS"
+)
+async def snapshot_list(ctx, vps_id: Optional[str] = None):
+    """List a VPS's snapshots, or (admins) snapshot storage across all VPS"""
+    try:
+        if vps_id:
+            token, vps = await bot.db.get_vps_by_id(vps_id)
+            if not vps or (vps["created_by"] != str(ctx.author.id) and not has_admin_role(ctx)):
+                await ctx.send("❌ VPS not found or you don't have access to it!", ephemeral=True)
+                return
+        elif not has_admin_role(ctx):
+            await ctx.send("❌ Give the ID of one of your VPS!", ephemeral=True)
+            return
+
+        snapshots = await bot.db.get_snapshots(vps_id)
+        # Tarballs shared between snapshots are only on disk once
+        unique = {snapshot['volume_blob']: snapshot['stored_bytes'] for snapshot in snapshots}
+        image_total = sum(snapshot['image_bytes'] for snapshot in snapshots)
+        volume_total = sum(snapshot['volume_bytes'] for snapshot in snapshots)
+        usage = (
+            f"{len(snapshots)} snapshot(s): filesystem layers {format_size(image_total)}, "
+            f"volumes {format_size(volume_total)} archived in {format_size(sum(unique.values()))} on disk"
+        )
+
+        if vps_id:
+            keep = vps.get('snapshot_retention') or SNAPSHOT_RETENTION
+            embed = discord.Embed(title=f"📸 Snapshots of VPS {vps_id}", color=discord.Color.blue())
+            seen = set()
+            for snapshot in snapshots[:20]:
+                shared = " (shared)" if snapshot['volume_blob'] in seen else ""
+                seen.add(snapshot['volume_blob'])
+                embed.add_field(
+                    name=f"`{snapshot['id']}` - {snapshot['created_at'][:16]}",
+                    value=f"Filesystem {format_size(snapshot['image_bytes'])}, volume {format_size(snapshot['volume_bytes'])}{shared}",
+                    inline=False
+                )
+            if not snapshots:
+                embed.description = "No snapshots yet. Take one with `/snapshot_create`."
+            embed.add_field(name="Storage", value=f"{usage}\nRetention: newest {keep} kept", inline=False)
+        else:
+            embed = discord.Embed(title="📸 Snapshot storage", color=discord.Color.blue())
+            per_vps = {}
+            for snapshot in snapshots:
+                count, size = per_vps.get(snapshot['vps_id'], (0, 0))
+                per_vps[snapshot['vps_id']] = (count + 1, size + snapshot['image_bytes'] + snapshot['stored_bytes'])
+            top = sorted(per_vps.items(), key=lambda item: item[1][1], reverse=True)[:15]
+            if top:
+                embed.add_field(
+                    name="Largest",
+                    value="\n".join(f"{vps}: {count} snapshot(s), {format_size(size)}" for vps, (count, size) in top),
+                    inline=False
+                )
+            embed.add_field(name="Total", value=usage, inline=False)
+        await ctx.send(embed=embed, ephemeral=True)
+    except Exception as e:
+        logger.error(f"Error in snapshot_list: {e}")
+        await ctx.send(f"❌ Error: {str(e)}", ephemeral=True)
+
+@bot.hybrid_command(name='snapshot_restore', description='Roll a VPS back to a snapshot')
+@app_commands.describe(
+    vps_id="ID of the VPS to restore",
+    snapshot_id="ID of the snapshot, see /snapshot_list"
+)
+async def snapshot_restore(ctx, vps_id: str, snapshot_id: str):
+    """Replace a VPS's filesystem and data volume with a snapshot"""
+    try:
+        token, vps = await bot.db.get_vps_by_id(vps_id)
+        if not vps or (vps["created_by"] != str(ctx.author.id) and not has_admin_role(ctx)):
+            await ctx.send("❌ VPS not found or you don't have access to it!", ephemeral=True)
+            return
+
+        snapshot = await bot.db.get_snapshot(snapshot_id)
+        if not snapshot or snapshot['vps_id'] != vps_id:
+            await ctx.send("❌ Snapshot not found for this VPS!", ephemeral=True)
+            return
+        if vps['status'] == 'suspended':
+            await ctx.send("❌ This VPS is suspended. Contact admin to unsuspend.", ephemeral=True)
+            return
+        node = vps.get('node') or PRIMARY_NODE
+        if snapshot['node'] != node:
+            await ctx.send(f"❌ Snapshot {snapshot_id} was taken on {snapshot['node']}, but the VPS now runs on {node}", ephemeral=True)
+            return
+        if bot.nodes.nodes.get(node) not in bot.nodes.online():
+            await ctx.send(f"❌ Node {node} is offline, try again later", ephemeral=True)
+            return
+        if not os.path.exists(snapshot_blob_path(snapshot['volume_blob'])):
+            await ctx.send(f"❌ The volume archive of snapshot {snapshot_id} is missing", ephemeral=True)
+            return
+
+        params = {
+            'old_container_id': vps['container_id'],
+            'memory': vps['memory'],
+            'cpu': vps['cpu'],
+            'snapshot': snapshot
+        }
+        job_id = await bot.jobs.submit('restore', vps_id, params, ctx.author.id, ctx.channel.id)
+        await ctx.send(
+            f"⏪ Restoring VPS {vps_id} to snapshot `{snapshot_id}` from {snapshot['created_at'][:16]} as job `{job_id}`. "
+            "Changes made since then will be lost.", ephemeral=True
+        )
+    except Exception as e:
+        logger.error(f"Error in snapshot_restore: {e}")
+        await ctx.send(f"❌ Error: {str(e)}", ephemeral=True)
+
+@bot.hybrid_command(name='snapshot_retention', description='Set how many snapshots a VPS keeps (Admin only)')
+@app_commands.describe(
+    vps_id="ID of the VPS",
+    keep="Number of snapshots to keep, 0 for the default"
+)
+async def snapshot_retention(ctx, vps_id: str, keep: int):
+    """Set a VPS's snapshot retention (Admin only)"""
+    if not has_admin_role(ctx):
+        await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
+        return
+
+    try:
+        token, vps = await bot.db.get_vps_by_id(vps_id)
+        if not vps:
+            await ctx.send("❌ VPS not found!", ephemeral=True)
+            return
+        if keep < 0:
+            await ctx.send("❌ Retention cannot be negative!", ephemeral=True)
+            return
+
+        await bot.db.update_vps(token, {'snapshot_retention': keep or None})
+        await ctx.send(f"✅ VPS {vps_id} keeps its {keep or SNAPSHOT_RETENTION} newest snapshots, applied at the next snapshot")
+    except Exception as e:
+        logger.error(f"Error in snapshot_retention: {e}")
+        await ctx.send(f"❌ Error: {str(e)}", ephemeral=True)
+
 @bot.hybrid_command(name='emergency_stop', description='Force stop a problematic VPS (Admin only)')
 @app_commands.describe(
     vps_id="ID of the VPS to stop"
@@ -1738,13 +4522,13 @@ async def emergency_stop(ctx, vps_id: str):
         return
 
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps:
             await ctx.send("❌ VPS not found!", ephemeral=True)
             return
 
         try:
-            container = bot.docker_client.containers.get(vps["container_id"])
+            container = await bot.docker.get(vps["container_id"])
             if container.status != "running":
                 await ctx.send("VPS is already stopped!", ephemeral=True)
                 return
@@ -1753,8 +4537,8 @@ async def emergency_stop(ctx, vps_id: str):
             
             # Try normal stop first
             try:
-                container.stop(timeout=10)
-                bot.db.update_vps(token, {'status': 'stopped'})
+                await bot.docker.stop(container, timeout=10)
+                await bot.db.update_vps(token, {'status': 'stopped'})
                 await ctx.send("✅ VPS stopped successfully!", ephemeral=True)
                 return
             except:
@@ -1762,10 +4546,10 @@ async def emergency_stop(ctx, vps_id: str):
             
             # If normal stop failed, try killing the container
             try:
-                subprocess.run(["docker", "kill", vps["container_id"]], check=True)
-                bot.db.update_vps(token, {'status': 'stopped'})
+                await bot.docker.kill(container)
+                await bot.db.update_vps(token, {'status': 'stopped'})
                 await ctx.send("✅ VPS killed forcefully!", ephemeral=True)
-            except subprocess.CalledProcessError as e:
+            except docker.errors.APIError as e:
                 raise Exception(f"Failed to kill container: {e}")
             
         except Exception as e:
@@ -1785,27 +4569,36 @@ async def emergency_remove(ctx, vps_id: str):
         return
 
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps:
             await ctx.send("❌ VPS not found!", ephemeral=True)
             return
 
         try:
-            # First try to stop the container normally
-            try:
-                container = bot.docker_client.containers.get(vps["container_id"])
-                container.stop()
-            except:
-                pass
-            
-            # Then try to remove it forcefully
+            # Only a container that is already gone may leave its record behind; any other error
+            # aborts before the record is removed, or the container would be orphaned
             try:
-                subprocess.run(["docker", "rm", "-f", vps["container_id"]], check=True)
-            except subprocess.CalledProcessError as e:
-                raise Exception(f"Failed to remove container: {e}")
+                container = await bot.docker.get(vps["container_id"])
+            except docker.errors.NotFound:
+                container = None
+
+            if container:
+                # First try to stop the container normally
+                try:
+                    await bot.docker.stop(container)
+                except docker.errors.APIError as e:
+                    logger.warning(f"Could not stop container of VPS {vps_id}, removing it anyway: {e}")
+
+                # Then remove it forcefully
+                try:
+                    await bot.docker.remove(container, force=True)
+                except docker.errors.NotFound:
+                    pass
+                except docker.errors.APIError as e:
+                    raise Exception(f"Failed to remove container: {e}")
             
             # Remove from data
-            bot.db.remove_vps(token)
+            await bot.db.remove_vps(token)
             
             await ctx.send("✅ VPS removed forcefully!", ephemeral=True)
         except Exception as e:
@@ -1825,7 +4618,7 @@ async def suspend_vps(ctx, vps_id: str):
         return
 
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps:
             await ctx.send("❌ VPS not found!", ephemeral=True)
             return
@@ -1835,12 +4628,12 @@ async def suspend_vps(ctx, vps_id: str):
             return
 
         try:
-            container = bot.docker_client.containers.get(vps["container_id"])
-            container.stop()
+            container = await bot.docker.get(vps["container_id"])
+            await bot.docker.stop(container)
         except Exception as e:
             logger.error(f"Error stopping container for suspend: {e}")
 
-        bot.db.update_vps(token, {'status': 'suspended'})
+        await bot.db.update_vps(token, {'status': 'suspended'})
         await ctx.send(f"✅ VPS {vps_id} has been suspended!")
 
         # Notify owner
@@ -1865,7 +4658,7 @@ async def unsuspend_vps(ctx, vps_id: str):
         return
 
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps:
             await ctx.send("❌ VPS not found!", ephemeral=True)
             return
@@ -1875,14 +4668,14 @@ async def unsuspend_vps(ctx, vps_id: str):
             return
 
         try:
-            container = bot.docker_client.containers.get(vps["container_id"])
-            container.start()
+            container = await bot.docker.get(vps["container_id"])
+            await bot.docker.start(container)
         except Exception as e:
             logger.error(f"Error starting container for unsuspend: {e}")
             await ctx.send(f"❌ Error starting container: {str(e)}")
             return
 
-        bot.db.update_vps(token, {'status': 'running'})
+        await bot.db.update_vps(token, {'status': 'running'})
         await ctx.send(f"✅ VPS {vps_id} has been unsuspended!")
 
         # Notify owner
@@ -1914,7 +4707,7 @@ async def edit_vps(ctx, vps_id: str, memory: Optional[int] = None, cpu: Optional
         return
 
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps:
             await ctx.send("❌ VPS not found!", ephemeral=True)
             return
@@ -1936,51 +4729,38 @@ async def edit_vps(ctx, vps_id: str, memory: Optional[int] = None, cpu: Optional
                 return
             updates['disk'] = disk
 
-        # Restart container with new limits
-        try:
-            container = bot.docker_client.containers.get(vps["container_id"])
-            container.stop()
-            container.remove()
-
-            memory_bytes = (memory or vps['memory']) * 1024 * 1024 * 1024
-            cpu_quota = int((cpu or vps['cpu']) * 100000)
-
-            new_container = bot.docker_client.containers.run(
-                vps['os_image'],
-                detach=True,
-                privileged=True,
-                hostname=f"unixnodes-{vps_id}",
-                mem_limit=memory_bytes,
-                cpu_period=100000,
-                cpu_quota=cpu_quota,
-                cap_add=["ALL"],
-                command="tail -f /dev/null",
-                tty=True,
-                network=DOCKER_NETWORK,
-                volumes={
-                    f'unixnodes-{vps_id}': {'bind': '/data', 'mode': 'rw'}
-                },
-                restart_policy={"Name": "always"}
-            )
-
-            updates['container_id'] = new_container.id
-            await asyncio.sleep(5)
-            setup_success, _, _ = await setup_container(
-                new_container.id, 
-                ctx, 
-                memory or vps['memory'], 
-                vps['username'], 
-                vps_id=vps_id,
-                use_custom_image=vps['use_custom_image']
-            )
-            if not setup_success:
-                raise Exception("Failed to setup new container")
-        except Exception as e:
-            await ctx.send(f"❌ Error updating container: {str(e)}")
+        # Only growth needs admitting; the current size is already on the ledger
+        growth = {resource: max(updates.get(resource, vps[resource]) - vps[resource], 0) for resource in CapacityLedger.RESOURCES}
+        reservation = f"edit-{vps_id}"
+        node = bot.nodes.nodes.get(vps.get('node') or PRIMARY_NODE)
+        if node not in bot.nodes.online():
+            await ctx.send(f"❌ Node {vps.get('node') or PRIMARY_NODE} of this VPS is not available right now", ephemeral=True)
+            return
+        _, refusal = await bot.capacity.place(reservation, growth, node=node)
+        if refusal:
+            await ctx.send(f"❌ {refusal}", ephemeral=True)
             return
 
-        bot.db.update_vps(token, updates)
-        await ctx.send(f"✅ VPS {vps_id} specifications updated successfully!")
+        # Recreate the container with the new limits
+        params = {
+            'old_container_id': vps["container_id"],
+            'memory': updates.get('memory', vps['memory']),
+            'cpu': updates.get('cpu', vps['cpu']),
+            'disk': updates.get('disk', vps['disk']),
+            'username': vps['username'],
+            'root_password': vps['root_password'],
+            'os_image': vps['os_image'],
+            'use_custom_image': bool(vps['use_custom_image']),
+            'node': node.name,
+            'reservation': reservation,
+            'reserved': growth
+        }
+        try:
+            job_id = await bot.jobs.submit('edit', vps_id, params, ctx.author.id, ctx.channel.id)
+        except Exception:
+            bot.capacity.release(reservation)
+            raise
+        await ctx.send(f"🔧 Update of VPS {vps_id} queued as job `{job_id}`.")
 
     except Exception as e:
         logger.error(f"Error in edit_vps: {e}")
@@ -1996,7 +4776,7 @@ async def ban_user(ctx, user: discord.User):
         await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
         return
 
-    bot.db.ban_user(user.id)
+    await bot.db.ban_user(user.id)
     await ctx.send(f"✅ {user.mention} has been banned from creating VPS!")
 
 @bot.hybrid_command(name='unban_user', description='Unban a user (Admin only)')
@@ -2009,7 +4789,7 @@ async def unban_user(ctx, user: discord.User):
         await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
         return
 
-    bot.db.unban_user(user.id)
+    await bot.db.unban_user(user.id)
     await ctx.send(f"✅ {user.mention} has been unbanned!")
 
 @bot.hybrid_command(name='list_banned', description='List banned users (Admin only)')
@@ -2019,7 +4799,7 @@ async def list_banned(ctx):
         await ctx.send("❌ You must be an admin to use this command!", ephemeral=True)
         return
 
-    banned = bot.db.get_banned_users()
+    banned = await bot.db.get_banned_users()
     if not banned:
         await ctx.send("No banned users.", ephemeral=True)
         return
@@ -2043,10 +4823,9 @@ async def backup_data(ctx):
         return
 
     try:
-        if bot.db.backup_data():
-            await ctx.send("✅ Data backup completed successfully!", ephemeral=True)
-        else:
-            await ctx.send("❌ Failed to backup data!", ephemeral=True)
+        path = await bot.db.backup_data()
+        size_kb = os.path.getsize(path) / 1024
+        await ctx.send(f"✅ Data backup completed successfully! `{os.path.basename(path)}` ({size_kb:.1f}KB)", ephemeral=True)
     except Exception as e:
         logger.error(f"Error in backup_data: {e}")
         await ctx.send(f"❌ Error backing up data: {str(e)}", ephemeral=True)
@@ -2059,8 +4838,9 @@ async def restore_data(ctx):
         return
 
     try:
-        if bot.db.restore_data():
-            await ctx.send("✅ Data restore completed successfully!", ephemeral=True)
+        backups = await bot.db.list_backups()
+        if backups and await bot.db.restore_data(backups[-1]):
+            await ctx.send(f"✅ Data restore completed successfully from `{os.path.basename(backups[-1])}`!", ephemeral=True)
         else:
             await ctx.send("❌ Failed to restore data!", ephemeral=True)
     except Exception as e:
@@ -2131,9 +4911,9 @@ class VPSManagementView(ui.View):
         self.original_message = None
 
     async def handle_missing_container(self, interaction: discord.Interaction):
-        token, _ = bot.db.get_vps_by_id(self.vps_id)
+        token, _ = await bot.db.get_vps_by_id(self.vps_id)
         if token:
-            bot.db.remove_vps(token)
+            await bot.db.remove_vps(token)
         
         embed = discord.Embed(title=f"UnixNodes VPS Management - {self.vps_id}", color=discord.Color.red())
         embed.add_field(name="Status", value="🔴 Container Not Found", inline=True)
@@ -2151,12 +4931,12 @@ class VPSManagementView(ui.View):
             await interaction.response.defer(ephemeral=True)
             
             try:
-                container = bot.docker_client.containers.get(self.container_id)
+                container = await bot.docker.get(self.container_id)
             except docker.errors.NotFound:
                 await self.handle_missing_container(interaction)
                 return
             
-            token, vps = bot.db.get_vps_by_id(self.vps_id)
+            token, vps = await bot.db.get_vps_by_id(self.vps_id)
             if vps['status'] == 'suspended':
                 await interaction.followup.send("❌ This VPS is suspended. Contact admin to unsuspend.", ephemeral=True)
                 return
@@ -2165,11 +4945,11 @@ class VPSManagementView(ui.View):
                 await interaction.followup.send("VPS is already running!", ephemeral=True)
                 return
             
-            container.start()
-            await asyncio.sleep(5)
+            await bot.docker.start(container)
+            await wait_for_container_ready(self.container_id)
             
             if token:
-                bot.db.update_vps(token, {'status': 'running'})
+                await bot.db.update_vps(token, {'status': 'running'})
             
             embed = discord.Embed(title=f"UnixNodes VPS Management - {self.vps_id}", color=discord.Color.green())
             embed.add_field(name="Status", value="🟢 Running", inline=True)
@@ -2192,7 +4972,7 @@ class VPSManagementView(ui.View):
             await interaction.response.defer(ephemeral=True)
             
             try:
-                container = bot.docker_client.containers.get(self.container_id)
+                container = await bot.docker.get(self.container_id)
             except docker.errors.NotFound:
                 await self.handle_missing_container(interaction)
                 return
@@ -2201,11 +4981,11 @@ class VPSManagementView(ui.View):
                 await interaction.followup.send("VPS is already stopped!", ephemeral=True)
                 return
             
-            container.stop()
+            await bot.docker.stop(container)
             
-            token, vps = bot.db.get_vps_by_id(self.vps_id)
+            token, vps = await bot.db.get_vps_by_id(self.vps_id)
             if token:
-                bot.db.update_vps(token, {'status': 'stopped'})
+                await bot.db.update_vps(token, {'status': 'stopped'})
             
             embed = discord.Emembed(title=f"UnixNodes VPS Management - {self.vps_id}", color=discord.Color.orange())
             embed.add_field(name="Status", value="🔴 Stopped", inline=True)
@@ -2228,18 +5008,18 @@ class VPSManagementView(ui.View):
             await interaction.response.defer(ephemeral=True)
             
             try:
-                container = bot.docker_client.containers.get(self.container_id)
+                container = await bot.docker.get(self.container_id)
             except docker.errors.NotFound:
                 await self.handle_missing_container(interaction)
                 return
             
-            token, vps = bot.db.get_vps_by_id(self.vps_id)
+            token, vps = await bot.db.get_vps_by_id(self.vps_id)
             if vps['status'] == 'suspended':
                 await interaction.followup.send("❌ This VPS is suspended. Contact admin to unsuspend.", ephemeral=True)
                 return
 
-            container.restart()
-            await asyncio.sleep(5)
+            await bot.docker.restart(container)
+            await wait_for_container_ready(self.container_id)
             
             # Update restart count in VPS data
             if token:
@@ -2248,21 +5028,21 @@ class VPSManagementView(ui.View):
                     'last_restart': str(datetime.datetime.now()),
                     'status': 'running'
                 }
-                bot.db.update_vps(token, updates)
+                await bot.db.update_vps(token, updates)
                 
-                bot.db.increment_stat('total_restarts')
+                await bot.db.increment_stat('total_restarts')
                 
                 # Get new SSH session
                 try:
-                    exec_cmd = await asyncio.create_subprocess_exec(
-                        "docker", "exec", self.container_id, "tmate", "-F",
+                    exec_cmd = await docker_cli(
+                        "exec", self.container_id, "tmate", "-F",
                         stdout=asyncio.subprocess.PIPE,
                         stderr=asyncio.subprocess.PIPE
                     )
 
                     ssh_session_line = await capture_ssh_session_line(exec_cmd)
                     if ssh_session_line:
-                        bot.db.update_vps(token, {'tmate_session': ssh_session_line})
+                        await bot.db.update_vps(token, {'tmate_session': ssh_session_line})
                         
                         # Send new SSH details to owner
                         try:
@@ -2295,7 +5075,7 @@ class VPSManagementView(ui.View):
     async def reinstall_os(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
             try:
-                container = bot.docker_client.containers.get(self.container_id)
+                container = await bot.docker.get(self.container_id)
             except docker.errors.NotFound:
                 await self.handle_missing_container(interaction)
                 return
@@ -2335,109 +5115,31 @@ class OSSelectionView(ui.View):
 
     async def reinstall_os(self, interaction: discord.Interaction, image: str):
         try:
-            token, vps = bot.db.get_vps_by_id(self.vps_id)
+            token, vps = await bot.db.get_vps_by_id(self.vps_id)
             if not vps:
                 await interaction.response.send_message("❌ VPS not found!", ephemeral=True)
                 return
 
             await interaction.response.defer(ephemeral=True)
 
-            try:
-                old_container = bot.docker_client.containers.get(self.container_id)
-                old_container.stop()
-                old_container.remove()
-            except Exception as e:
-                logger.error(f"Error removing old container: {e}")
-
-            status_msg = await interaction.followup.send("🔄 Reinstalling UnixNodes VPS... This may take a few minutes.", ephemeral=True)
-            
-            memory_bytes = vps['memory'] * 1024 * 1024 * 1024
-
-            try:
-                container = bot.docker_client.containers.run(
-                    image,
-                    detach=True,
-                    privileged=True,
-                    hostname=f"unixnodes-{self.vps_id}",
-                    mem_limit=memory_bytes,
-                    cpu_period=100000,
-                    cpu_quota=int(vps['cpu'] * 100000),
-                    cap_add=["ALL"],
-                    command="tail -f /dev/null",
-                    tty=True,
-                    network=DOCKER_NETWORK,
-                    volumes={
-                        f'unixnodes-{self.vps_id}': {'bind': '/data', 'mode': 'rw'}
-                    }
-                )
-            except docker.errors.ImageNotFound:
-                await status_msg.edit(content=f"❌ OS image {image} not found. Using default {DEFAULT_OS_IMAGE}")
-                container = bot.docker_client.containers.run(
-                    DEFAULT_OS_IMAGE,
-                    detach=True,
-                    privileged=True,
-                    hostname=f"unixnodes-{self.vps_id}",
-                    mem_limit=memory_bytes,
-                    cpu_period=100000,
-                    cpu_quota=int(vps['cpu'] * 100000),
-                    cap_add=["ALL"],
-                    command="tail -f /dev/null",
-                    tty=True,
-                    network=DOCKER_NETWORK,
-                    volumes={
-                        f'unixnodes-{self.vps_id}': {'bind': '/data', 'mode': 'rw'}
-                    }
-                )
-                image = DEFAULT_OS_IMAGE
-
-            bot.db.update_vps(token, {
-                'container_id': container.id,
-                'os_image': image
-            })
-
-            try:
-                setup_success, ssh_password, _ = await setup_container(
-                    container.id, 
-                    status_msg, 
-                    vps['memory'], 
-                    vps['username'], 
-                    vps_id=self.vps_id
-                )
-                if not setup_success:
-                    raise Exception("Failed to setup container")
-                
-                bot.db.update_vps(token, {'password': ssh_password})
-            except Exception as e:
-                await status_msg.edit(content=f"❌ Container setup failed: {str(e)}")
-                return
-
-            try:
-                exec_cmd = await asyncio.create_subprocess_exec(
-                    "docker", "exec", container.id, "tmate", "-F",
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-
-                ssh_session_line = await capture_ssh_session_line(exec_cmd)
-                if ssh_session_line:
-                    bot.db.update_vps(token, {'tmate_session': ssh_session_line})
-                    
-                    # Send new SSH details to owner
-                    try:
-                        owner = await bot.fetch_user(int(vps["created_by"]))
-                        embed = discord.Embed(title=f"UnixNodes VPS Reinstalled - {self.vps_id}", color=discord.Color.blue())
-                        embed.add_field(name="New OS", value=image, inline=True)
-                        embed.add_field(name="New SSH Session", value=f"```{ssh_session_line}```", inline=False)
-                        embed.add_field(name="New SSH Password", value=f"||{ssh_password}||", inline=False)
-                        await owner.send(embed=embed)
-                    except:
-                        pass
-            except Exception as e:
-                logger.error(f"Warning: Failed to start tmate session: {e}")
-
-            await status_msg.edit(content="✅ UnixNodes VPS reinstalled successfully!")
-            
-            try:
+            params = {
+                'old_container_id': self.container_id,
+                'owner_id': vps["created_by"],
+                'memory': vps['memory'],
+                'cpu': vps['cpu'],
+                'disk': vps['disk'],
+                'username': vps['username'],
+                'os_image': image,
+                'use_custom_image': False,
+                'node': vps.get('node') or PRIMARY_NODE
+            }
+
+            async def reinstalled(job):
+                # The interaction token only lives for 15 minutes; after a restart the job just finishes quietly
+                if job['state'] != 'done':
+                    await interaction.followup.send(f"❌ Error reinstalling VPS: {job['error']}", ephemeral=True)
+                    return
+                await interaction.followup.send("✅ UnixNodes VPS reinstalled successfully!", ephemeral=True)
                 embed = discord.Embed(title=f"UnixNodes VPS Management - {self.vps_id}", color=discord.Color.green())
                 embed.add_field(name="Status", value="🟢 Running", inline=True)
                 embed.add_field(name="Memory", value=f"{vps['memory']}GB", inline=True)
@@ -2445,11 +5147,11 @@ class OSSelectionView(ui.View):
                 embed.add_field(name="Disk", value=f"{vps['disk']}GB", inline=True)
                 embed.add_field(name="Username", value=vps['username'], inline=True)
                 embed.add_field(name="Created", value=vps['created_at'], inline=True)
-                embed.add_field(name="OS", value=image, inline=True)
-                
-                await self.original_message.edit(embed=embed, view=VPSManagementView(self.vps_id, container.id))
-            except Exception as e:
-                logger.error(f"Warning: Failed to update original message: {e}")
+                embed.add_field(name="OS", value=job['progress']['os_image'], inline=True)
+                await self.original_message.edit(embed=embed, view=VPSManagementView(self.vps_id, job['progress']['container_id']))
+
+            job_id = await bot.jobs.submit('reinstall', self.vps_id, params, interaction.user.id, on_finish=reinstalled)
+            await interaction.followup.send(f"🔄 Reinstall queued as job `{job_id}`. Follow it with `/job_status {job_id}`.", ephemeral=True)
 
         except Exception as e:
             try:
@@ -2496,7 +5198,7 @@ class TransferVPSModal(ui.Modal, title='Transfer VPS'):
                     return
                 new_owner_id = new_owner_input
 
-            token, vps = bot.db.get_vps_by_id(self.vps_id)
+            token, vps = await bot.db.get_vps_by_id(self.vps_id)
             if not vps or vps["created_by"] != str(interaction.user.id):
                 await interaction.response.send_message("❌ VPS not found or you don't have permission to transfer it!", ephemeral=True)
                 return
@@ -2512,19 +5214,19 @@ class TransferVPSModal(ui.Modal, title='Transfer VPS'):
                 new_owner_name = new_owner.name
                 
                 # Check if new owner is banned
-                if bot.db.is_user_banned(new_owner.id):
+                if await bot.db.is_user_banned(new_owner.id):
                     await interaction.response.send_message(f"❌ {new_owner.mention} is banned!", ephemeral=True)
                     return
 
                 # Check if new owner already has max VPS
-                if bot.db.get_user_vps_count(new_owner.id) >= bot.db.get_setting('max_vps_per_user'):
-                    await interaction.response.send_message(f"❌ {new_owner.mention} already has the maximum number of VPS instances ({bot.db.get_setting('max_vps_per_user')})", ephemeral=True)
+                if await bot.db.get_user_vps_count(new_owner.id) >= await bot.db.get_setting('max_vps_per_user'):
+                    await interaction.response.send_message(f"❌ {new_owner.mention} already has the maximum number of VPS instances ({await bot.db.get_setting('max_vps_per_user')})", ephemeral=True)
                     return
             except:
                 await interaction.response.send_message("❌ Invalid user ID or mention!", ephemeral=True)
                 return
 
-            bot.db.update_vps(token, {"created_by": str(new_owner.id)})
+            await bot.db.update_vps(token, {"created_by": str(new_owner.id)})
 
             await interaction.response.send_message(f"✅ UnixNodes VPS {self.vps_id} has been transferred from {old_owner_name} to {new_owner_name}!", ephemeral=True)
             
@@ -2553,16 +5255,12 @@ class TransferVPSModal(ui.Modal, title='Transfer VPS'):
 async def manage_vps(ctx, vps_id: str):
     """Manage a VPS instance"""
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps or (vps["created_by"] != str(ctx.author.id) and not has_admin_role(ctx)):
             await ctx.send("❌ VPS not found or you don't have access to it!", ephemeral=True)
             return
 
-        try:
-            container = bot.docker_client.containers.get(vps["container_id"])
-            container_status = container.status.capitalize()
-        except:
-            container_status = "Not Found"
+        container_status = (bot.container_status(vps["container_id"]) or "Not Found").capitalize()
 
         status = vps['status'].capitalize()
 
@@ -2575,6 +5273,16 @@ async def manage_vps(ctx, vps_id: str):
         embed.add_field(name="Created", value=vps['created_at'], inline=True)
         embed.add_field(name="OS", value=vps.get('os_image', DEFAULT_OS_IMAGE), inline=True)
         embed.add_field(name="Restart Count", value=vps.get('restart_count', 0), inline=True)
+        incidents = await bot.db.get_vps_events(vps_id, limit=3)
+        if incidents:
+            embed.add_field(
+                name="Recent Incidents",
+                value="\n".join(
+                    f"{'OOM kill' if i['event'] == 'oom' else 'Unexpected exit (code %s)' % i['exit_code']} at {i['created_at'][:19]}"
+                    for i in incidents
+                ),
+                inline=False
+            )
 
         view = VPSManagementView(vps_id, vps["container_id"])
         
@@ -2592,21 +5300,21 @@ async def manage_vps(ctx, vps_id: str):
 async def transfer_vps_command(ctx, vps_id: str, new_owner: discord.Member):
     """Transfer a VPS to another user"""
     try:
-        token, vps = bot.db.get_vps_by_id(vps_id)
+        token, vps = await bot.db.get_vps_by_id(vps_id)
         if not vps or vps["created_by"] != str(ctx.author.id):
             await ctx.send("❌ VPS not found or you don't have permission to transfer it!", ephemeral=True)
             return
 
-        if bot.db.is_user_banned(new_owner.id):
+        if await bot.db.is_user_banned(new_owner.id):
             await ctx.send("❌ This user is banned!", ephemeral=True)
             return
 
         # Check if new owner already has max VPS
-        if bot.db.get_user_vps_count(new_owner.id) >= bot.db.get_setting('max_vps_per_user'):
-            await ctx.send(f"❌ {new_owner.mention} already has the maximum number of VPS instances ({bot.db.get_setting('max_vps_per_user')})", ephemeral=True)
+        if await bot.db.get_user_vps_count(new_owner.id) >= await bot.db.get_setting('max_vps_per_user'):
+            await ctx.send(f"❌ {new_owner.mention} already has the maximum number of VPS instances ({await bot.db.get_setting('max_vps_per_user')})", ephemeral=True)
             return
 
-        bot.db.update_vps(token, {"created_by": str(new_owner.id)})
+        await bot.db.update_vps(token, {"created_by": str(new_owner.id)})
 
         await ctx.send(f"✅ UnixNodes VPS {vps_id} has been transferred from {ctx.author.name} to {new_owner.name}!")
 
@@ -0,0 +1,112 @@
+import asyncio
+import importlib.util
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_bot(name, filename, workdir):
+    """Import one of the bot scripts from the repo root with `workdir` as CWD, since both
+    create their database, log and data files relative to it at import time"""
+    os.environ.setdefault('DISCORD_TOKEN', 'test-token')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
+
+
+@pytest.fixture(scope='session')
+def unixnodes(tmp_path_factory):
+    """The UnixNodes bot (bot.py)"""
+    return load_bot('unixnodes_bot', 'bot.py', tmp_path_factory.mktemp('unixnodes'))
+
+
+@pytest.fixture(scope='session')
+def chunkhost(tmp_path_factory):
+    """The ChunkHost bot (bot (2).py)"""
+    return load_bot('chunkhost_bot', 'bot (2).py', tmp_path_factory.mktemp('chunkhost'))
+
+
+@pytest.fixture
+def db(unixnodes, tmp_path, monkeypatch):
+    """A fresh UnixNodes database; the test runs in tmp_path so backups land there too"""
+    monkeypatch.chdir(tmp_path)
+    database = unixnodes.Database(str(tmp_path / 'unixnodes.db'))
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def make_vps():
+    """Build a vps_instances row; `n` keeps token, vps_id and container_id unique"""
+    def make_vps(n, **overrides):
+        vps = {
+            'token': f'token-{n}',
+            'vps_id': f'vps-{n}',
+            'container_id': f'container-{n}',
+            'memory': 2,
+            'cpu': 1,
+            'disk': 10,
+            'username': f'user{n}',
+            'password': 'password',
+            'root_password': None,
+            'created_by': str(1000 + n % 50),
+            'created_at': '2024-01-01 00:00:00',
+            'tmate_session': None,
+            'watermark': 'UnixNodes VPS',
+            'os_image': 'ubuntu:22.04',
+            'restart_count': 0,
+            'last_restart': None,
+            'status': 'running',
+            'use_custom_image': True,
+        }
+        vps.update(overrides)
+        return vps
+    return make_vps
+
+
+class FakeBot:
+    """The parts of UnixNodesBot that the job queue, node registry and capacity ledger use"""
+    def __init__(self, unixnodes, db):
+        self.db = unixnodes.AsyncDatabase(db)
+        self.container_states = {}
+        self.system_stats = {}
+        self.nodes = unixnodes.NodeRegistry(self)
+        self.docker = unixnodes.DockerCluster(self.nodes)
+        self.capacity = unixnodes.CapacityLedger(self)
+        self.jobs = unixnodes.ProvisioningJobs(self)
+        self.warm_pool = SimpleNamespace(claim=lambda image: None)
+        self.direct_messages = []
+
+    @property
+    def loop(self):
+        return asyncio.get_running_loop()
+
+    def is_closed(self):
+        return False
+
+    def get_channel(self, channel_id):
+        return None
+
+    async def fetch_user(self, user_id):
+        async def send(content=None, embed=None):
+            self.direct_messages.append((user_id, embed))
+        return SimpleNamespace(id=user_id, mention=f'<@{user_id}>', send=send)
+
+
+@pytest.fixture
+def fake_bot(unixnodes, db):
+    bot = FakeBot(unixnodes, db)
+    yield bot
+    bot.nodes.close()
+    bot.db.close()
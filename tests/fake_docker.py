@@ -0,0 +1,151 @@
+"""In-memory stand-in for the parts of the Docker SDK the bot uses"""
+import itertools
+import threading
+
+import docker
+
+_ids = itertools.count(1)
+
+
+class FakeContainer:
+    def __init__(self, client, image, labels=None, status='running', restart_policy=None, **options):
+        self.client = client
+        self.id = f'{next(_ids):064x}'
+        self.image = image
+        self.labels = dict(labels or {})
+        self.status = status
+        self.options = options
+        # What `docker top` and the stats API report for it
+        self.processes = [['root', '1', '/sbin/init']]
+        self.cpu_usage_ns = 0
+        self.attrs = {'HostConfig': {'RestartPolicy': restart_policy or {'Name': 'always'}}}
+
+    @property
+    def short_id(self):
+        return self.id[:12]
+
+    @property
+    def restart_policy(self):
+        return self.attrs['HostConfig']['RestartPolicy']['Name']
+
+    def _record(self, operation):
+        self.client.operations.append((operation, self.id))
+
+    def start(self):
+        self._record('start')
+        self.status = 'running'
+
+    def stop(self, **kwargs):
+        self._record('stop')
+        self.status = 'exited'
+
+    def restart(self, **kwargs):
+        self._record('restart')
+        self.status = 'running'
+
+    def kill(self, **kwargs):
+        self._record('kill')
+        self.status = 'exited'
+
+    def update(self, restart_policy=None, **kwargs):
+        self._record('update')
+        if restart_policy:
+            self.attrs['HostConfig']['RestartPolicy'] = restart_policy
+
+    def remove(self, force=False, **kwargs):
+        if self.status == 'running' and not force:
+            raise docker.errors.APIError(f'container {self.short_id} is running')
+        self._record('remove')
+        self.client.containers.by_id.pop(self.id, None)
+
+    def reload(self):
+        pass
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+        self.by_id = {}
+        self.lock = threading.Lock()
+
+    def add(self, image='ubuntu:22.04', **kwargs):
+        container = FakeContainer(self.client, image, **kwargs)
+        with self.lock:
+            self.by_id[container.id] = container
+        return container
+
+    def get(self, container_id):
+        with self.lock:
+            for container in self.by_id.values():
+                if container.id.startswith(container_id):
+                    return container
+        raise docker.errors.NotFound(f'No such container: {container_id}')
+
+    def list(self, all=False, filters=None, **kwargs):
+        with self.lock:
+            containers = list(self.by_id.values())
+        if not all:
+            containers = [c for c in containers if c.status == 'running']
+        label = (filters or {}).get('label')
+        if label:
+            key, _, value = label.partition('=')
+            containers = [c for c in containers if key in c.labels and (not value or c.labels[key] == value)]
+        return containers
+
+    def run(self, image, detach=True, labels=None, restart_policy=None, **kwargs):
+        self.client.operations.append(('run', image))
+        return self.add(image, labels=labels, restart_policy=restart_policy, **kwargs)
+
+
+class FakeAPIClient:
+    """The low-level client behind FakeDockerClient.api"""
+    def __init__(self, client):
+        self.client = client
+
+    def top(self, container_id):
+        container = self.client.containers.get(container_id)
+        return {'Titles': ['UID', 'PID', 'CMD'], 'Processes': container.processes}
+
+    def stats(self, container_id, stream=True):
+        container = self.client.containers.get(container_id)
+        return {'cpu_stats': {'cpu_usage': {'total_usage': container.cpu_usage_ns}}}
+
+
+class FakeDockerClient:
+    def __init__(self, memory_gb=16, cpus=8):
+        self.containers = FakeContainers(self)
+        self.api = FakeAPIClient(self)
+        self.memory_gb = memory_gb
+        self.cpus = cpus
+        self.operations = []
+        self.healthy = True
+
+    def info(self):
+        if not self.healthy:
+            raise docker.errors.APIError('daemon unreachable')
+        running = sum(1 for c in self.containers.by_id.values() if c.status == 'running')
+        return {
+            'MemTotal': self.memory_gb * 1024 ** 3,
+            'NCPU': self.cpus,
+            'Containers': len(self.containers.by_id),
+            'ContainersRunning': running,
+            'ServerVersion': 'fake'
+        }
+
+    def close(self):
+        pass
+
+
+class FakeNodeMixin:
+    """DockerNode whose connect() opens a FakeDockerClient instead of a real daemon"""
+    def connect(self):
+        self.client = self.fake_client
+        self.docker = self.async_client(self.fake_client)
+
+
+def fake_node(unixnodes, name, client=None, **kwargs):
+    """A DockerNode of the given bot module backed by `client` (a new FakeDockerClient by default)"""
+    node_class = type('FakeDockerNode', (FakeNodeMixin, unixnodes.DockerNode), {'async_client': unixnodes.AsyncDockerClient})
+    node = node_class(name, **kwargs)
+    node.fake_client = client or FakeDockerClient()
+    return node
@@ -0,0 +1,109 @@
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+ALICE = SimpleNamespace(name='alice', id=1)
+BOB = SimpleNamespace(name='bob', id=2)
+
+
+@pytest.fixture
+def new_log(chunkhost, tmp_path, monkeypatch):
+    """Open an activity log in tmp_path; opening it again simulates a restart"""
+    monkeypatch.setattr(chunkhost.ActivityLog, 'LEGACY_FILE', str(tmp_path / 'vps_logs.json'))
+
+    def new_log(ring_size=100):
+        return chunkhost.ActivityLog(str(tmp_path / 'activity_log'), ring_size)
+    return new_log
+
+
+def actions(entries):
+    return [entry['details'] for entry in entries]
+
+
+def test_query_filters(new_log):
+    log = new_log()
+    log.record('Deploy', ALICE, 'a1', vps_id='vps-1')
+    log.record('Renew', ALICE, 'a2', vps_id='vps-1')
+    log.record('Deploy', BOB, 'b1', vps_id='vps-2')
+    log.record('Stop', BOB, 'b2', vps_id='vps-1')
+    log.record('Points', 'system', 's1')
+
+    assert actions(log.query(10)) == ['s1', 'b2', 'b1', 'a2', 'a1']
+    assert actions(log.query(2)) == ['s1', 'b2']
+    assert actions(log.query(10, vps_id='vps-1')) == ['b2', 'a2', 'a1']
+    assert actions(log.query(10, user_id=2)) == ['b2', 'b1']
+    assert actions(log.query(10, action='deploy')) == ['b1', 'a1']
+    assert actions(log.query(10, vps_id='vps-1', user_id='1', action='RENEW')) == ['a2']
+    assert actions(log.query(10, vps_id='vps-1', action='deploy')) == ['a1']
+    assert log.query(10, vps_id='vps-9') == []
+
+
+def test_ring_eviction_updates_the_indexes(new_log):
+    log = new_log(ring_size=3)
+    for n in range(5):
+        log.record('Deploy' if n % 2 else 'Renew', ALICE, f'e{n}', vps_id=f'vps-{n % 2}')
+
+    assert actions(log.query(10)) == ['e4', 'e3', 'e2']
+    assert actions(log.query(10, vps_id='vps-1')) == ['e3']
+    assert actions(log.query(10, action='renew')) == ['e4', 'e2']
+    assert sum(len(seqs) for seqs in log.indexes['vps_id'].values()) == 3
+
+
+def test_reloads_recent_entries_from_segments(new_log):
+    log = new_log()
+    for n in range(5):
+        log.record('Deploy', ALICE, f'e{n}', vps_id=f'vps-{n}')
+
+    reopened = new_log(ring_size=3)
+    assert actions(reopened.query(10)) == ['e4', 'e3', 'e2']
+    reopened.record('Stop', BOB, 'e5', vps_id='vps-4')
+    assert actions(reopened.query(10, vps_id='vps-4')) == ['e5', 'e4']
+    # The last segment is appended to rather than replaced
+    assert len(reopened.segment_paths()) == 1
+
+
+def test_segments_rotate_by_size(chunkhost, new_log, monkeypatch):
+    monkeypatch.setattr(chunkhost, 'ACTIVITY_SEGMENT_BYTES', 1_000)
+    log = new_log()
+    for n in range(40):
+        log.record('Deploy', ALICE, 'x' * 50, vps_id=f'vps-{n}')
+
+    paths = log.segment_paths()
+    assert len(paths) > 3
+    assert all(os.path.getsize(path) <= 1_000 for path in paths)
+    assert sum(len(log.read_segment(path)) for path in paths) == 40
+
+
+def test_retention_by_size_and_age(chunkhost, new_log, monkeypatch):
+    monkeypatch.setattr(chunkhost, 'ACTIVITY_SEGMENT_BYTES', 1_000)
+    monkeypatch.setattr(chunkhost, 'ACTIVITY_LOG_MAX_BYTES', 3_000)
+    log = new_log()
+    for n in range(100):
+        log.record('Deploy', ALICE, 'x' * 50, vps_id=f'vps-{n}')
+    paths = log.segment_paths()
+    # Retention runs on rotation, so only the segment being written can take the total past the limit
+    assert sum(os.path.getsize(path) for path in paths[:-1]) <= 3_000
+    # The newest entries survive
+    assert log.read_segment(paths[-1])[-1]['vps_id'] == 'vps-99'
+
+    monkeypatch.setattr(chunkhost, 'ACTIVITY_LOG_MAX_BYTES', 10 ** 9)
+    old = time.time() - (chunkhost.ACTIVITY_LOG_MAX_DAYS + 1) * 86400
+    for path in paths[:-1]:
+        os.utime(path, (old, old))
+    log.rotate()
+    assert log.segment_paths() == paths[-1:] + [log.segment_path]
+
+
+def test_imports_the_legacy_file(chunkhost, new_log):
+    legacy = [{'timestamp': '2024-01-01T00:00:00', 'action': 'Deploy', 'user': 'alice', 'user_id': '1',
+               'details': 'old', 'vps_id': 'vps-1'}]
+    with open(chunkhost.ActivityLog.LEGACY_FILE, 'w') as f:
+        json.dump(legacy, f)
+
+    log = new_log()
+    assert log.query(10, vps_id='vps-1') == legacy
+    assert not os.path.exists(chunkhost.ActivityLog.LEGACY_FILE)
+    assert os.path.exists(chunkhost.ActivityLog.LEGACY_FILE + '.imported')
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+
+# Discord drops an interaction that is not acknowledged within three seconds
+ACK_DEADLINE = 3.0
+
+
+@pytest.fixture
+def adb(unixnodes, db):
+    database = unixnodes.AsyncDatabase(db)
+    yield database
+    database.close()
+
+
+def test_write_burst_does_not_delay_acknowledgements(adb, make_vps):
+    async def interaction(vps_id):
+        """What a command does before it can defer: an index lookup and a setting read"""
+        started = time.perf_counter()
+        await adb.get_vps_by_id(vps_id)
+        await adb.get_setting('max_containers')
+        return time.perf_counter() - started
+
+    async def scenario():
+        loop_lag = 0.0
+        burst = asyncio.ensure_future(asyncio.gather(*(
+            write for n in range(1_000)
+            for write in (adb.add_vps(make_vps(n)), adb.update_vps(f'token-{n}', {'status': 'stopped'}))
+        )))
+        acks = []
+        while not burst.done():
+            acks.append(await interaction(f'vps-{len(acks)}'))
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            loop_lag = max(loop_lag, time.perf_counter() - started - 0.005)
+        await burst
+        return acks, loop_lag
+
+    acks, loop_lag = asyncio.run(scenario())
+
+    print(f"{len(acks)} interactions during the burst, slowest ack {max(acks) * 1000:.1f} ms, loop lag {loop_lag * 1000:.1f} ms")
+    assert len(acks) > 1
+    assert max(acks) < ACK_DEADLINE
+    assert loop_lag < 0.1
+    assert adb.sync.query("SELECT COUNT(*) FROM vps_instances WHERE status = 'stopped'").fetchone()[0] == 1_000
+
+
+def test_writes_keep_their_order(adb, make_vps):
+    async def scenario():
+        await asyncio.gather(
+            adb.add_vps(make_vps(1)),
+            *(adb.update_vps('token-1', {'restart_count': n}) for n in range(1, 51))
+        )
+        return await adb.get_vps_by_token('token-1')
+
+    assert asyncio.run(scenario())['restart_count'] == 50
+
+
+def test_buffered_counters_are_visible_and_flushed(adb):
+    async def scenario():
+        for _ in range(5):
+            await adb.increment_stat('restarts')
+        before_flush = await adb.get_stat('restarts'), adb.sync.get_stat('restarts')
+        await adb.flush_stats()
+        return before_flush, adb.sync.get_stat('restarts')
+
+    assert asyncio.run(scenario()) == ((5, 0), 5)
+
+
+def test_close_writes_buffered_counters(unixnodes, db):
+    adb = unixnodes.AsyncDatabase(db)
+    asyncio.run(adb.increment_stat('restarts', 3))
+    adb.close()
+    assert db.get_stat('restarts') == 3
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import docker
+import pytest
+
+from fake_docker import fake_node
+
+
+class SlowContainer:
+    """Stands in for a container whose stop() blocks through the 10s grace period"""
+    def __init__(self, delay):
+        self.delay = delay
+        self.stopped = threading.Event()
+
+    def stop(self, timeout=10):
+        time.sleep(self.delay)
+        self.stopped.set()
+
+
+def fake_client(container):
+    containers = SimpleNamespace(get=lambda container_id: container, list=lambda **kwargs: [container])
+    return SimpleNamespace(containers=containers, close=lambda: None)
+
+
+async def heartbeat_lag(until, interval=0.01):
+    """Worst delay between an asyncio.sleep(interval) deadline and the loop waking up"""
+    worst = 0.0
+    while not until.done():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+def test_slow_stop_does_not_stall_other_commands(unixnodes):
+    container = SlowContainer(delay=1.0)
+    client = unixnodes.AsyncDockerClient(fake_client(container), max_workers=4)
+
+    async def scenario():
+        stop = asyncio.ensure_future(client.stop(container))
+        lag = asyncio.ensure_future(heartbeat_lag(stop))
+        await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        assert await client.get('vps') is container
+        assert await client.list(all=True) == [container]
+        other_latency = time.perf_counter() - started
+
+        assert not container.stopped.is_set()
+        await stop
+        return other_latency, await lag
+
+    try:
+        other_latency, lag = asyncio.run(scenario())
+    finally:
+        client.close()
+
+    assert container.stopped.is_set()
+    assert other_latency < 0.2
+    assert lag < 0.1
+
+
+def test_executor_is_bounded(unixnodes):
+    client = unixnodes.AsyncDockerClient(fake_client(None), max_workers=2)
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+
+    async def scenario():
+        await asyncio.gather(*(client.call(work) for _ in range(8)))
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        client.close()
+    assert peak == 2
+
+
+@pytest.fixture
+def admin_ctx(unixnodes, monkeypatch):
+    monkeypatch.setattr(unixnodes, 'ADMIN_IDS', {1})
+    replies = []
+
+    async def send(content=None, **kwargs):
+        replies.append(content)
+
+    return SimpleNamespace(author=SimpleNamespace(id=1, roles=[]), send=send, replies=replies)
+
+
+@pytest.fixture
+def node_client(unixnodes, fake_bot, monkeypatch):
+    node = asyncio.run(fake_bot.nodes.add(fake_node(unixnodes, unixnodes.PRIMARY_NODE)))
+    monkeypatch.setattr(unixnodes.bot, 'db', fake_bot.db, raising=False)
+    monkeypatch.setattr(unixnodes.bot, 'docker', fake_bot.docker, raising=False)
+    return node.fake_client
+
+
+def test_emergency_remove_removes_container_and_record(unixnodes, fake_bot, node_client, admin_ctx, make_vps):
+    container = node_client.containers.add()
+    fake_bot.db.sync.add_vps(make_vps(1, container_id=container.id))
+
+    asyncio.run(unixnodes.emergency_remove.callback(admin_ctx, 'vps-1'))
+
+    assert admin_ctx.replies == ['✅ VPS removed forcefully!']
+    assert node_client.containers.by_id == {}
+    assert fake_bot.db.sync.get_vps_by_id('vps-1') == (None, None)
+
+
+def test_emergency_remove_drops_the_record_of_a_vanished_container(unixnodes, fake_bot, node_client, admin_ctx, make_vps):
+    fake_bot.db.sync.add_vps(make_vps(1, container_id='gone'))
+    asyncio.run(unixnodes.emergency_remove.callback(admin_ctx, 'vps-1'))
+    assert admin_ctx.replies == ['✅ VPS removed forcefully!']
+    assert fake_bot.db.sync.get_vps_by_id('vps-1') == (None, None)
+
+
+def test_emergency_remove_keeps_the_record_when_docker_fails(unixnodes, fake_bot, node_client, admin_ctx, make_vps):
+    container = node_client.containers.add()
+    fake_bot.db.sync.add_vps(make_vps(1, container_id=container.id))
+
+    def unreachable(container_id):
+        raise docker.errors.APIError('daemon unreachable')
+
+    node_client.containers.get = unreachable
+    asyncio.run(unixnodes.emergency_remove.callback(admin_ctx, 'vps-1'))
+
+    assert admin_ctx.replies == ['❌ Error removing VPS: daemon unreachable']
+    assert container.id in node_client.containers.by_id
+    assert fake_bot.db.sync.get_vps_by_id('vps-1')[0] == 'token-1'
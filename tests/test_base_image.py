@@ -0,0 +1,153 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# Fake Docker timings, scaled down from minutes for a build to about a second for a docker exec
+FAKE_BUILD_SECONDS = 0.05
+FAKE_EXEC_SECONDS = 0.002
+
+
+class FakeImages:
+    def __init__(self, errors, cached=()):
+        self.errors = errors
+        self.cached = set(cached)
+
+    def get(self, tag):
+        if tag not in self.cached:
+            raise self.errors.ImageNotFound(tag)
+        return tag
+
+
+class FakeCall:
+    async def call(self, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+
+class FakeCluster(FakeCall):
+    def __init__(self, images):
+        self.target = SimpleNamespace(name='local', docker=FakeCall(), client=SimpleNamespace(images=images))
+
+    def node(self, name=None):
+        return self.target
+
+
+@pytest.fixture
+def images(unixnodes, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    images = FakeImages(unixnodes.docker.errors)
+    monkeypatch.setattr(unixnodes.bot, 'docker', FakeCluster(images), raising=False)
+    monkeypatch.setattr(unixnodes, 'base_image_locks', {})
+    return images
+
+
+@pytest.fixture
+def builds(unixnodes, monkeypatch, images):
+    builds = []
+
+    async def run_image_build(image_tag, temp_dir, node=None):
+        with open(f"{temp_dir}/Dockerfile") as f:
+            builds.append((image_tag, f.read()))
+        await asyncio.sleep(FAKE_BUILD_SECONDS)
+        images.cached.add(image_tag)
+        return image_tag
+
+    monkeypatch.setattr(unixnodes, 'run_image_build', run_image_build)
+    return builds
+
+
+def test_builds_once_and_reuses_the_image(unixnodes, builds):
+    async def scenario():
+        first = await asyncio.gather(*(unixnodes.build_custom_image('ubuntu:22.04') for _ in range(5)))
+        again = await unixnodes.build_custom_image('ubuntu:22.04')
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    assert len(builds) == 1
+    assert set(first) == {again}
+    assert again.startswith(f"{unixnodes.BASE_IMAGE_REPO}:")
+
+
+def test_tag_follows_the_base_image(unixnodes, builds):
+    async def scenario():
+        return [await unixnodes.build_custom_image(base) for base in ('ubuntu:22.04', 'debian:12', 'ubuntu:22.04')]
+
+    ubuntu, debian, ubuntu_again = asyncio.run(scenario())
+    assert ubuntu == ubuntu_again
+    assert ubuntu != debian
+    assert len(builds) == 2
+
+
+def test_dockerfile_carries_no_vps_identity(unixnodes, builds):
+    asyncio.run(unixnodes.build_custom_image('ubuntu:22.04'))
+    (_, dockerfile), = builds
+    assert 'FROM ubuntu:22.04' in dockerfile
+    assert 'chpasswd' not in dockerfile
+    assert 'useradd' not in dockerfile
+    assert 'hostname' not in dockerfile
+
+
+def test_identity_is_applied_by_setup_steps(unixnodes):
+    steps = dict((name, cmd) for name, cmd, _ in unixnodes.build_setup_steps(
+        'alice', 's3cret', 'vps-1', 2, use_custom_image=True, root_password='r00t'))
+    assert 'alice:s3cret' in steps['user_password']
+    assert 'root:r00t' in steps['root_password']
+    assert 'unixnodes-vps-1' in steps['hostname']
+    assert 'sshd_config' not in steps
+
+
+class FakeExec:
+    """`docker exec` of the setup script: reports every step as done after FAKE_EXEC_SECONDS"""
+    def __init__(self, steps):
+        self.steps = steps
+        self.returncode = 0
+
+    async def communicate(self, script=None):
+        await asyncio.sleep(FAKE_EXEC_SECONDS)
+        lines = [json.dumps({'step': name, 'rc': 0, 'output': ''}) for name, _, _ in self.steps]
+        return '\n'.join(lines).encode(), b''
+
+
+def test_benchmark_per_vps_build_against_cached_image(unixnodes, builds, monkeypatch):
+    vps_count = 20
+    steps = unixnodes.build_setup_steps('alice', 's3cret', 'vps-1', 2, use_custom_image=True, root_password='r00t')
+    execs = []
+
+    async def docker_cli(*args, **kwargs):
+        execs.append(args)
+        return FakeExec(steps)
+
+    monkeypatch.setattr(unixnodes, 'docker_cli', docker_cli)
+
+    async def per_vps_build(n):
+        # What /create_vps did before: a Dockerfile with the VPS identity baked in, so one build per VPS
+        dockerfile = unixnodes.DOCKERFILE_TEMPLATE.format(
+            base_image='ubuntu:22.04', welcome_message=unixnodes.WELCOME_MESSAGE, watermark=unixnodes.WATERMARK
+        ) + f"RUN useradd -m user{n} && echo 'user{n}:s3cret' | chpasswd && echo unixnodes-vps-{n} > /etc/hostname\n"
+        temp_dir = f"temp_dockerfiles/vps-{n}"
+        unixnodes.write_dockerfile(temp_dir, dockerfile)
+        await unixnodes.run_image_build(f"unixnodes/vps-{n}:latest", temp_dir)
+
+    async def cached_image_and_setup(n):
+        await unixnodes.build_custom_image('ubuntu:22.04')
+        results = await unixnodes.run_setup_script(f'container-{n}', steps)
+        assert all(result['rc'] == 0 for result in results)
+
+    async def timed(create):
+        started = time.perf_counter()
+        for n in range(vps_count):
+            await create(n)
+        return time.perf_counter() - started
+
+    old_time = asyncio.run(timed(per_vps_build))
+    old_builds = len(builds)
+    new_time = asyncio.run(timed(cached_image_and_setup))
+    new_builds = len(builds) - old_builds
+
+    print(f"{vps_count} VPS: per-VPS build {old_time:.2f}s ({old_builds} builds), "
+          f"cached base image + setup script {new_time:.2f}s ({new_builds} build, {len(execs)} execs)")
+    assert (old_builds, new_builds, len(execs)) == (vps_count, 1, vps_count)
+    # Only the first VPS pays for a build, the rest for one docker exec each
+    assert new_time < old_time / 5
@@ -0,0 +1,150 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+# vps_instances as created before schema versions existed
+OLD_SCHEMA = '''
+    CREATE TABLE vps_instances (
+        token TEXT PRIMARY KEY,
+        vps_id TEXT UNIQUE,
+        container_id TEXT,
+        memory INTEGER,
+        cpu INTEGER,
+        disk INTEGER,
+        username TEXT,
+        password TEXT,
+        root_password TEXT,
+        created_by TEXT,
+        created_at TEXT,
+        tmate_session TEXT,
+        watermark TEXT,
+        os_image TEXT,
+        restart_count INTEGER DEFAULT 0,
+        last_restart TEXT,
+        status TEXT DEFAULT 'running',
+        use_custom_image BOOLEAN DEFAULT 1
+    )
+'''
+
+
+def index_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")}
+
+
+def test_migrates_an_old_database_file(unixnodes, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / 'unixnodes.db')
+    conn = sqlite3.connect(path)
+    conn.execute(OLD_SCHEMA)
+    conn.execute("INSERT INTO vps_instances (token, vps_id, container_id, created_by) VALUES ('t', 'vps-old', 'c', '7')")
+    conn.commit()
+    conn.close()
+
+    db = unixnodes.Database(path)
+    try:
+        assert db.conn.execute('PRAGMA user_version').fetchone()[0] == len(unixnodes.Database.MIGRATIONS)
+        assert {'idx_vps_created_by', 'idx_vps_container_id', 'idx_vps_status', 'idx_vps_events_vps_id'} <= index_names(db.conn)
+        assert {'node', 'snapshot_retention'} <= db._table_columns('vps_instances')
+        assert db.get_vps_by_id('vps-old')[1]['created_by'] == '7'
+    finally:
+        db.close()
+
+    # Opening it again applies nothing twice
+    db = unixnodes.Database(path)
+    db.close()
+
+
+def test_wal_and_synchronous_normal(db):
+    assert db.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert db.conn.execute('PRAGMA synchronous').fetchone()[0] == 1
+
+
+def test_owner_lookups_use_the_index(db):
+    plan = db.query('EXPLAIN QUERY PLAN SELECT COUNT(*) FROM vps_instances WHERE created_by = ?', ('7',)).fetchall()
+    assert any('idx_vps_created_by' in row[-1] for row in plan)
+
+
+def test_reads_get_one_connection_per_thread(db):
+    conns = []
+
+    def read():
+        db.query('SELECT 1').fetchone()
+        conns.append(db.local.conn)
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    read()
+    read()
+
+    assert len(set(map(id, conns))) == 5
+    assert len(db.read_conns) == 5
+
+
+def test_concurrent_writes_and_reads_from_threads(db, make_vps):
+    errors = []
+
+    def writer(start):
+        try:
+            for n in range(start, start + 100):
+                db.add_vps(make_vps(n))
+                db.update_vps(f'token-{n}', {'status': 'stopped'})
+                db.increment_stat('restarts')
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            for _ in range(200):
+                db.get_setting('max_containers')
+                db.get_stat('restarts')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(n * 100,)) for n in range(4)]
+    threads += [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert db.get_stat('restarts') == 400
+    assert db.query("SELECT COUNT(*) FROM vps_instances WHERE status = 'stopped'").fetchone()[0] == 400
+    assert len(db.get_all_vps()) == 400
+
+
+# The reads every VPS command starts with; owners hold 20 VPS each
+COMMAND_READS = {
+    'get_user_vps_count': lambda db, n, owners: db.get_user_vps_count(str(n % owners)),
+    'get_user_vps': lambda db, n, owners: db.get_user_vps(str(n % owners)),
+    'get_vps_by_id': lambda db, n, owners: db.get_vps_by_id(f'vps-{n}'),
+    'get_vps_by_container_id': lambda db, n, owners: db.get_vps_by_container_id(f'container-{n}'),
+    'get_setting': lambda db, n, owners: db.get_setting('max_vps_per_user'),
+}
+
+
+@pytest.mark.parametrize('rows', [1_000, 10_000, 100_000])
+def test_command_read_latency(db, make_vps, rows):
+    owners = rows // 20
+    with db.lock:
+        db.conn.executemany(
+            'INSERT INTO vps_instances (token, vps_id, container_id, memory, cpu, disk, created_by, status) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(f'token-{n}', f'vps-{n}', f'container-{n}', 2, 1, 10, str(n % owners), 'running') for n in range(rows)]
+        )
+        db.conn.commit()
+    db._load_vps_index()
+
+    calls = 1_000
+    for name, read in COMMAND_READS.items():
+        started = time.perf_counter()
+        for n in range(calls):
+            read(db, n * (rows // calls), owners)
+        elapsed = (time.perf_counter() - started) / calls
+        print(f"{rows} rows: {name} {elapsed * 1e6:.1f} us")
+        assert elapsed < 0.001, name
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+
+def event(action, container_id, **attributes):
+    now = time.time()
+    return {'Type': 'container', 'Action': action, 'id': container_id, 'time': int(now), 'timeNano': int(now * 1e9),
+            'Actor': {'ID': container_id, 'Attributes': attributes}}
+
+
+@pytest.fixture
+def handle(unixnodes, fake_bot):
+    node = SimpleNamespace(name=unixnodes.PRIMARY_NODE, last_event=None)
+
+    def handle(*events):
+        async def scenario():
+            for item in events:
+                await unixnodes.UnixNodesBot.handle_docker_event(fake_bot, node, item)
+        asyncio.run(scenario())
+        return node
+    return handle
+
+
+def status(fake_bot, token='token-1'):
+    return fake_bot.db.sync.get_vps_by_token(token)['status']
+
+
+def test_die_and_start_track_the_vps_status(fake_bot, make_vps, handle):
+    fake_bot.db.sync.add_vps(make_vps(1))
+
+    handle(event('kill', 'container-1'), event('die', 'container-1', exitCode='0'))
+    assert status(fake_bot) == 'stopped'
+    assert fake_bot.container_states['container-1']['status'] == 'exited'
+    assert fake_bot.db.sync.get_vps_events('vps-1') == []
+
+    node = handle(event('start', 'container-1'))
+    assert status(fake_bot) == 'running'
+    assert node.last_event is not None
+
+
+def test_unexpected_exits_and_ooms_are_recorded(fake_bot, make_vps, handle):
+    fake_bot.db.sync.add_vps(make_vps(1))
+    handle(event('oom', 'container-1'), event('die', 'container-1', exitCode='137'))
+    events = fake_bot.db.sync.get_vps_events('vps-1')
+    assert sorted(e['event'] for e in events) == ['oom', 'unexpected_exit']
+
+
+@pytest.mark.parametrize('action, initial', [('die', 'running'), ('start', 'stopped')])
+def test_events_do_not_undo_a_suspension(fake_bot, make_vps, handle, action, initial):
+    fake_bot.db.sync.add_vps(make_vps(1, status=initial))
+    lookup = fake_bot.db.get_vps_by_container_id
+
+    async def lookup_then_suspend(container_id):
+        found = await lookup(container_id)
+        # suspend_vps stops the container and its 'suspended' write commits while the event is in flight
+        await fake_bot.db.update_vps('token-1', {'status': 'suspended'})
+        return found
+
+    fake_bot.db.get_vps_by_container_id = lookup_then_suspend
+    handle(event(action, 'container-1', exitCode='0'))
+
+    assert status(fake_bot) == 'suspended'
+    assert fake_bot.db.sync.query("SELECT status FROM vps_instances WHERE token = 'token-1'").fetchone()[0] == 'suspended'
+
+
+def test_destroy_forgets_the_container(fake_bot, make_vps, handle):
+    handle(event('start', 'container-9'))
+    fake_bot.nodes.located['container-9'] = 'local'
+    handle(event('destroy', 'container-9'))
+    assert 'container-9' not in fake_bot.container_states
+    assert 'container-9' not in fake_bot.nodes.located
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def provisioner(chunkhost, tmp_path, monkeypatch):
+    """A GiveawayProvisioner over empty stores on a host with room for two 4 GB VPS"""
+    vps_db = chunkhost.JournaledStore(str(tmp_path / 'vps_db.json'))
+    giveaways = chunkhost.JournaledStore(str(tmp_path / 'giveaways.json'))
+    monkeypatch.setattr(chunkhost, 'vps_db', vps_db)
+    monkeypatch.setattr(chunkhost, 'giveaways', giveaways)
+    monkeypatch.setattr(chunkhost, 'persist_scheduler', chunkhost.PersistScheduler((vps_db, giveaways)))
+    monkeypatch.setattr(chunkhost, 'host_resources', lambda: {'ram': 8, 'cpu': 8, 'disk': 1000})
+    monkeypatch.setattr(chunkhost, 'HOST_OVERCOMMIT', 1)
+    return chunkhost.GiveawayProvisioner(2)
+
+
+@pytest.fixture
+def docker_ops(chunkhost, monkeypatch):
+    """Containers booted and removed; create_vps boots `c-<user>-<n>` and records it unless told to fail"""
+    ops = {'booted': [], 'removed': [], 'fail_after_boot': set(), 'notified': []}
+
+    async def create_vps(owner_id, ram, cpu, disk, paid=False, giveaway=False, giveaway_id=None, on_boot=None):
+        cid = f'c-{owner_id}-{len(ops["booted"])}'
+        ops['booted'].append(cid)
+        on_boot(cid)
+        if str(owner_id) in ops['fail_after_boot']:
+            raise RuntimeError('setup crashed')
+        chunkhost.vps_db[cid] = {'owner': str(owner_id), 'container_id': cid, 'giveaway_id': giveaway_id}
+        return chunkhost.vps_db[cid]
+
+    async def docker_remove_container(cid):
+        ops['removed'].append(cid)
+        return True
+
+    async def notify_giveaway_vps(user_id, rec, title):
+        ops['notified'].append(user_id)
+
+    monkeypatch.setattr(chunkhost, 'create_vps', create_vps)
+    monkeypatch.setattr(chunkhost, 'docker_remove_container', docker_remove_container)
+    monkeypatch.setattr(chunkhost, 'notify_giveaway_vps', notify_giveaway_vps)
+    return ops
+
+
+def add_giveaway(chunkhost, giveaway_id, winner_type='all', jobs=None):
+    giveaway = {'winner_type': winner_type, 'vps_ram': 4, 'vps_cpu': 1, 'vps_disk': 10, 'status': 'active'}
+    if jobs is not None:
+        giveaway.update(status='provisioning', jobs=jobs)
+    chunkhost.giveaways[giveaway_id] = giveaway
+    return giveaway
+
+
+def drain(provisioner):
+    async def run():
+        while not provisioner.queue.empty():
+            await provisioner.run_job(*provisioner.queue.get_nowait())
+    asyncio.run(run())
+
+
+def test_fan_out_skips_recipients_without_capacity(chunkhost, provisioner, docker_ops):
+    giveaway = add_giveaway(chunkhost, 'g1')
+    provisioner.fan_out('g1', ['1', '2', '3'])
+
+    assert {user: job['status'] for user, job in giveaway['jobs'].items()} == {
+        '1': 'queued', '2': 'queued', '3': 'skipped'
+    }
+    assert giveaway['jobs']['3']['error'] == 'Insufficient host capacity'
+    assert giveaway['status'] == 'provisioning'
+    assert provisioner.queue.qsize() == 2
+
+    drain(provisioner)
+    assert [job['status'] for job in giveaway['jobs'].values()] == ['done', 'done', 'skipped']
+    assert giveaway['status'] == 'ended'
+    assert giveaway['successful_creations'] == 2
+
+
+def test_resume_requeues_unfinished_jobs_and_adopts_created_vps(chunkhost, provisioner, docker_ops):
+    # '2' got its VPS before the restart, but the job was not marked done yet
+    chunkhost.vps_db['c-2'] = {'owner': '2', 'container_id': 'c-2', 'giveaway_id': 'g1'}
+    giveaway = add_giveaway(chunkhost, 'g1', jobs={
+        '1': {'status': 'queued'},
+        '2': {'status': 'running', 'container_id': 'c-2'},
+        '3': {'status': 'done', 'container_id': 'c-3'},
+        '4': {'status': 'skipped', 'error': 'Insufficient host capacity'},
+    })
+
+    provisioner.resume()
+    assert sorted(provisioner.queue.get_nowait()[1] for _ in range(provisioner.queue.qsize())) == ['1', '2']
+
+    provisioner.resume()
+    drain(provisioner)
+    assert len(docker_ops['booted']) == 1
+    assert docker_ops['removed'] == []
+    assert giveaway['jobs']['2'] == {'status': 'done', 'container_id': 'c-2'}
+    assert giveaway['status'] == 'ended'
+    assert giveaway['successful_creations'] == 3
+
+
+def test_resume_removes_container_that_never_became_a_vps(chunkhost, provisioner, docker_ops):
+    # The container booted and was recorded on the job, then the bot stopped before the VPS was
+    giveaway = add_giveaway(chunkhost, 'g1', jobs={'1': {'status': 'running', 'container_id': 'c-orphan'}})
+
+    provisioner.resume()
+    drain(provisioner)
+
+    assert docker_ops['removed'] == ['c-orphan']
+    assert docker_ops['booted'] == ['c-1-0']
+    assert giveaway['jobs']['1']['container_id'] == 'c-1-0'
+    assert list(chunkhost.vps_db) == ['c-1-0']
+
+
+def test_failed_job_removes_its_container(chunkhost, provisioner, docker_ops):
+    docker_ops['fail_after_boot'].add('1')
+    giveaway = add_giveaway(chunkhost, 'g1')
+    provisioner.fan_out('g1', ['1'])
+    drain(provisioner)
+
+    assert docker_ops['removed'] == docker_ops['booted'] == ['c-1-0']
+    assert giveaway['jobs']['1']['status'] == 'failed'
+    assert 'container_id' not in giveaway['jobs']['1']
+    assert giveaway['status'] == 'ended'
+    assert giveaway['vps_created'] is False
+
+
+def test_finish_if_done_picks_the_random_winner(chunkhost, provisioner):
+    giveaway = add_giveaway(chunkhost, 'g1', winner_type='random', jobs={'1': {'status': 'running'}})
+    provisioner.finish_if_done('g1')
+    assert giveaway['status'] == 'provisioning'
+
+    giveaway['jobs']['1'] = {'status': 'done', 'container_id': 'c-1'}
+    provisioner.finish_if_done('g1')
+    assert giveaway['status'] == 'ended'
+    assert giveaway['winner_vps_id'] == 'c-1'
+    assert giveaway['successful_creations'] == 1
+    assert giveaway['vps_created'] is True
@@ -0,0 +1,165 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def open_store(chunkhost, tmp_path, monkeypatch):
+    """Open (or reopen, to simulate a restart) a store at tmp_path/users.json.
+    No scheduler is running, so every persist() is written straight away."""
+    path = str(tmp_path / 'users.json')
+
+    def open_store():
+        store = chunkhost.JournaledStore(path)
+        monkeypatch.setattr(chunkhost, 'persist_scheduler', chunkhost.PersistScheduler((store,)))
+        return store
+    return open_store
+
+
+def journal_lines(store):
+    with open(store.journal_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_changes_are_journaled_and_reloaded(open_store):
+    store = open_store()
+    store['1'] = {'points': 10}
+    store['2'] = {'points': 5}
+    store.persist('1', '2')
+    store['1']['points'] = 30
+    del store['2']
+    store.persist('1', '2')
+
+    assert sorted(journal_lines(store)[-2:], key=lambda record: record['k']) == [
+        {'k': '1', 'v': {'points': 30}},
+        {'k': '2', 'd': 1},
+    ]
+    assert open_store() == {'1': {'points': 30}}
+
+
+def test_loads_lazily(open_store):
+    store = open_store()
+    store['1'] = 1
+    store.persist('1')
+
+    reopened = open_store()
+    assert not reopened.loaded
+    assert '1' in reopened
+    assert reopened.loaded
+
+
+def test_truncated_journal_line_is_ignored(chunkhost, open_store):
+    store = open_store()
+    for key in ('1', '2', '3'):
+        store[key] = {'points': int(key)}
+        store.persist(key)
+    # A crash half way through appending the next record
+    with open(store.journal_path, 'a') as f:
+        f.write('{"k": "4", "v": {"poi')
+
+    target = {}
+    assert chunkhost.replay_journal(store.journal_path, target) == 3
+    assert open_store() == {'1': {'points': 1}, '2': {'points': 2}, '3': {'points': 3}}
+
+
+def test_missing_files_load_empty(chunkhost, open_store):
+    assert chunkhost.replay_journal(open_store().journal_path, {}) == 0
+    assert open_store() == {}
+
+
+def test_full_rewrite_resets_the_journal(open_store):
+    store = open_store()
+    store['1'] = 1
+    store.persist('1')
+    store.clear()
+    store['2'] = 2
+    store.persist()
+
+    assert journal_lines(store) == []
+    with open(store.path) as f:
+        assert json.load(f) == {'2': 2}
+    assert open_store() == {'2': 2}
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(chunkhost, open_store, monkeypatch):
+    monkeypatch.setattr(chunkhost, 'STORE_COMPACT_RATIO', 1)
+    store = open_store()
+    for n in range(65):
+        store['counter'] = n
+        store.persist('counter')
+
+    assert journal_lines(store) == []
+    with open(store.path) as f:
+        assert json.load(f) == {'counter': 64}
+    assert open_store() == {'counter': 64}
+
+
+def test_crash_between_compaction_and_truncation(chunkhost, open_store):
+    store = open_store()
+    store['1'] = 1
+    store.persist('1')
+    store['1'] = 2
+    store['2'] = 2
+    store.persist('1', '2')
+    # The snapshot was rewritten but the journal it was built from was never emptied
+    snapshot = chunkhost.load_json(store.path, {})
+    chunkhost.replay_journal(store.journal_path, snapshot)
+    chunkhost.save_json(store.path, snapshot)
+
+    assert open_store() == {'1': 2, '2': 2}
+
+
+@pytest.fixture
+def disk_events(monkeypatch, tmp_path):
+    """fsyncs and renames in order, with the journal size at each; tmp_path is the store's directory"""
+    events = []
+    fsync, replace = os.fsync, os.replace
+
+    def journal_size():
+        path = tmp_path / 'users.json.journal'
+        return path.stat().st_size if path.exists() else 0
+
+    def recording_fsync(fd):
+        events.append(('fsync', os.path.basename(os.readlink(f'/proc/self/fd/{fd}')), journal_size()))
+        fsync(fd)
+
+    def recording_replace(src, dst):
+        events.append(('replace', os.path.basename(dst), journal_size()))
+        replace(src, dst)
+
+    monkeypatch.setattr(os, 'fsync', recording_fsync)
+    monkeypatch.setattr(os, 'replace', recording_replace)
+    return events
+
+
+def snapshot_writes(events, tmp_path):
+    """The events of the snapshot write: temp file fsync, rename, directory fsync"""
+    start = next(i for i, event in enumerate(events) if event[:2] == ('fsync', 'users.json.tmp'))
+    return [event[:2] for event in events[start:start + 3]], events[start + 1][2]
+
+
+def test_rewrite_is_durable_before_the_journal_is_emptied(open_store, disk_events, tmp_path):
+    store = open_store()
+    store['1'] = 1
+    store.persist('1')
+    store['2'] = 2
+    store.persist()
+
+    writes, journal_at_rename = snapshot_writes(disk_events, tmp_path)
+    assert writes == [('fsync', 'users.json.tmp'), ('replace', 'users.json'), ('fsync', tmp_path.name)]
+    assert journal_at_rename > 0
+    assert open_store() == {'1': 1, '2': 2}
+
+
+def test_compaction_is_durable_before_the_journal_is_emptied(chunkhost, open_store, disk_events, tmp_path, monkeypatch):
+    monkeypatch.setattr(chunkhost, 'STORE_COMPACT_RATIO', 1)
+    store = open_store()
+    for n in range(65):
+        store['counter'] = n
+        store.persist('counter')
+
+    writes, journal_at_rename = snapshot_writes(disk_events, tmp_path)
+    assert writes == [('fsync', 'users.json.tmp'), ('replace', 'users.json'), ('fsync', tmp_path.name)]
+    assert journal_at_rename > 0
+    assert open_store() == {'counter': 64}
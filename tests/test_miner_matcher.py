@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'processes')
+
+
+def load_processes(name):
+    """A fixture is one container's `docker top` CMD column, one process per line"""
+    with open(os.path.join(FIXTURES, name)) as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+
+MINERS = sorted(name for name in os.listdir(FIXTURES) if name.startswith('miner_'))
+BENIGN = sorted(name for name in os.listdir(FIXTURES) if name.startswith('benign_'))
+
+
+@pytest.fixture(scope='module')
+def matcher(unixnodes):
+    return unixnodes.MinerSignatureMatcher()
+
+
+@pytest.mark.parametrize('name', MINERS)
+def test_flags_miners(matcher, name):
+    is_miner, score, reasons = matcher.is_miner(load_processes(name))
+    assert is_miner, (score, reasons)
+    assert reasons
+
+
+@pytest.mark.parametrize('name', BENIGN)
+def test_ignores_benign_processes(matcher, name):
+    is_miner, score, reasons = matcher.is_miner(load_processes(name))
+    assert not is_miner, (score, reasons)
+
+
+def test_substrings_do_not_match(matcher):
+    # The old substring check suspended anything mentioning "pool" or "miner"
+    commands = ['/usr/sbin/pgbouncer --pool-mode=session', '/opt/minerva/bin/minervad', 'vim /etc/xmrig.conf.bak']
+    assert matcher.score(commands) == (0, [])
+
+
+def test_version_suffix_on_process_name(matcher):
+    score, reasons = matcher.score(['/opt/xmrig-6.21.0/xmrig-6.21.0'])
+    assert score == 10
+    assert reasons == ['xmrig']
+
+
+def test_stratum_connections_add_weight(matcher, unixnodes):
+    commands = ['/usr/bin/python3 worker.py']
+    assert matcher.score(commands, remote_ports={443, 5432}) == (0, [])
+    score, reasons = matcher.score(commands, remote_ports={3333})
+    assert score == unixnodes.STRATUM_PORT_WEIGHT
+    assert reasons == ['stratum ports [3333]']
+
+
+def test_threshold(unixnodes):
+    commands = ['/tmp/run --donate-level 1']
+    assert unixnodes.MinerSignatureMatcher(threshold=4).is_miner(commands)[0]
+    assert not unixnodes.MinerSignatureMatcher(threshold=5).is_miner(commands)[0]
+
+
+def test_matching_throughput(matcher):
+    # 200 containers with a 40-process table each, roughly a full sweep on a busy node
+    tables = [load_processes(name) * 8 for name in MINERS + BENIGN]
+    sweep = [tables[i % len(tables)] for i in range(200)]
+
+    started = time.perf_counter()
+    for commands in sweep:
+        matcher.score(commands)
+    elapsed = time.perf_counter() - started
+
+    processes = sum(len(commands) for commands in sweep)
+    print(f"matched {processes} processes in {elapsed * 1000:.1f} ms ({processes / elapsed:,.0f} processes/s)")
+    assert elapsed < 1.0
@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from fake_docker import FakeDockerClient, fake_node
+
+
+@pytest.fixture
+def cluster(unixnodes, fake_bot):
+    """fake_bot with three empty nodes: the primary (16GB) and two remote ones (16GB and 32GB), 8 cores each"""
+    fake_bot.system_stats = {'last_updated': 1, 'memory_total': 16, 'cpu_count': 8, 'disk_total': 500}
+    for resource in ('memory', 'cpu', 'disk'):
+        fake_bot.db.sync.set_setting(f'{resource}_overcommit_pct', 100)
+
+    async def add_nodes():
+        await fake_bot.nodes.add(fake_node(unixnodes, unixnodes.PRIMARY_NODE))
+        await fake_bot.nodes.add(fake_node(unixnodes, 'small', FakeDockerClient(memory_gb=16), url='tcp://small:2376', disk_gb=500))
+        await fake_bot.nodes.add(fake_node(unixnodes, 'large', FakeDockerClient(memory_gb=32), url='tcp://large:2376', disk_gb=500))
+
+    asyncio.run(add_nodes())
+    return fake_bot
+
+
+def demand(memory, cpu=1, disk=10):
+    return {'memory': memory, 'cpu': cpu, 'disk': disk}
+
+
+def place(bot, key, request, owner_id=None, node=None):
+    return asyncio.run(bot.capacity.place(key, request, owner_id=owner_id, node=node))
+
+
+def test_best_fit(unixnodes, cluster):
+    # 20GB only fits on the large node; 4GB goes where it leaves the least headroom
+    assert place(cluster, 'a', demand(20)) == ('large', None)
+    assert place(cluster, 'b', demand(4)) == ('large', None)
+
+
+def test_owner_anti_affinity(unixnodes, cluster, make_vps):
+    cluster.db.sync.add_vps(make_vps(1, created_by='7', node='large', memory=1))
+    cluster.db.sync.add_vps(make_vps(2, created_by='7', node='small', memory=1))
+    # Best fit is the small node, which already has one of owner 7's VPS
+    assert place(cluster, 'a', demand(2), owner_id='8') == ('small', None)
+    cluster.capacity.release('a')
+    assert place(cluster, 'b', demand(2), owner_id='7') == (unixnodes.PRIMARY_NODE, None)
+
+
+def test_held_requests_count_against_headroom(unixnodes, cluster):
+    assert place(cluster, 'a', demand(30)) == ('large', None)
+    node, _ = place(cluster, 'b', demand(10))
+    assert node != 'large'
+    cluster.capacity.release('a')
+    assert place(cluster, 'c', demand(30)) == ('large', None)
+
+
+def test_refuses_what_fits_nowhere(cluster):
+    node, refusal = place(cluster, 'a', demand(64))
+    assert node is None
+    assert refusal.startswith('Not enough capacity: ')
+    assert 'large: memory (needs 64GB, 32.0GB free)' in refusal
+
+
+def test_checks_a_chosen_node(unixnodes, cluster):
+    assert place(cluster, 'a', demand(20), node=cluster.nodes.nodes['small'])[0] is None
+    assert place(cluster, 'b', demand(8), node=cluster.nodes.nodes['small']) == ('small', None)
+
+
+def test_draining_and_unhealthy_nodes_take_no_new_vps(unixnodes, cluster):
+    cluster.nodes.nodes['large'].draining = True
+    cluster.nodes.nodes['small'].fake_client.healthy = False
+
+    async def fail_checks():
+        for _ in range(unixnodes.NODE_FAILURE_THRESHOLD):
+            await cluster.nodes.check(cluster.nodes.nodes['small'])
+
+    asyncio.run(fail_checks())
+    assert not cluster.nodes.nodes['small'].healthy
+    assert [node.name for node in cluster.nodes.schedulable()] == [unixnodes.PRIMARY_NODE]
+    assert place(cluster, 'a', demand(2)) == (unixnodes.PRIMARY_NODE, None)
+
+    cluster.nodes.nodes['small'].fake_client.healthy = True
+    asyncio.run(cluster.nodes.check(cluster.nodes.nodes['small']))
+    assert cluster.nodes.nodes['small'].healthy
+
+
+def test_calls_go_to_the_node_that_owns_the_container(unixnodes, cluster):
+    small = cluster.nodes.nodes['small'].fake_client
+    large = cluster.nodes.nodes['large'].fake_client
+    container = small.containers.add()
+
+    async def scenario():
+        found = await cluster.docker.get(container.id)
+        await cluster.docker.stop(found)
+        await cluster.docker.start(found)
+        started = await cluster.docker.run('ubuntu:22.04', node='large')
+        return found, started
+
+    found, started = asyncio.run(scenario())
+    assert found is container
+    assert cluster.nodes.located[container.id] == 'small'
+    assert small.operations == [('stop', container.id), ('start', container.id)]
+    assert started.client is large
+    assert cluster.nodes.node_for(started.id).name == 'large'
+
+
+def test_lookups_use_the_vps_node(unixnodes, cluster, make_vps):
+    container = cluster.nodes.nodes['large'].fake_client.containers.add()
+    cluster.db.sync.add_vps(make_vps(1, container_id=container.id, node='large'))
+    assert cluster.nodes.node_for(container.id).name == 'large'
+    assert cluster.nodes.node_for('unknown').name == unixnodes.PRIMARY_NODE
+
+
+def test_listing_skips_unreachable_nodes(unixnodes, cluster):
+    for name in (unixnodes.PRIMARY_NODE, 'small', 'large'):
+        cluster.nodes.nodes[name].fake_client.containers.add()
+
+    def unreachable(**kwargs):
+        raise ConnectionError('node down')
+
+    cluster.nodes.nodes['small'].fake_client.containers.list = unreachable
+    containers = asyncio.run(cluster.docker.list(all=True))
+    assert sorted(cluster.nodes.node_of(c).name for c in containers) == sorted([unixnodes.PRIMARY_NODE, 'large'])
+
+
+def test_node_table_is_seeded_once(unixnodes, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(unixnodes, 'DOCKER_NODES', 'b=tcp://b:2376, c=ssh://root@c')
+    path = str(tmp_path / 'unixnodes.db')
+
+    db = unixnodes.Database(path)
+    assert [(node['name'], node['url']) for node in db.get_nodes()] == [
+        (unixnodes.PRIMARY_NODE, None), ('b', 'tcp://b:2376'), ('c', 'ssh://root@c')
+    ]
+    db.remove_node('b')
+    db.close()
+
+    # An admin's /node_remove survives a restart with DOCKER_NODES unchanged
+    db = unixnodes.Database(path)
+    try:
+        assert [node['name'] for node in db.get_nodes()] == [unixnodes.PRIMARY_NODE, 'c']
+    finally:
+        db.close()
+
+
+
+@pytest.mark.parametrize('name', ['local', 'small'])
+def test_miner_scans_sample_the_container_s_own_node(unixnodes, cluster, make_vps, monkeypatch, name):
+    node = cluster.nodes.nodes[unixnodes.PRIMARY_NODE if name == 'local' else name]
+    container = node.fake_client.containers.add()
+    container.processes = [['root', '4242', '/sbin/init'], ['root', '4250', 'python3 app.py']]
+    container.cpu_usage_ns = 7_000_000
+    cluster.db.sync.add_vps(make_vps(1, container_id=container.id, node=node.name))
+    cluster.miner_matcher = unixnodes.MinerSignatureMatcher()
+    cluster.miner_cpu_samples = {}
+    sampled = []
+    monkeypatch.setattr(unixnodes, 'read_cgroup_cpu_usage', lambda pid: sampled.append(('cpu', pid)) or 123)
+    monkeypatch.setattr(unixnodes, 'read_remote_ports', lambda pid: sampled.append(('ports', pid)) or {443})
+
+    token, vps = cluster.db.sync.get_vps_by_id('vps-1')
+    assert not asyncio.run(unixnodes.UnixNodesBot.scan_container(cluster, token, vps))
+
+    cpu_usage = cluster.miner_cpu_samples[token][0]
+    if name == 'local':
+        assert sampled == [('cpu', '4242'), ('ports', '4242')]
+        assert cpu_usage == 123
+    else:
+        # This host's /proc knows nothing about PIDs on another machine
+        assert sampled == []
+        assert cpu_usage == 7_000
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def stores(chunkhost, tmp_path, monkeypatch):
+    users = chunkhost.JournaledStore(str(tmp_path / 'users.json'))
+    vps_db = chunkhost.JournaledStore(str(tmp_path / 'vps_db.json'))
+    scheduler = chunkhost.PersistScheduler((users, vps_db))
+    monkeypatch.setattr(chunkhost, 'persist_scheduler', scheduler)
+    return users, vps_db, scheduler
+
+
+def on_disk(chunkhost, store):
+    reopened = chunkhost.JournaledStore(store.path)
+    reopened.load()
+    return dict(reopened)
+
+
+def test_concurrent_point_changes_coalesce(chunkhost, stores):
+    users, vps_db, scheduler = stores
+    users['1'] = {'points': 0}
+    users.persist('1')
+    writes_before = scheduler.writes
+
+    async def claim_point(n):
+        await asyncio.sleep(0.001 * (n % 10))
+        users['1']['points'] += 1
+        users.setdefault(str(n % 20 + 2), {'points': 0})['points'] += 1
+        users.persist('1', str(n % 20 + 2))
+
+    async def scenario():
+        scheduler.start()
+        await asyncio.gather(*(claim_point(n) for n in range(1_000)))
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    writes = scheduler.writes - writes_before
+    print(f"1000 point changes -> {writes} write(s)")
+    assert 1 <= writes <= 3
+    saved = on_disk(chunkhost, users)
+    assert saved['1'] == {'points': 1_000}
+    assert sum(user['points'] for key, user in saved.items() if key != '1') == 1_000
+    assert on_disk(chunkhost, vps_db) == {}
+
+
+def test_flush_writes_immediately(chunkhost, stores, monkeypatch):
+    users, _, scheduler = stores
+    monkeypatch.setattr(chunkhost, 'STORE_FLUSH_INTERVAL_MS', 60_000)
+
+    async def scenario():
+        scheduler.start()
+        users['1'] = {'points': 40}
+        users.persist('1')
+        await asyncio.sleep(0.01)
+        before_flush = on_disk(chunkhost, users)
+        # A point deduction must not wait for the interval
+        users['1']['points'] -= 40
+        users.persist('1')
+        await scheduler.flush()
+        after_flush = on_disk(chunkhost, users)
+        await scheduler.stop()
+        return before_flush, after_flush
+
+    assert asyncio.run(scenario()) == ({}, {'1': {'points': 0}})
+
+
+def test_writes_synchronously_when_not_running(chunkhost, stores):
+    users, _, scheduler = stores
+    users['1'] = {'points': 5}
+    users.persist('1')
+    assert scheduler.writes == 1
+    with open(users.journal_path) as f:
+        assert [json.loads(line) for line in f] == [{'k': '1', 'v': {'points': 5}}]
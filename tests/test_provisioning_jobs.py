@@ -0,0 +1,280 @@
+import asyncio
+import datetime
+
+import pytest
+
+from fake_docker import fake_node
+
+SESSION = 'ssh abc123@lon1.tmate.io'
+
+
+class Setups(list):
+    """Container ids setup_container was called for; `fail` and `delay` steer the next calls"""
+    fail = False
+    delay = 0
+
+
+@pytest.fixture
+def setups(unixnodes, monkeypatch):
+    """Replace container setup and the tmate handshake"""
+    setups = Setups()
+
+    async def setup_container(container_id, status_msg, memory, username, vps_id=None, use_custom_image=False, root_password=None):
+        setups.append(container_id)
+        await asyncio.sleep(setups.delay)
+        if setups.fail:
+            await status_msg.edit(content='❌ Failed to create user')
+            return False, None, None
+        return True, f'password-{len(setups)}', None
+
+    async def docker_cli(*args, **kwargs):
+        return None
+
+    async def capture_ssh_session_line(process):
+        return SESSION
+
+    monkeypatch.setattr(unixnodes, 'setup_container', setup_container)
+    monkeypatch.setattr(unixnodes, 'docker_cli', docker_cli)
+    monkeypatch.setattr(unixnodes, 'capture_ssh_session_line', capture_ssh_session_line)
+    return setups
+
+
+def create_params(unixnodes, n=1):
+    return {
+        'token': f'token-{n}',
+        'owner_id': '42',
+        'memory': 2,
+        'cpu': 1,
+        'disk': 10,
+        'username': 'alice',
+        'os_image': 'ubuntu:22.04',
+        'use_custom_image': False,
+        'root_password': None,
+        'node': unixnodes.PRIMARY_NODE,
+    }
+
+
+def reinstall_params(unixnodes, old_container_id):
+    return {
+        'old_container_id': old_container_id,
+        'owner_id': '42',
+        'memory': 2,
+        'cpu': 1,
+        'disk': 10,
+        'username': 'alice',
+        'os_image': 'debian:12',
+        'use_custom_image': False,
+        'node': unixnodes.PRIMARY_NODE,
+    }
+
+
+def unfinished_job(unixnodes, kind, vps_id, params, step, progress):
+    """A provision_jobs row as a previous run of the bot left it"""
+    now = str(datetime.datetime.now())
+    return {
+        'id': unixnodes.generate_job_id(), 'kind': kind, 'vps_id': vps_id, 'state': 'running', 'step': step,
+        'message': None, 'params': params, 'progress': progress, 'error': None, 'requested_by': '42',
+        'channel_id': None, 'created_at': now, 'updated_at': now
+    }
+
+
+async def connect(unixnodes, bot):
+    node = await bot.nodes.add(fake_node(unixnodes, unixnodes.PRIMARY_NODE))
+    return node.fake_client
+
+
+async def run_job(bot, kind, vps_id, params):
+    finished = asyncio.get_running_loop().create_future()
+
+    async def on_finish(job):
+        finished.set_result(job)
+
+    await bot.jobs.submit(kind, vps_id, params, requested_by=42, on_finish=on_finish)
+    return await asyncio.wait_for(finished, 5)
+
+
+async def drain(jobs):
+    for _ in range(500):
+        if not jobs.active:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('jobs did not finish')
+
+
+def record_steps(bot, monkeypatch):
+    steps = []
+    save = bot.jobs.save
+
+    async def recording_save(job, **updates):
+        if 'step' in updates:
+            steps.append(updates['step'])
+        await save(job, **updates)
+
+    monkeypatch.setattr(bot.jobs, 'save', recording_save)
+    return steps
+
+
+def test_create_runs_every_step(unixnodes, fake_bot, setups, monkeypatch):
+    steps = record_steps(fake_bot, monkeypatch)
+
+    async def scenario():
+        client = await connect(unixnodes, fake_bot)
+        return client, await run_job(fake_bot, 'create', 'vps-1', create_params(unixnodes))
+
+    client, job = asyncio.run(scenario())
+
+    assert job['state'] == 'done'
+    assert steps == ['prepare', 'container', 'setup', 'session', 'record', 'notify']
+    assert fake_bot.db.sync.get_job(job['id'])['state'] == 'done'
+    container, = client.containers.by_id.values()
+    assert container.labels == {unixnodes.ProvisioningJobs.LABEL: job['id']}
+    _, vps = fake_bot.db.sync.get_vps_by_id('vps-1')
+    assert vps['container_id'] == container.id
+    assert vps['password'] == 'password-1'
+    assert vps['tmate_session'] == SESSION
+    assert vps['created_by'] == '42'
+    assert [user_id for user_id, _ in fake_bot.direct_messages] == [42]
+
+
+def test_failed_create_leaves_nothing_behind(unixnodes, fake_bot, setups):
+    setups.fail = True
+
+    async def scenario():
+        client = await connect(unixnodes, fake_bot)
+        return client, await run_job(fake_bot, 'create', 'vps-1', create_params(unixnodes))
+
+    client, job = asyncio.run(scenario())
+
+    assert job['state'] == 'failed'
+    assert job['error'] == '❌ Failed to create user'
+    assert client.containers.by_id == {}
+    assert fake_bot.db.sync.get_vps_by_id('vps-1') == (None, None)
+
+
+def test_resume_after_interrupted_setup_starts_over_on_a_fresh_container(unixnodes, fake_bot, setups):
+    async def scenario():
+        client = await connect(unixnodes, fake_bot)
+        job = unfinished_job(unixnodes, 'create', 'vps-1', create_params(unixnodes), 'container', {})
+        half_set_up = client.containers.add(labels={unixnodes.ProvisioningJobs.LABEL: job['id']})
+        job['progress'] = {'os_image': 'ubuntu:22.04', 'custom': False, 'image': 'ubuntu:22.04', 'container_id': half_set_up.id}
+        fake_bot.db.sync.add_job(job)
+        await fake_bot.jobs.resume()
+        await drain(fake_bot.jobs)
+        return client, half_set_up, job['id']
+
+    client, half_set_up, job_id = asyncio.run(scenario())
+
+    assert fake_bot.db.sync.get_job(job_id)['state'] == 'done'
+    assert half_set_up.id not in client.containers.by_id
+    container, = client.containers.by_id.values()
+    assert setups == [container.id]
+    assert fake_bot.db.sync.get_vps_by_id('vps-1')[1]['container_id'] == container.id
+
+
+def test_resume_after_setup_continues_with_the_next_step(unixnodes, fake_bot, setups):
+    async def scenario():
+        client = await connect(unixnodes, fake_bot)
+        job = unfinished_job(unixnodes, 'create', 'vps-1', create_params(unixnodes), 'setup', {})
+        container = client.containers.add(labels={unixnodes.ProvisioningJobs.LABEL: job['id']})
+        job['progress'] = {'os_image': 'ubuntu:22.04', 'custom': False, 'image': 'ubuntu:22.04',
+                           'container_id': container.id, 'password': 'from-before'}
+        fake_bot.db.sync.add_job(job)
+        await fake_bot.jobs.resume()
+        await drain(fake_bot.jobs)
+        return client, container
+
+    client, container = asyncio.run(scenario())
+
+    assert setups == []
+    assert list(client.containers.by_id) == [container.id]
+    assert ('run', 'ubuntu:22.04') not in client.operations
+    _, vps = fake_bot.db.sync.get_vps_by_id('vps-1')
+    assert (vps['container_id'], vps['password']) == (container.id, 'from-before')
+
+
+def test_resume_adopts_a_container_started_before_the_restart(unixnodes, fake_bot, setups):
+    async def scenario():
+        client = await connect(unixnodes, fake_bot)
+        job = unfinished_job(unixnodes, 'create', 'vps-1', create_params(unixnodes), 'prepare',
+                             {'os_image': 'ubuntu:22.04', 'custom': False, 'image': 'ubuntu:22.04'})
+        # The bot died after docker run returned but before the container id was saved
+        orphan = client.containers.add(labels={unixnodes.ProvisioningJobs.LABEL: job['id']})
+        fake_bot.db.sync.add_job(job)
+        await fake_bot.jobs.resume()
+        await drain(fake_bot.jobs)
+        return client, orphan
+
+    client, orphan = asyncio.run(scenario())
+
+    assert list(client.containers.by_id) == [orphan.id]
+    assert setups == [orphan.id]
+    assert fake_bot.db.sync.get_vps_by_id('vps-1')[1]['container_id'] == orphan.id
+
+
+def test_reinstall_keeps_the_old_container_until_the_new_one_is_recorded(unixnodes, fake_bot, setups, make_vps):
+    async def scenario():
+        client = await connect(unixnodes, fake_bot)
+        old = client.containers.add()
+        fake_bot.db.sync.add_vps(make_vps(1, container_id=old.id, created_by='42'))
+        job = await run_job(fake_bot, 'reinstall', 'vps-1', reinstall_params(unixnodes, old.id))
+        return client, old, job
+
+    client, old, job = asyncio.run(scenario())
+
+    assert job['state'] == 'done'
+    new, = client.containers.by_id.values()
+    assert new.image == 'debian:12'
+    _, vps = fake_bot.db.sync.get_vps_by_id('vps-1')
+    assert (vps['container_id'], vps['os_image'], vps['password']) == (new.id, 'debian:12', 'password-1')
+    operations = [(operation, target) for operation, target in client.operations if target in (old.id, 'debian:12')]
+    assert operations == [('update', old.id), ('stop', old.id), ('run', 'debian:12'), ('remove', old.id)]
+
+
+@pytest.mark.parametrize('status', ['running', 'exited'])
+def test_failed_reinstall_brings_the_old_container_back(unixnodes, fake_bot, setups, make_vps, status):
+    setups.fail = True
+
+    async def scenario():
+        client = await connect(unixnodes, fake_bot)
+        old = client.containers.add(status=status)
+        fake_bot.db.sync.add_vps(make_vps(1, container_id=old.id, created_by='42'))
+        job = await run_job(fake_bot, 'reinstall', 'vps-1', reinstall_params(unixnodes, old.id))
+        return client, old, job
+
+    client, old, job = asyncio.run(scenario())
+
+    assert job['state'] == 'failed'
+    assert list(client.containers.by_id) == [old.id]
+    assert old.status == status
+    assert old.restart_policy == 'always'
+    assert fake_bot.db.sync.get_vps_by_id('vps-1')[1]['container_id'] == old.id
+
+
+def test_concurrency_cap(unixnodes, fake_bot, setups):
+    setups.delay = 0.05
+    fake_bot.jobs = unixnodes.ProvisioningJobs(fake_bot, concurrency=1)
+    running = 0
+    peak = 0
+    setup_container = unixnodes.setup_container
+
+    async def counting_setup(*args, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        try:
+            return await setup_container(*args, **kwargs)
+        finally:
+            running -= 1
+
+    async def scenario():
+        await connect(unixnodes, fake_bot)
+        unixnodes.setup_container = counting_setup
+        try:
+            return await asyncio.gather(*(run_job(fake_bot, 'create', f'vps-{n}', create_params(unixnodes, n)) for n in range(3)))
+        finally:
+            unixnodes.setup_container = setup_container
+
+    jobs = asyncio.run(scenario())
+
+    assert [job['state'] for job in jobs] == ['done'] * 3
+    assert peak == 1
@@ -0,0 +1,113 @@
+import time
+
+
+def test_index_lookups(unixnodes, make_vps):
+    index = unixnodes.VPSIndex()
+    index.load([make_vps(1, created_by='7'), make_vps(2, created_by='7'), make_vps(3, created_by='8', node='node-b')])
+
+    assert index.by_token['token-1']['vps_id'] == 'vps-1'
+    assert index.token_by_vps_id['vps-2'] == 'token-2'
+    assert index.token_by_container_id['container-3'] == 'token-3'
+    assert list(index.tokens_by_owner['7']) == ['token-1', 'token-2']
+    assert index.allocated[unixnodes.PRIMARY_NODE] == {'memory': 4, 'cpu': 2, 'disk': 20}
+    assert index.allocated['node-b'] == {'memory': 2, 'cpu': 1, 'disk': 10}
+
+
+def test_index_update_relinks_changed_keys(unixnodes, make_vps):
+    index = unixnodes.VPSIndex()
+    index.load([make_vps(1, created_by='7')])
+
+    index.update('token-1', {'container_id': 'replacement', 'created_by': '8', 'memory': 6})
+    assert 'container-1' not in index.token_by_container_id
+    assert index.token_by_container_id['replacement'] == 'token-1'
+    assert '7' not in index.tokens_by_owner
+    assert list(index.tokens_by_owner['8']) == ['token-1']
+    assert index.allocated[unixnodes.PRIMARY_NODE]['memory'] == 6
+
+    index.update('missing', {'status': 'stopped'})
+    assert 'missing' not in index.by_token
+
+
+def test_index_discard(unixnodes, make_vps):
+    index = unixnodes.VPSIndex()
+    index.load([make_vps(1), make_vps(2)])
+    index.discard('token-1')
+    index.discard('token-1')
+
+    assert list(index.by_token) == ['token-2']
+    assert 'vps-1' not in index.token_by_vps_id
+    assert 'container-1' not in index.token_by_container_id
+    assert index.allocated[unixnodes.PRIMARY_NODE] == {'memory': 2, 'cpu': 1, 'disk': 10}
+
+
+def test_writes_go_through_to_sqlite(unixnodes, db, make_vps):
+    db.add_vps(make_vps(1, created_by='7'))
+    db.update_vps('token-1', {'status': 'stopped', 'container_id': 'container-1b'})
+    db.add_vps(make_vps(2, created_by='7'))
+    db.remove_vps('token-2')
+
+    assert db.get_vps_by_container_id('container-1b') == ('token-1', db.get_vps_by_token('token-1'))
+    assert db.get_user_vps_count('7') == 1
+    # A fresh Database rebuilds the index from the table alone
+    reopened = unixnodes.Database(db.db_file)
+    try:
+        assert reopened.get_all_vps() == db.get_all_vps()
+        assert reopened.get_vps_by_token('token-1')['status'] == 'stopped'
+    finally:
+        reopened.close()
+
+
+def test_index_fills_in_column_defaults(db, make_vps):
+    vps = make_vps(1)
+    del vps['restart_count'], vps['status']
+    db.add_vps(vps)
+    stored = db.get_vps_by_token('token-1')
+    assert stored['restart_count'] == 0
+    assert stored['status'] == 'running'
+    assert stored['node'] is None
+
+
+def test_reads_return_copies(db, make_vps):
+    db.add_vps(make_vps(1))
+    db.get_vps_by_token('token-1')['status'] = 'suspended'
+    db.get_all_vps()['token-1']['status'] = 'suspended'
+    assert db.get_vps_by_token('token-1')['status'] == 'running'
+
+
+def test_restore_reloads_the_index(db, make_vps):
+    db.add_vps(make_vps(1))
+    path = db.backup_data()
+    db.remove_vps('token-1')
+    db.add_vps(make_vps(2))
+
+    assert db.restore_data(path)
+    assert list(db.get_all_vps()) == ['token-1']
+    assert db.get_vps_by_id('vps-2') == (None, None)
+
+
+def test_lookup_latency_at_10k_rows(db, make_vps):
+    with db.lock:
+        db.conn.executemany(
+            'INSERT INTO vps_instances (token, vps_id, container_id, memory, cpu, disk, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(vps['token'], vps['vps_id'], vps['container_id'], 2, 1, 10, vps['created_by'])
+             for vps in map(make_vps, range(10_000))]
+        )
+        db.conn.commit()
+    db._load_vps_index()
+
+    lookups = 2_000
+    started = time.perf_counter()
+    for n in range(lookups):
+        db.get_vps_by_id(f'vps-{n * 5}')
+        db.get_user_vps_count(str(1000 + n % 50))
+    indexed = (time.perf_counter() - started) / lookups
+
+    started = time.perf_counter()
+    for n in range(lookups // 10):
+        db.query('SELECT * FROM vps_instances WHERE vps_id = ?', (f'vps-{n * 5}',)).fetchone()
+        db.query('SELECT COUNT(*) FROM vps_instances WHERE created_by = ?', (str(1000 + n % 50),)).fetchone()
+    queried = (time.perf_counter() - started) / (lookups // 10)
+
+    print(f"10k rows: index {indexed * 1e6:.1f} us, SQL {queried * 1e6:.1f} us per command")
+    assert indexed < 0.001
+    assert indexed < queried